@@ -0,0 +1,77 @@
+"""Compare the speed of matching envs with the reference, on large matrices.
+
+Run it from the repository of Tox-Travis::
+
+    python benchmarks/matching.py
+    python benchmarks/matching.py --size 400 3200
+
+For generated matrices of more and more envs, it times the reference
+algorithm of :mod:`tox_travis.differential` and the current matching,
+both from the env names, so that splitting them counts for both,
+for jobs desiring one env, several envs of one factor,
+and several envs of several factors.
+"""
+from __future__ import print_function
+import argparse
+import sys
+import timeit
+
+from tox_travis.differential import current_match, reference_match
+
+JOBS = [
+    ('one env', [['py37']]),
+    ('one factor', [['py36', 'py37', 'docs']]),
+    ('two factors', [['py36', 'py37'], ['django1', 'django2']]),
+    ('three factors', [['py36', 'py37'], ['django1', 'django2'],
+                       ['mysql', 'postgres']]),
+]
+
+
+def make_declared(size):
+    """Make the names of a matrix of about that many envs."""
+    pythons = ['py27', 'py35', 'py36', 'py37', 'py38', 'pypy', 'pypy3']
+    databases = ['sqlite', 'mysql', 'postgres', 'oracle']
+    djangos = max(size // (len(pythons) * len(databases)), 1)
+    return ['{0}-django{1}-{2}'.format(python, django, database)
+            for python in pythons for django in range(djangos)
+            for database in databases] + ['docs', 'lint']
+
+
+def best(function, declared, desired_factors, number):
+    """Get the best time of a match, in milliseconds."""
+    times = timeit.repeat(lambda: function(declared, desired_factors),
+                          repeat=number, number=1)
+    return min(times) * 1000
+
+
+def main():
+    """Time both matchers for each size and job."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-s', '--size', type=int, nargs='+',
+                        default=[100, 1600, 12800],
+                        help='About how many envs to declare.')
+    parser.add_argument('-n', '--number', type=int, default=15,
+                        help='How many times to time each match.')
+    options = parser.parse_args()
+
+    print('{0:>6} {1:<14} {2:>12} {3:>12} {4:>8}'.format(
+        'envs', 'job', 'reference', 'current', 'speedup'))
+    for size in options.size:
+        declared = make_declared(size)
+        for name, desired_factors in JOBS:
+            if current_match(declared, desired_factors) != \
+                    reference_match(declared, desired_factors):
+                print('The matchers disagree on {0} envs for {1}.'.format(
+                    len(declared), name), file=sys.stderr)
+                return 1
+            reference = best(reference_match, declared, desired_factors,
+                             options.number)
+            current = best(current_match, declared, desired_factors,
+                           options.number)
+            print('{0:>6} {1:<14} {2:>9.2f} ms {3:>9.2f} ms {4:>7.1f}x'.format(
+                len(declared), name, reference, current, reference / current))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""Check that the memory of Tox-Travis stays bounded as configs grow.
+
+Run it with an interpreter that has :mod:`tracemalloc`::
+
+    python benchmarks/memory.py
+
+For configs declaring more and more envs, it measures the peak memory
+of detecting the envlist, of generating the configs of undeclared envs,
+and of parsing a build document with as many jobs. Each should grow
+at most linearly with the number of envs, so the peak per env of the
+largest config is checked against that of the smallest.
+"""
+from __future__ import print_function
+import argparse
+import io
+import json
+import sys
+
+from tox_travis import jsonstream
+from tox_travis.after import BUILD_DOCUMENT
+from tox_travis.envlist import autogen_envconfigs, detect_envlist
+from tox_travis.memory import PROFILE_MEMORY, profile, tracemalloc
+from tox_travis.testing import make_config
+from tox_travis.utils import format_size
+
+ENVIRON = {'TRAVIS_PYTHON_VERSION': '3.7', PROFILE_MEMORY: '0'}
+
+
+def make_ini(size):
+    """Make a tox config declaring many envs, half of them for the job."""
+    envnames = ['py{0}-dep{1}'.format(version, index)
+                for index in range(size // 2) for version in (36, 37)]
+    lines = ['[tox]', 'envlist =']
+    lines.extend('    ' + envname for envname in envnames)
+    lines.extend(['[testenv]', 'deps = pytest', 'commands = pytest'])
+    for index, envname in enumerate(envnames):
+        lines.extend(['[testenv:{0}]'.format(envname),
+                      'setenv = INDEX={0}'.format(index)])
+    return '\n'.join(lines)
+
+
+def make_build(size):
+    """Make a build document with many jobs, like the Travis API gives."""
+    config = {'language': 'python', 'script': 'tox', 'os': 'linux',
+              'install': ['pip install tox-travis'] * 10}
+    return json.dumps({
+        'build': {'id': 1, 'job_ids': list(range(size)), 'config': config},
+        'jobs': [{'id': index, 'number': '1.{0}'.format(index),
+                  'allow_failure': False, 'finished_at': None,
+                  'state': 'started', 'config': config, 'log': 'x' * 1024}
+                 for index in range(size)],
+    }).encode('utf-8')
+
+
+def measure(size):
+    """Measure the peak memory of each stage for a config of a size."""
+    # Only listing, so that the interpreters are not looked for
+    config = make_config(make_ini(size), environ=ENVIRON, args=['-l'])
+    environ = {PROFILE_MEMORY: '1'}
+    peaks = {}
+
+    with profile('detect_envlist', environ=environ) as usage:
+        detect_envlist(config._cfg, environ=ENVIRON)
+    peaks['detect_envlist'] = usage['peak']
+
+    undeclared = ['py37-extra{0}'.format(index) for index in range(size)]
+    with profile('autogen_envconfigs', environ=environ) as usage:
+        autogen_envconfigs(config, undeclared)
+    peaks['autogen_envconfigs'] = usage['peak']
+
+    document = make_build(size)
+    with profile('get_build', environ=environ) as usage:
+        jsonstream.load(io.BytesIO(document), BUILD_DOCUMENT)
+    peaks['get_build'] = usage['peak']
+    return peaks
+
+
+def main():
+    """Measure growing configs, and check the growth of each stage."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-s', '--sizes', type=int, nargs='+',
+                        default=[100, 400, 1600],
+                        help='How many envs to declare in each config.')
+    parser.add_argument('-g', '--growth', type=float, default=2.0,
+                        help='How much more memory per env the largest '
+                             'config may use than the smallest.')
+    options = parser.parse_args()
+
+    if tracemalloc is None:
+        print('tracemalloc is not available.', file=sys.stderr)
+        return 1
+
+    results = [(size, measure(size)) for size in sorted(options.sizes)]
+    for size, peaks in results:
+        print('{0:>6} envs  '.format(size) + '  '.join(
+            '{0} {1:>9}'.format(stage, format_size(peak))
+            for stage, peak in sorted(peaks.items())))
+
+    (smallest, first), (largest, last) = results[0], results[-1]
+    unbounded = [
+        stage for stage in sorted(first)
+        if last[stage] / float(largest) >
+        options.growth * max(first[stage], 1) / float(smallest)
+    ]
+    if unbounded:
+        print('Memory grows faster than the envs: {0}'.format(
+            ', '.join(unbounded)), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,233 @@
+"""Measure how the ``--travis-after`` polling performs on build timelines.
+
+The timelines are replayed by a stub of the Travis API, in simulated
+time, so a build of hours takes a moment, and the results are the same
+on every run::
+
+    python benchmarks/polling.py
+    python benchmarks/polling.py --interval 5 30 --timeline build.json
+
+For each timeline and polling interval, it reports how long after the
+outcome of the build was known the wait returned, how many requests
+it made, and how many bytes of responses it read.
+
+A recorded timeline is a JSON file with the jobs of a build, and when
+each of them finished, in seconds after the waiting job started::
+
+    {"jobs": [
+        {"number": "1.1", "finished": 60, "state": "passed"},
+        {"number": "1.2", "finished": 900, "state": "passed",
+         "allow_failure": false, "os": "osx"}
+    ]}
+
+The first job is the one that waits.
+"""
+from __future__ import print_function
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+
+from tox_travis import after
+
+API_URL = 'https://api.travis.stub'
+START = 1500000000.0
+
+# Stands in for the rest of a job document, which isn't needed
+JOB_CONFIG = {
+    'language': 'python', 'dist': 'xenial', 'group': 'stable',
+    'install': ['pip install tox-travis'], 'script': 'tox',
+    '.result': 'configured',
+}
+
+
+class FakeClock(after.Clock):
+    """Simulated time, that passes only when waiting."""
+
+    def __init__(self, now=START):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(seconds, 0)
+
+
+class Response(io.BytesIO):
+    """A response of the stub, with its headers."""
+
+    def __init__(self, content, headers):
+        io.BytesIO.__init__(self, content)
+        self.headers = headers
+
+    def info(self):
+        return self.headers
+
+
+class ReplayTransport(after.Transport):
+    """Answer the requests like the Travis API would during a build.
+
+    The jobs finish at the times of the timeline. With a ``limit``,
+    the responses report a rate limit of that many requests for each
+    ``window``, and refuse the requests over it.
+    """
+
+    def __init__(self, jobs, clock, limit=None, window=3600):
+        self.jobs = jobs
+        self.clock = clock
+        self.start = clock.time()
+        self.limit = limit
+        self.window = window
+        self.reset = None
+        self.count = 0
+        self.requests = 0
+        self.bytes = 0
+
+    def urlopen(self, request):
+        self.requests += 1
+        now = self.clock.time()
+        headers = {}
+        if self.limit:
+            if self.reset is None or now >= self.reset:
+                self.reset, self.count = now + self.window, 0
+            self.count += 1
+            headers.update({
+                'X-RateLimit-Remaining': str(max(self.limit - self.count, 0)),
+                'X-RateLimit-Reset': repr(self.reset),
+            })
+            if self.count > self.limit:
+                headers['Retry-After'] = str(int(self.reset - now) + 1)
+                raise after.urllib2.HTTPError(
+                    request.get_full_url(), 429, 'Too Many Requests',
+                    headers, io.BytesIO(b'{}'))
+
+        path = request.get_full_url()[len(API_URL):]
+        if path == '/auth/github':
+            body = {'access_token': 'stub'}
+        elif path.startswith('/jobs/'):
+            body = {'job': self.job(int(path[len('/jobs/'):]), now)}
+        else:
+            body = {
+                'build': {'id': 1, 'job_ids': list(range(len(self.jobs))),
+                          'state': 'started'},
+                'jobs': [self.job(job_id, now)
+                         for job_id in range(len(self.jobs))],
+            }
+
+        content = json.dumps(body).encode('utf-8')
+        self.bytes += len(content)
+        return Response(content, headers)
+
+    def job(self, job_id, now):
+        """Make the document of a job as it is at a time."""
+        job = self.jobs[job_id]
+        finished = self.start + job['finished'] <= now
+        config = dict(JOB_CONFIG, os=job.get('os', 'linux'))
+        return {
+            'id': job_id,
+            'number': job['number'],
+            'allow_failure': job.get('allow_failure', False),
+            'started_at': '2019-01-01T00:00:00Z',
+            'finished_at': '2019-01-01T01:00:00Z' if finished else None,
+            'state': job['state'] if finished else 'started',
+            'config': config,
+        }
+
+
+class Quiet(object):
+    """A stream that drops what is written to it."""
+
+    def write(self, text):
+        pass
+
+    def flush(self):
+        pass
+
+
+def outcome_time(jobs):
+    """Get when the outcome of the build is known to the waiting job."""
+    required = [job for job in jobs[1:] if not job.get('allow_failure')]
+    failed = [job['finished'] for job in required if job['state'] != 'passed']
+    if failed:
+        return min(failed)
+    return max([job['finished'] for job in required] or [0])
+
+
+def replay(jobs, polling_interval, limit=None):
+    """Wait for the jobs of a timeline, and measure how it went."""
+    clock = FakeClock()
+    transport = ReplayTransport(jobs, clock, limit=limit)
+    after.clock, after.transport = clock, transport
+    after.rate_limit = after.RateLimit()
+    os.environ['TOX_TRAVIS_CACHE_DIR'] = tempfile.mkdtemp()
+
+    stdout, sys.stdout = sys.stdout, Quiet()  # Not the progress of the wait
+    try:
+        after.get_job_statuses('github', API_URL, '1', polling_interval,
+                               jobs[0]['number'])
+    finally:
+        sys.stdout = stdout
+
+    return {
+        'latency': clock.time() - START - outcome_time(jobs),
+        'requests': transport.requests,
+        'bytes': transport.bytes,
+    }
+
+
+def make_timelines(seed):
+    """Make builds that are typical, that fail, or that have stragglers."""
+    rng = random.Random(seed)
+
+    def job(index, finished, state='passed', **kwargs):
+        return dict(number='1.{0}'.format(index + 1), finished=finished,
+                    state=state, **kwargs)
+
+    return {
+        'small': [job(index, rng.uniform(60, 600)) for index in range(4)],
+        'large': [job(index, rng.uniform(60, 1800)) for index in range(200)],
+        'straggler': [job(index, rng.uniform(60, 600)) for index in range(8)] +
+                     [job(8, 3600, os='osx')],
+        'failed': [job(index, rng.uniform(600, 1800)) for index in range(8)] +
+                  [job(8, 120, state='failed')],
+        'allowed': [job(index, rng.uniform(60, 600)) for index in range(8)] +
+                   [job(8, 3600, state='failed', allow_failure=True)],
+    }
+
+
+def main():
+    """Replay each timeline with each polling interval."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-i', '--interval', type=int, nargs='+',
+                        default=[5, 30], help='The polling intervals.')
+    parser.add_argument('-t', '--timeline', nargs='+', default=[],
+                        help='Recorded timelines to replay as well.')
+    parser.add_argument('-l', '--limit', type=int, default=None,
+                        help='Requests allowed per hour by the stub.')
+    parser.add_argument('-s', '--seed', type=int, default=0,
+                        help='Seed of the synthetic timelines.')
+    options = parser.parse_args()
+
+    timelines = sorted(make_timelines(options.seed).items())
+    for path in options.timeline:
+        with open(path) as timeline:
+            timelines.append((os.path.basename(path),
+                              json.load(timeline)['jobs']))
+
+    print('{0:<16} {1:>8} {2:>10} {3:>9} {4:>12}'.format(
+        'timeline', 'interval', 'latency', 'requests', 'bytes'))
+    for name, jobs in timelines:
+        for interval in options.interval:
+            result = replay(jobs, interval, options.limit)
+            print('{0:<16} {1:>7}s {2:>9.1f}s {3:>9} {4:>12}'.format(
+                name, interval, result['latency'],
+                result['requests'], result['bytes']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
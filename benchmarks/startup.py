@@ -0,0 +1,48 @@
+"""Compare the startup time of ``python -m tox_travis`` with ``tox -l``.
+
+Run it from a directory with a tox config, in a Travis-like environment::
+
+    TRAVIS=true TRAVIS_PYTHON_VERSION=3.7 python benchmarks/startup.py
+
+Both commands list the envs that the job would run.
+"""
+from __future__ import print_function
+import argparse
+import subprocess
+import sys
+import timeit
+
+COMMANDS = [
+    ('python -m tox_travis', [sys.executable, '-m', 'tox_travis']),
+    ('tox -l', [sys.executable, '-m', 'tox', '-l']),
+]
+
+
+def run(command):
+    """Run a command, and check that it succeeds."""
+    subprocess.check_call(command, stdout=subprocess.PIPE)
+
+
+def main():
+    """Time each command, and print the best time of each."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--number', type=int, default=10,
+                        help='How many times to run each command.')
+    options = parser.parse_args()
+
+    outputs = set(
+        subprocess.check_output(command) for _, command in COMMANDS)
+    if len(outputs) != 1:
+        print('The commands list different envs.', file=sys.stderr)
+        return 1
+
+    for name, command in COMMANDS:
+        times = timeit.repeat(lambda: run(command),
+                              repeat=options.number, number=1)
+        print('{0:<22} best {1:7.1f} ms   mean {2:7.1f} ms'.format(
+            name, min(times) * 1000, sum(times) / len(times) * 1000))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -66,9 +66,9 @@ setup(
     package_dir={'': 'src'},
     packages=find_packages('src'),
     entry_points={
-        'tox': ['travis = tox_travis.hooks'],
+        'tox': ['travis = tox_travis.plugin'],
     },
-    install_requires=['tox>=2.0,<4'],
+    install_requires=['tox>=2.0,<5'],
     python_requires='>=2.7, !=3.0.*, !=3.1.*, !=3.2.*, !=3.3.*',
     classifiers=[
         'Development Status :: 4 - Beta',
@@ -1 +1,4 @@
 """Make it easy to work with Tox and Travis."""
+from .resolver import resolve
+
+__all__ = ['resolve']
@@ -0,0 +1,6 @@
+"""List the envs of a Travis job with ``python -m tox_travis``."""
+import sys
+
+from .resolver import main
+
+sys.exit(main())
@@ -4,14 +4,28 @@ import os
 import sys
 import json
 import time
+import errno
+import shlex
+import fnmatch
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import closing
+from email.utils import parsedate_tz, mktime_tz
+from multiprocessing.pool import ThreadPool
 
-from tox.config import _split_env as split_env
 try:
     import urllib.request as urllib2
 except ImportError:
     import urllib2  # Python 2
+try:
+    string_types = basestring
+except NameError:
+    string_types = str  # Python 3
 
-from .utils import TRAVIS_FACTORS, parse_dict
+from . import jsonstream
+from .envlist import expand_envlist
+from .utils import TRAVIS_FACTORS, parse_dict, get_cache_dir
 
 
 # Exit code constants. They are purposely undocumented.
@@ -21,6 +35,33 @@ INVALID_POLLING_INTERVAL = 33
 INCOMPLETE_TRAVIS_ENVIRONMENT = 34
 JOBS_FAILED = 35
 
+# How long, in seconds, to reuse a cached Travis access token
+ACCESS_TOKEN_TTL = 60 * 60
+
+# The most requests to make at once when fetching the jobs of a build
+MAX_CONCURRENT_REQUESTS = 8
+
+# The job fields needed to decide whether a build is complete
+REQUIRED_JOB_FIELDS = ('number', 'allow_failure', 'finished_at', 'state')
+JOB_FIELDS = ('id',) + REQUIRED_JOB_FIELDS + ('config',)
+
+# The parts of the job config that the [travis:after] selector looks at
+CONFIG_FIELDS = ('os', 'env', 'stage')
+
+# The parts of a build document to parse, see jsonstream
+BUILD_DOCUMENT = {
+    'build': {'job_ids': True},
+    'jobs': [dict(dict.fromkeys(JOB_FIELDS, True),
+                  config=dict.fromkeys(CONFIG_FIELDS, True))],
+    '@pagination': {'next': {'@href': True}},
+}
+
+# Retry requests that were refused for being over the rate limit,
+# or because the API is temporarily unavailable.
+RETRY_STATUSES = (429, 503)
+MAX_RETRIES = 5
+MAX_BACKOFF = 60
+
 
 def travis_after(ini, envlist):
     """Wait for all jobs to finish, then exit successfully."""
@@ -53,7 +94,8 @@ def travis_after(ini, envlist):
 
     # This may raise an Exception, and it should be printed
     job_statuses = get_job_statuses(
-        github_token, api_url, build_id, polling_interval, job_number)
+        github_token, api_url, build_id, polling_interval, job_number,
+        selector=get_job_selector(ini))
 
     if not all(job_statuses):
         print('Some jobs were not successful.')
@@ -96,39 +138,263 @@ def after_config_matches(ini, envlist):
     ])
 
 
+def split_env(value):
+    """Split and expand a list of envs, the way tox does."""
+    return [env.name for env in expand_envlist(value)]
+
+
+def get_job_selector(ini):
+    """Get which jobs to wait for from the ``[travis:after]`` section.
+
+    The ``jobs`` key has patterns of job numbers, and the ``os`` and
+    ``stage`` keys have the values to match in the job configs.
+    The ``job_env`` key has the environment variables that must be
+    set in the job configs, like the ``env`` key of the current job.
+    Return None if none of them are given, to wait for all the jobs.
+    """
+    section = ini.sections.get('travis:after', {})
+    selector = dict(
+        (key, split_env(section[key]))
+        for key in ('jobs', 'os', 'stage') if section.get(key)
+    )
+    if section.get('job_env'):
+        selector['job_env'] = parse_dict(section['job_env'])
+    return selector or None
+
+
+def job_selected(job, selector):
+    """Check whether a job is one of those the selector waits for."""
+    if not selector:
+        return True
+
+    config = job.get('config') or {}
+    if 'jobs' in selector and not any(
+            fnmatch.fnmatchcase(job['number'], pattern)
+            for pattern in selector['jobs']):
+        return False
+    if 'os' in selector and \
+            config.get('os', 'linux') not in selector['os']:
+        return False
+    if 'stage' in selector and \
+            (config.get('stage') or 'test').lower() not in [
+                stage.lower() for stage in selector['stage']]:
+        return False
+
+    job_env = parse_job_env(config.get('env'))
+    return all(job_env.get(name) == value
+               for name, value in selector.get('job_env', {}).items())
+
+
+def parse_job_env(env):
+    """Parse the environment variables of a job config.
+
+    Travis gives them as a string like ``DJANGO=1.8 DEBUG="on"``,
+    or a list of such strings. Encrypted variables are left out.
+    """
+    if not isinstance(env, list):
+        env = [env]
+
+    variables = {}
+    for item in env:
+        if not isinstance(item, string_types):
+            continue  # Encrypted, or missing
+        try:
+            words = shlex.split(item)
+        except ValueError:
+            words = item.split()
+        variables.update(
+            word.split('=', 1) for word in words if '=' in word)
+    return variables
+
+
 def get_job_statuses(github_token, api_url, build_id,
-                     polling_interval, job_number):
+                     polling_interval, job_number, selector=None):
     """Wait for all the travis jobs to complete.
 
     Once the other jobs are complete, return a list of booleans,
     indicating whether or not the job was successful. Ignore jobs
-    marked "allow_failure".
+    marked "allow_failure", and those that the selector doesn't pick.
     """
-    auth = get_json('{api_url}/auth/github'.format(api_url=api_url),
-                    data={'github_token': github_token})['access_token']
+    auth = get_access_token(github_token, api_url)
+    refreshed = False
 
     while True:
-        build = get_json('{api_url}/builds/{build_id}'.format(
-            api_url=api_url, build_id=build_id), auth=auth)
-        jobs = [job for job in build['jobs']
-                if job['number'] != job_number and
-                not job['allow_failure']]  # Ignore allowed failures
-        if all(job['finished_at'] for job in jobs):
-            break  # All the jobs have completed
-        elif any(job['state'] != 'passed'
-                 for job in jobs if job['finished_at']):
-            break  # Some required job that finished did not pass
+        try:
+            build_jobs = get_jobs(api_url, build_id, auth)
+        except urllib2.HTTPError as error:
+            if error.code != 401 or refreshed:
+                raise
+            # The cached access token is no longer accepted
+            auth = get_access_token(github_token, api_url, refresh=True)
+            refreshed = True
+            continue
+
+        jobs = get_required_jobs(build_jobs, job_number, selector)
+        if outcome_known(jobs):
+            break
 
         print('Waiting for jobs to complete: {job_numbers}'.format(
             job_numbers=[job['number'] for job in jobs
                          if not job['finished_at']]))
-        time.sleep(polling_interval)
+        clock.sleep(rate_limit.delay(polling_interval))
 
     return [job['state'] == 'passed' for job in jobs]
 
 
-def get_json(url, auth=None, data=None):
+def get_required_jobs(build_jobs, job_number, selector=None):
+    """Get the jobs of a build that the waiting job depends on."""
+    return [job for job in build_jobs
+            if job['number'] != job_number and
+            not job['allow_failure'] and  # Ignore allowed failures
+            job_selected(job, selector)]
+
+
+def outcome_known(jobs):
+    """Determine if the outcome of the required jobs is known."""
+    if all(job['finished_at'] for job in jobs):
+        return True  # All the jobs have completed
+    # Or some required job that finished did not pass
+    return any(job['state'] != 'passed'
+               for job in jobs if job['finished_at'])
+
+
+def get_jobs(api_url, build_id, auth, limit=None):
+    """Get all the jobs of a build.
+
+    Follow the pagination of the build document, if any. Then fetch
+    the jobs that the build lists in its ``job_ids``, but that are
+    missing or incomplete in the build document, concurrently.
+    Return the jobs in the order that the build lists them,
+    with only the fields in ``JOB_FIELDS`` and ``CONFIG_FIELDS``.
+    The requests are kept within the rate ``limit`` of the API,
+    like in :func:`open_url`.
+    """
+    url = '{api_url}/builds/{build_id}'.format(
+        api_url=api_url, build_id=build_id)
+    job_ids = []
+    jobs = OrderedDict()
+
+    while url:
+        document = get_build(url, auth=auth, limit=limit)
+        job_ids.extend(
+            job_id for job_id in
+            (document.get('build') or {}).get('job_ids') or []
+            if job_id not in job_ids)
+        for job in document.get('jobs') or []:
+            jobs[job.get('id', job['number'])] = job
+        next_page = (document.get('@pagination') or {}).get('next')
+        url = next_page and api_url + next_page['@href']
+
+    missing = [
+        job_id for job_id in job_ids
+        if not all(field in jobs.get(job_id, {})
+                   for field in REQUIRED_JOB_FIELDS)
+    ]
+    if missing:
+        def get_job(job_id):
+            job = get_json('{api_url}/jobs/{job_id}'.format(
+                api_url=api_url, job_id=job_id), auth=auth,
+                limit=limit)['job']
+            job = dict((field, job[field])
+                       for field in JOB_FIELDS if field in job)
+            if isinstance(job.get('config'), dict):
+                job['config'] = dict(
+                    (field, job['config'][field])
+                    for field in CONFIG_FIELDS if field in job['config'])
+            return job
+
+        pool = ThreadPool(min(len(missing), MAX_CONCURRENT_REQUESTS))
+        try:
+            for job_id, job in zip(missing, pool.map(get_job, missing)):
+                jobs[job_id] = job
+        finally:
+            pool.close()
+            pool.join()
+
+    ordered = [jobs.pop(job_id) for job_id in job_ids if job_id in jobs]
+    return ordered + list(jobs.values())
+
+
+def get_access_token(github_token, api_url, refresh=False, limit=None):
+    """Exchange the GitHub token for a Travis access token.
+
+    The access token is cached for a while, so that running tox
+    several times in the same job only makes the exchange once.
+    The cache is keyed on the API URL and a hash of the GitHub token,
+    and is only readable by the current user.
+    Pass ``refresh=True`` to ignore the cached token.
+    The exchange is kept within the rate ``limit`` of the API,
+    like in :func:`open_url`.
+    """
+    key = hashlib.sha256('{0}\n{1}'.format(
+        api_url, github_token).encode('utf-8')).hexdigest()
+    path = os.path.join(get_cache_dir(), 'tokens', key + '.json')
+
+    if not refresh:
+        try:
+            with open(path) as f:
+                cached = json.load(f)
+            if cached['expires'] > clock.time():
+                return cached['access_token']
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            pass  # Missing or corrupt cache, get a new token
+
+    auth = get_json('{api_url}/auth/github'.format(api_url=api_url),
+                    data={'github_token': github_token}, limit=limit)
+    access_token = auth['access_token']
+
+    try:
+        write_private(path, json.dumps({
+            'access_token': access_token,
+            'expires': clock.time() + ACCESS_TOKEN_TTL,
+        }))
+    except (IOError, OSError):
+        pass  # Caching is only an optimization
+
+    return access_token
+
+
+def write_private(path, content):
+    """Write content to a file that only the current user can read."""
+    dirname = os.path.dirname(path)
+    try:
+        os.makedirs(dirname, 0o700)
+    except OSError as error:
+        if error.errno != errno.EEXIST:
+            raise
+
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    os.chmod(path, 0o600)  # In case the file already existed
+    with os.fdopen(fd, 'w') as f:
+        f.write(content)
+
+
+def get_json(url, auth=None, data=None, limit=None):
     """Make a GET request, and return the response as parsed JSON."""
+    with closing(open_url(url, auth=auth, data=data,
+                          limit=limit)) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+def get_build(url, auth=None, limit=None):
+    """Get a build document with only the parts in ``BUILD_DOCUMENT``.
+
+    Build documents can be large, and only a few of their fields
+    are needed, so they are parsed as they are read from the response.
+    """
+    with closing(open_url(url, auth=auth, limit=limit)) as response:
+        return jsonstream.load(response, BUILD_DOCUMENT)
+
+
+def open_url(url, auth=None, data=None, limit=None):
+    """Make a request to the Travis API, and return the response.
+
+    The request is kept within the rate ``limit`` of the API, which
+    is the module-level ``rate_limit`` by default. Requests to other
+    APIs need their own :class:`RateLimit`, since each API has its own.
+    """
+    if limit is None:
+        limit = rate_limit
     headers = {
         'Accept': 'application/vnd.travis-ci.2+json',
         'User-Agent': 'Travis/Tox-Travis-1.0a',
@@ -143,5 +409,129 @@ def get_json(url, auth=None, data=None):
         params['data'] = json.dumps(data).encode('utf-8')
 
     request = urllib2.Request(url, headers=headers, **params)
-    response = urllib2.urlopen(request).read()
-    return json.loads(response.decode('utf-8'))
+    attempt = 0
+    while True:
+        limit.acquire()
+        try:
+            response = transport.urlopen(request)
+        except urllib2.HTTPError as error:
+            limit.update(error.info())
+            if error.code not in RETRY_STATUSES or attempt >= MAX_RETRIES:
+                raise
+            clock.sleep(limit.backoff(error.info(), attempt))
+            attempt += 1
+            continue
+
+        limit.update(response.info())
+        return response
+
+
+class Clock(object):
+    """Tell the time, and wait, for the requests to the Travis API.
+
+    The module-level ``clock`` is used throughout. It can be replaced
+    to run the polling against simulated time, without waiting.
+    """
+
+    def time(self):
+        """Get the current time, in seconds since the epoch."""
+        return time.time()
+
+    def sleep(self, seconds):
+        """Wait for a number of seconds."""
+        time.sleep(seconds)
+
+
+class Transport(object):
+    """Send the requests to the Travis API.
+
+    The module-level ``transport`` is used throughout. It can be
+    replaced to answer the requests without a network, like a stub
+    of the API that replays the timeline of a build.
+    """
+
+    def urlopen(self, request):
+        """Send a request, and return the response.
+
+        Like :func:`urllib.request.urlopen`, raise an ``HTTPError``
+        for error responses.
+        """
+        return urllib2.urlopen(request)
+
+
+class RateLimit(object):
+    """Keep requests to the Travis API within its rate limit.
+
+    The API reports how many requests are remaining, and when that
+    budget will be reset, in the ``X-RateLimit-Remaining`` and
+    ``X-RateLimit-Reset`` headers. The budget is shared by every
+    build of the account, so rather than polling as fast as the
+    polling interval allows, spread the remaining requests evenly
+    over the time until the reset.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.remaining = None
+        self.reset = None
+        self.requests = 0  # Made since the last delay
+
+    def acquire(self):
+        """Wait until a request can be made without exceeding the limit."""
+        while True:
+            with self.lock:
+                wait = self.reset - clock.time() if self.reset else 0
+                if self.remaining is None or self.remaining > 0 or wait <= 0:
+                    if wait <= 0:
+                        self.remaining = self.reset = None
+                    elif self.remaining is not None:
+                        self.remaining -= 1
+                    self.requests += 1
+                    return
+            clock.sleep(wait)
+
+    def update(self, headers):
+        """Update the budget from the headers of a response."""
+        try:
+            remaining = int(headers['X-RateLimit-Remaining'])
+            reset = float(headers['X-RateLimit-Reset'])
+        except (KeyError, TypeError, ValueError):
+            return
+
+        with self.lock:
+            if reset == self.reset and self.remaining is not None:
+                # Responses to concurrent requests may arrive out of order
+                remaining = min(remaining, self.remaining)
+            self.remaining, self.reset = remaining, reset
+
+    def delay(self, polling_interval):
+        """Get how long to wait before the next polling round."""
+        with self.lock:
+            requests, self.requests = self.requests, 0
+            if self.remaining is None:
+                return polling_interval
+
+            window = self.reset - clock.time()
+            rounds = self.remaining // max(requests, 1)
+            if window <= 0:
+                return polling_interval
+            if rounds < 1:
+                return max(polling_interval, window)
+            return max(polling_interval, window / rounds)
+
+    def backoff(self, headers, attempt):
+        """Get how long to wait before retrying a refused request."""
+        retry_after = headers and headers.get('Retry-After')
+        if retry_after:
+            try:
+                return max(0, int(retry_after))
+            except ValueError:
+                date = parsedate_tz(retry_after)
+                if date:
+                    return max(0, mktime_tz(date) - clock.time())
+        return min(2 ** attempt, MAX_BACKOFF)
+
+
+clock = Clock()
+transport = Transport()
+rate_limit = RateLimit()
@@ -0,0 +1,135 @@
+"""Share the identical installed files of the envs of a Travis job."""
+from __future__ import print_function
+import os
+import stat
+import sys
+from collections import defaultdict
+
+import tox.config
+
+from .utils import format_size, hash_file
+
+
+def get_dedupe_store(config):
+    """Get the store of the files shared between the envs of this job.
+
+    The ``dedupe_store`` key of the ``[travis]`` section names a
+    directory where the content of the identical files installed in
+    the envs is stored once. Returns None if it isn't configured.
+    """
+    reader = tox.config.SectionReader('travis', config._cfg)
+    reader.addsubstitutions(toxinidir=config.toxinidir,
+                            toxworkdir=config.toxworkdir,
+                            homedir=config.homedir)
+    return reader.getpath('dedupe_store', None)
+
+
+def dedupe_envs(config, envnames, store):
+    """Replace the identical files of the envs with links to the store.
+
+    The files in the site-packages of the envs are compared by size
+    first, and only the ones of the same size are hashed. The first copy
+    of each distinct content is moved into the store, which is keyed by
+    the hash and mode of the files, and then every copy is replaced
+    with a hardlink to it. Files that already are links to the store
+    are left as they are, so running this again is cheap.
+
+    Prints the disk space saved by the new links, and the total size
+    of the copies that the Travis cache no longer needs to upload.
+    """
+    if not hasattr(os, 'link'):
+        return  # Python 2 on Windows can't make hardlinks
+
+    envdirs = [
+        str(config.envconfigs[envname].envdir) for envname in envnames
+        if envname in config.envconfigs
+    ]
+    files = list(find_site_packages_files(envdirs))
+
+    # Group the copies by size, and only hash the ones that may match
+    by_size = defaultdict(list)
+    for path, info in files:
+        by_size[info.st_size, stat.S_IMODE(info.st_mode)].append((path, info))
+
+    disk_saved = upload_saved = linked = 0
+    for (size, mode), copies in by_size.items():
+        if len(copies) < 2:
+            continue
+
+        # Copies that are already links share their content
+        inodes = set((info.st_dev, info.st_ino) for _, info in copies)
+        if len(inodes) == 1:
+            upload_saved += size * (len(copies) - 1)
+            continue
+
+        by_content = defaultdict(list)
+        digests = {}
+        for path, info in copies:
+            inode = (info.st_dev, info.st_ino)
+            if inode not in digests:
+                digests[inode] = hash_file(path)
+            by_content[digests[inode]].append((path, info))
+
+        for digest, same in by_content.items():
+            if len(same) < 2:
+                continue
+            upload_saved += size * (len(same) - 1)
+            target = os.path.join(store, digest[:2], '{0}-{1:o}'.format(
+                digest[2:], mode))
+            for path, info in same:
+                if link_to_store(path, info, target):
+                    disk_saved += size
+                    linked += 1
+
+    print('Linked {0} identical files in the envs to {1}, saving {2} of '
+          'disk, and {3} of the cache upload.'.format(
+              linked, store, format_size(disk_saved),
+              format_size(upload_saved)), file=sys.stderr)
+    return disk_saved, upload_saved
+
+
+def find_site_packages_files(envdirs):
+    """Find the regular files installed in the site-packages of the envs."""
+    for envdir in envdirs:
+        for root, dirs, _ in os.walk(envdir):
+            if os.path.basename(root) != 'site-packages':
+                continue
+            dirs[:] = []  # Don't look for another site-packages inside
+            for subroot, _, names in os.walk(root):
+                for name in names:
+                    path = os.path.join(subroot, name)
+                    info = os.lstat(path)
+                    if stat.S_ISREG(info.st_mode) and info.st_size:
+                        yield path, info
+
+
+def link_to_store(path, info, target):
+    """Make a file a hardlink to its content in the store.
+
+    The first file with some content is linked into the store.
+    Returns True if the file was replaced by a link.
+    """
+    try:
+        target_info = os.lstat(target)
+    except OSError:
+        if not os.path.isdir(os.path.dirname(target)):
+            os.makedirs(os.path.dirname(target))
+        try:
+            os.link(path, target)
+        except OSError:
+            return False  # Likely on another file system
+        return False
+
+    if (target_info.st_dev, target_info.st_ino) == (info.st_dev, info.st_ino):
+        return False
+
+    # Replace the file at once, so it's never missing
+    temp_path = '{0}.tox-travis-{1}'.format(path, os.getpid())
+    try:
+        os.link(target, temp_path)
+        os.rename(temp_path, path)
+    except OSError:
+        if os.path.lexists(temp_path):
+            os.remove(temp_path)
+        return False
+    return True
@@ -0,0 +1,273 @@
+"""Compare how envs are matched with a reference, on random configs.
+
+Making the matching of envs faster risks changing which envs a job
+runs, or their order, in ways that a few hand-written configs don't
+show. This generates random tox configs and desired factors, and runs
+the plain algorithm that Tox-Travis started with alongside the current
+one, or any other, to report the first case where they differ,
+and how many cases each goes through per second::
+
+    python -m tox_travis.differential --iterations 2000 --seed 7
+    python -m tox_travis.differential --matcher mypackage.fast:match
+
+A matcher takes the names of the declared envs and a list of the
+desired env names of each factor, like :func:`current_match`,
+and returns the names of the envs to run. The declared envs can be
+replaced in the same way with ``--declared``, which takes the text
+of a ``tox.ini``, like :func:`current_declared_envs`.
+
+Desired factors are plain, without patterns, which the reference
+doesn't know about. Envs listed more than once in the envlist are
+only kept the first time, as Tox-Travis does when expanding it,
+and a job without desired factors matches no envs.
+"""
+from __future__ import print_function
+import argparse
+import importlib
+import random
+import sys
+import timeit
+from itertools import product
+
+from .envlist import Env, get_declared_envs, match_desired_factors
+from .ini import IniFile
+
+# Factors are drawn from a small pool, so that envs share many of them
+FACTORS = (
+    'py27', 'py36', 'py37', 'pypy', 'pypy3', 'django111', 'django22',
+    'mysql', 'postgres', 'docs', 'lint', 'cov', 'x', 'slow',
+)
+BRACE_FACTORS = (
+    ('py27', 'py36', 'py37'), ('django111', 'django22'),
+    ('mysql', 'postgres'),
+)
+BRACE_SUFFIXES = ('', '-cov')
+
+
+def random_env(rng, factors=FACTORS):
+    """Make the name of an env of one to three factors."""
+    return '-'.join(rng.sample(factors, rng.randint(1, 3)))
+
+
+def random_envlist(rng):
+    """Make the envlist of a tox config, as people write them.
+
+    It mixes plain envs with brace expansions, spread over lines,
+    with whitespace inside the braces, comments and stray commas.
+    """
+    items = []
+    for _ in range(rng.randint(0, 6)):
+        if rng.random() < 0.4:
+            groups = rng.sample(BRACE_FACTORS, rng.randint(1, 2))
+            item = '-'.join(random_braces(rng, group) for group in groups)
+            if rng.random() < 0.3:
+                item += random_braces(rng, BRACE_SUFFIXES)
+            items.append(item)
+        else:
+            items.append(random_env(rng))
+
+    lines = []
+    for item in items:
+        if lines and rng.random() < 0.5:
+            lines[-1] += ',' + item
+        else:
+            lines.append(item)
+    if lines and rng.random() < 0.3:
+        lines[-1] += ','
+    if rng.random() < 0.2:
+        lines.insert(rng.randint(0, len(lines)), '# ' + random_env(rng))
+    return '\n'.join('    ' + line for line in lines)
+
+
+def random_braces(rng, alternatives):
+    """Make a brace expansion, sometimes with whitespace in it."""
+    separator = ', ' if rng.random() < 0.3 else ','
+    return '{' + separator.join(alternatives) + '}'
+
+
+def random_ini(rng):
+    """Make the text of a tox config with an envlist and testenvs."""
+    sections = ['[tox]\nenvlist =\n' + random_envlist(rng)]
+    if rng.random() < 0.5:
+        sections.append('[testenv]\ncommands = pytest')
+    names = set(random_env(rng) for _ in range(rng.randint(0, 4)))
+    for name in sorted(names, key=lambda name: rng.random()):
+        sections.append('[testenv:{0}]\ndeps = {1}'.format(name, name))
+    return '\n\n'.join(sections) + '\n'
+
+
+def random_desired_factors(rng, declared):
+    """Make the desired envs of each factor, mostly from declared ones."""
+    known = sorted(set(
+        factor for name in declared for factor in name.split('-')))
+    desired_factors = []
+    for _ in range(rng.choice([1, 1, 1, 2, 2, 3, 0])):
+        desired = []
+        for _ in range(rng.randint(1, 3)):
+            pool = known if known and rng.random() < 0.8 else FACTORS
+            name = '-'.join(rng.sample(pool, min(len(pool),
+                                                 rng.choice([1, 1, 2]))))
+            if name not in desired:
+                desired.append(name)
+        desired_factors.append(desired)
+    return desired_factors
+
+
+def random_cases(iterations, seed=None):
+    """Make random cases, the same ones for the same seed."""
+    rng = random.Random(seed)
+    cases = []
+    for _ in range(iterations):
+        ini = random_ini(rng)
+        declared = reference_declared_envs(ini)
+        cases.append({
+            'ini': ini,
+            'declared': declared,
+            'desired_factors': random_desired_factors(rng, declared),
+        })
+    return cases
+
+
+def reference_declared_envs(ini):
+    """Get the names of the declared envs, reading the config like tox."""
+    import py
+    from tox.config import _split_env as split_env
+
+    config = py.iniconfig.IniConfig('tox.ini', data=ini)
+    envlist = []
+    for env in split_env(config.sections.get('tox', {}).get('envlist', '')):
+        if env not in envlist:
+            envlist.append(env)
+
+    section_envs = [
+        section[8:] for section in sorted(config.sections, key=config.lineof)
+        if section.startswith('testenv:')
+    ]
+    return envlist + [env for env in section_envs if env not in envlist]
+
+
+def reference_match(declared, desired_factors):
+    """Match the envs with the product of the desired factors.
+
+    Without desired factors nothing matches, rather than the envs
+    with an empty factor, which is the only change from the original.
+    """
+    if not desired_factors:
+        return []
+    desired_envs = ['-'.join(env) for env in product(*desired_factors)]
+    matched = [
+        name for name in declared
+        if any(set(desired.split('-')) <= set(name.split('-'))
+               for desired in desired_envs)
+    ]
+    if not matched and len(desired_factors) == 1:
+        return desired_envs
+    return matched
+
+
+def current_declared_envs(ini):
+    """Get the names of the declared envs with Tox-Travis."""
+    return [env.name for env in get_declared_envs(IniFile('tox.ini', ini))]
+
+
+def current_match(declared, desired_factors):
+    """Match the envs with Tox-Travis."""
+    return [env.name for env in match_desired_factors(
+        [Env(name) for name in declared],
+        [[Env(name) for name in desired] for desired in desired_factors])]
+
+
+def compare(cases, matcher=current_match, declared=current_declared_envs):
+    """Compare a matcher and declared envs with the references.
+
+    Return the first divergence, as a dict with the ``case``,
+    the ``function`` that diverged, and the ``expected`` and ``actual``
+    results, or None if they always agree.
+    """
+    checks = [
+        ('declared', reference_declared_envs, declared,
+         lambda case: (case['ini'],)),
+        ('matcher', reference_match, matcher,
+         lambda case: (case['declared'], case['desired_factors'])),
+    ]
+    for case in cases:
+        for function, reference, candidate, get_args in checks:
+            expected = reference(*get_args(case))
+            actual = candidate(*get_args(case))
+            if list(actual) != list(expected):
+                return {
+                    'case': case,
+                    'function': function,
+                    'expected': expected,
+                    'actual': list(actual),
+                }
+    return None
+
+
+def measure(function, arguments, repeat=3):
+    """Get how many calls of a function are made per second at best."""
+    def run():
+        for args in arguments:
+            function(*args)
+    best = min(timeit.repeat(run, repeat=repeat, number=1))
+    return len(arguments) / best if best else float('inf')
+
+
+def load(name):
+    """Load a function given as ``module:function``."""
+    module, _, function = name.partition(':')
+    return getattr(importlib.import_module(module), function)
+
+
+def main(args=None):
+    """Compare a matcher with the references, and report their speed."""
+    parser = argparse.ArgumentParser(
+        prog='python -m tox_travis.differential',
+        description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--iterations', type=int, default=1000,
+                        help='How many random cases to compare.')
+    parser.add_argument('-s', '--seed', type=int, default=None,
+                        help='Seed of the random cases, to reproduce them.')
+    parser.add_argument('--matcher', type=load, default=current_match,
+                        help='The matcher to compare, as module:function.')
+    parser.add_argument('--declared', type=load,
+                        default=current_declared_envs,
+                        help='The declared envs to compare, '
+                             'as module:function.')
+    options = parser.parse_args(args)
+
+    seed = options.seed
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    cases = random_cases(options.iterations, seed)
+
+    divergence = compare(cases, options.matcher, options.declared)
+    if divergence:
+        case = divergence['case']
+        print('The {0} diverged with seed {1} on:'.format(
+            divergence['function'], seed), file=sys.stderr)
+        print(case['ini'], file=sys.stderr)
+        print('Desired factors: {0!r}'.format(case['desired_factors']),
+              file=sys.stderr)
+        print('Expected: {0!r}'.format(divergence['expected']),
+              file=sys.stderr)
+        print('Actual:   {0!r}'.format(divergence['actual']),
+              file=sys.stderr)
+        return 1
+
+    print('{0} cases agree with seed {1}.'.format(len(cases), seed))
+    ini_args = [(case['ini'],) for case in cases]
+    match_args = [(case['declared'], case['desired_factors'])
+                  for case in cases]
+    for name, function, arguments in [
+            ('declared reference', reference_declared_envs, ini_args),
+            ('declared', options.declared, ini_args),
+            ('matcher reference', reference_match, match_args),
+            ('matcher', options.matcher, match_args)]:
+        print('{0:<20} {1:10.0f} cases/s'.format(
+            name, measure(function, arguments)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
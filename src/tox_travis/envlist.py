@@ -3,28 +3,147 @@ from __future__ import print_function
 
 import os
 import re
+import subprocess
 import sys
-from itertools import product
-
-import tox.config
-from tox.config import _split_env as split_env
+from itertools import groupby, product
 
+from .interpreters import find_python_versions
+from .providers import get_provided_envs, load_env_providers
 from .utils import TRAVIS_FACTORS, parse_dict
 
-def detect_envlist(ini):
-    """Default envlist automatically based on the Travis environment."""
+try:
+    intern = sys.intern
+except AttributeError:
+    def intern(string, intern=intern):
+        """Intern the factors of Python 2, which may be unicode."""
+        return intern(string) if isinstance(string, str) else string
+
+# Envlists are split on commas outside of braces, then each brace group
+# is expanded into its comma separated alternatives.
+ENVLIST_SPLIT_PATTERN = re.compile(r'((?:{[^}]+})+)|,')
+ENV_EXPAND_PATTERN = re.compile(r'{([^}]+)}')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+class Env(object):
+    """A tox env, with its name split into factors.
+
+    Envs are compared by their factors many times over while matching,
+    so the name is only split once. The factors are interned, so that
+    the many envs of a large generated matrix share the strings of the
+    factors they have in common.
+    """
+
+    __slots__ = ('name', 'factors', 'factor_set')
+
+    def __init__(self, name, factors=None):
+        self.name = name
+        if factors is None:
+            factors = tuple(map(intern, name.split('-')))
+        self.factors = factors
+        self.factor_set = frozenset(factors)
+
+    def matches(self, desired):
+        """Determine if this env has all the factors of the desired env."""
+        return desired.factor_set <= self.factor_set
+
+    def __eq__(self, other):
+        return isinstance(other, Env) and self.name == other.name
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.name)
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return 'Env({0!r})'.format(self.name)
+
+
+def detect_envlist(ini, environ=None, providers=None):
+    """Default envlist automatically based on the Travis environment.
+
+    The environment variables are read from ``environ``,
+    which defaults to ``os.environ``. The env providers enabled
+    in the tox config are loaded, unless ``providers`` are given.
+    """
     # Find the envs that tox knows about
     declared_envs = get_declared_envs(ini)
 
     # Find all the envs for all the desired factors given
-    desired_factors = get_desired_factors(ini)
+    desired_factors = get_desired_factors(ini, environ)
 
-    # Reduce desired factors
-    desired_envs = ['-'.join(env) for env in product(*desired_factors)]
+    # Add the envs declared by the providers, for those factors only
+    if providers is None:
+        providers = load_env_providers(ini)
+    if providers:
+        declared_names = set(env.name for env in declared_envs)
+        declared_envs += [
+            Env(name) for name in get_provided_envs(providers, desired_factors)
+            if name not in declared_names]
 
     # Find matching envs
-    return match_envs(declared_envs, desired_envs,
-                      passthru=len(desired_factors) == 1)
+    matched = match_desired_factors(declared_envs, desired_factors)
+
+    # Only keep the envs affected by the changes being tested
+    affected_envs = get_affected_envs(ini, environ)
+    if affected_envs is not None:
+        matched = match_envs(matched, affected_envs, passthru=False)
+
+    return [env.name for env in matched]
+
+
+def expand_envlist(value):
+    """Expand an envlist from the tox config into envs, the way tox does.
+
+    The envs are generated lazily, so that large brace expressions
+    are never expanded in full before they are matched. Like tox,
+    duplicates are kept; see :func:`unique_envs`.
+    """
+    lines = (line.split('#', 1)[0].strip() for line in value.splitlines())
+    tokens = ENVLIST_SPLIT_PATTERN.split(','.join(line for line in lines
+                                                  if line))
+    for is_env, group in groupby(tokens, key=bool):
+        if not is_env:
+            continue
+        parts = [
+            WHITESPACE_PATTERN.sub('', token).split(',')
+            for token in ENV_EXPAND_PATTERN.split(''.join(group).strip())
+        ]
+        for variant in product(*parts):
+            yield Env(''.join(variant))
+
+
+def unique_envs(envs):
+    """Drop the envs that were already given, keeping the first."""
+    seen = set()
+    for env in envs:
+        if env.name not in seen:
+            seen.add(env.name)
+            yield env
+
+
+class Envlist(object):
+    """An envlist of the tox config, expanded each time it's iterated.
+
+    Matching only goes through the envs once, and the desired envs are
+    only gone through again to be used verbatim when nothing matched,
+    so they are never kept in full.
+    """
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __iter__(self):
+        return expand_envlist(self.value)
+
+    def __repr__(self):
+        return 'Envlist({0!r})'.format(self.value)
 
 
 def autogen_envconfigs(config, envs):
@@ -33,6 +152,7 @@ def autogen_envconfigs(config, envs):
     This is a stripped-down version of parseini.__init__ made for making
     an envconfig.
     """
+    import tox.config  # Only needed from within tox, which is slow to import
     prefix = 'tox' if config.toxinipath.basename == 'setup.cfg' else None
     reader = tox.config.SectionReader("tox", config._cfg, prefix=prefix)
     distshare_default = "{homedir}/.tox/distshare"
@@ -53,7 +173,7 @@ def autogen_envconfigs(config, envs):
     make_envconfig = getattr(make_envconfig, '__func__', make_envconfig)
 
     # Create the undeclared envs
-    for env in envs:
+    for env in map(str, envs):
         section = tox.config.testenvprefix + env
         config.envconfigs[env] = make_envconfig(
             config, env, section, reader._subs, config)
@@ -70,7 +190,10 @@ def get_declared_envs(ini):
     """
     tox_section_name = 'tox:tox' if ini.path.endswith('setup.cfg') else 'tox'
     tox_section = ini.sections.get(tox_section_name, {})
-    envlist = split_env(tox_section.get('envlist', []))
+    # Tox 4 also reads the envlist as env_list
+    envlist = list(unique_envs(expand_envlist(
+        tox_section.get('envlist', tox_section.get('env_list', '')))))
+    envlist_names = set(env.name for env in envlist)
 
     # Add additional envs that are declared as sections in the ini
     section_envs = [
@@ -78,15 +201,70 @@ def get_declared_envs(ini):
         if section.startswith('testenv:')
     ]
 
-    return envlist + [env for env in section_envs if env not in envlist]
+    return envlist + [
+        Env(env) for env in section_envs if env not in envlist_names]
+
 
+def get_affected_envs(ini, environ=None):
+    """Get the envs affected by the files changed in this build.
+
+    The ``[travis:paths]`` section maps globs of paths, relative to the
+    root of the repository, to envs. The files changed in the commit
+    range of the build are read from the git checkout, and the envs
+    of each glob matching a changed file are affected.
+
+    Return None if every env may be affected. That's the case when
+    the paths aren't configured, the changes can't be found, no file
+    changed, like in an empty commit made to build again, or
+    a changed file doesn't match any of the globs.
+    """
+    rules = [
+        (re.compile(translate_glob(glob) + r'\Z'), envlist)
+        for glob, envlist in ini.sections.get('travis:paths', {}).items()
+    ]
+    environ = os.environ if environ is None else environ
+    commit_range = environ.get('TRAVIS_COMMIT_RANGE')
+    if not rules or not commit_range:
+        return None
 
-def get_version_info():
+    try:
+        output = subprocess.check_output(
+            ['git', 'diff', '--name-only', '-z', commit_range],
+            cwd=os.path.dirname(str(ini.path)) or None,
+            stderr=subprocess.PIPE)
+    except (OSError, subprocess.CalledProcessError):
+        print('Unable to find the files changed in {0}, '
+              'running all the envs.'.format(commit_range), file=sys.stderr)
+        return None
+    changed = list(filter(None, output.decode('utf-8', 'replace').split('\0')))
+    if not changed:
+        return None  # Likely built again on purpose, so run everything
+
+    # Check each file against all the globs with one regex, and only
+    # check the globs one by one while some of them are still unmatched.
+    any_rule = re.compile('|'.join(regex.pattern for regex, _ in rules))
+    unmatched = list(rules)
+    affected = []
+    for path in changed:
+        if not any_rule.match(path):
+            return None  # An unclassified change could affect anything
+        for rule in list(unmatched):
+            if rule[0].match(path):
+                unmatched.remove(rule)
+                affected.append(rule[1])
+
+    print('Running the envs affected by the changes in {0}.'.format(
+        commit_range), file=sys.stderr)
+    return Envlist(','.join(affected))
+
+
+def get_version_info(environ=None):
     """Get version info from the sys module.
 
     Override from environment for testing.
     """
-    overrides = os.environ.get('__TOX_TRAVIS_SYS_VERSION')
+    environ = os.environ if environ is None else environ
+    overrides = environ.get('__TOX_TRAVIS_SYS_VERSION')
     if overrides:
         version, major, minor = overrides.split(',')[:3]
         major, minor = int(major), int(minor)
@@ -95,15 +273,15 @@ def get_version_info():
     return version, major, minor
 
 
-def guess_python_env():
+def guess_python_env(environ=None):
     """Guess the default python env to use."""
-    version, major, minor = get_version_info()
+    version, major, minor = get_version_info(environ)
     if 'PyPy' in version:
         return 'pypy3' if major == 3 else 'pypy'
     return 'py{major}{minor}'.format(major=major, minor=minor)
 
 
-def get_default_envlist(version):
+def get_default_envlist(version, environ=None):
     """Parse a default tox env based on the version.
 
     The version comes from the ``TRAVIS_PYTHON_VERSION`` environment
@@ -113,20 +291,21 @@ def get_default_envlist(version):
     if version in ['pypy', 'pypy3']:
         return version
 
-    # Assume single digit major and minor versions
-    match = re.match(r'^(\d)\.(\d)(?:\.\d+)?$', version or '')
+    # Assume a single digit major version
+    match = re.match(r'^(\d)\.(\d+)(?:\.\d+)?$', version or '')
     if match:
         major, minor = match.groups()
         return 'py{major}{minor}'.format(major=major, minor=minor)
 
-    return guess_python_env()
+    return guess_python_env(environ)
 
 
-def get_desired_factors(ini):
+def get_desired_factors(ini, environ=None):
     """Get the list of desired envs per declared factor.
 
     Look at all the accepted configuration locations, and give a list
-    of envlists, one for each Travis factor found.
+    of envlists, one for each Travis factor found. Each envlist is
+    an :class:`Envlist`, expanded lazily each time it's gone through.
 
     Look in the ``[travis]`` section for the known Travis factors,
     which are backed by environment variable checking behind the
@@ -152,7 +331,13 @@ def get_desired_factors(ini):
     combined as and when appropriate by the caller. This allows for
     special handling based on the number of factors that were found
     to apply to this environment.
+
+    With ``interpreters = auto`` in the ``[travis]`` section, the
+    ``python`` factor selects the envs of every Python version installed,
+    rather than only the one in ``TRAVIS_PYTHON_VERSION``.
     """
+    environ = os.environ if environ is None else environ
+
     # Find configuration based on known travis factors
     travis_section = ini.sections.get('travis', {})
     found_factors = [
@@ -168,9 +353,9 @@ def get_desired_factors(ini):
         found_factors.append(('python', ini.sections['tox:travis']))
 
     # Inject any needed autoenv
-    version = os.environ.get('TRAVIS_PYTHON_VERSION')
+    version = environ.get('TRAVIS_PYTHON_VERSION')
     if version:
-        default_envlist = get_default_envlist(version)
+        default_envlist = get_default_envlist(version, environ)
         if not any(factor == 'python' for factor, _ in found_factors):
             found_factors.insert(0, ('python', {version: default_envlist}))
         python_factors = [(factor, mapping)
@@ -179,6 +364,22 @@ def get_desired_factors(ini):
         for _, mapping in python_factors:
             mapping.setdefault(version, default_envlist)
 
+    # Select the envs of all the installed interpreters at once
+    python_envlists = []
+    if use_all_interpreters(ini):
+        versions = find_python_versions(environ)
+        python_mappings = [mapping for factor, mapping in found_factors
+                           if factor == 'python'] or [{}]
+        found_factors = [(factor, mapping)
+                         for factor, mapping in found_factors
+                         if factor != 'python']
+        python_envlists = [
+            ', '.join(mapping.get(version) or
+                      get_default_envlist(version, environ)
+                      for version in versions)
+            for mapping in python_mappings
+        ]
+
     # Convert known travis factors to env factors,
     # and combine with declared env factors.
     env_factors = [
@@ -190,29 +391,172 @@ def get_desired_factors(ini):
     ]
 
     # Choose the correct envlists based on the factor values
-    return [
-        split_env(mapping[os.environ[name]])
+    return [Envlist(envlist) for envlist in python_envlists] + [
+        Envlist(mapping[environ[name]])
         for name, mapping in env_factors
-        if name in os.environ and os.environ[name] in mapping
+        if name in environ and environ[name] in mapping
     ]
 
 
+def use_all_interpreters(ini):
+    """Decide whether to run the envs of all the installed interpreters."""
+    travis_section = ini.sections.get('travis', {})
+    return travis_section.get('interpreters', '').strip().lower() == 'auto'
+
+
+def match_desired_factors(declared_envs, desired_factors):
+    """Determine the envs that match the desired factors of a job.
+
+    With a single desired factor, its desired envs are used verbatim
+    if none of the declared envs match them.
+    """
+    if len(desired_factors) == 1:
+        return match_envs(declared_envs, desired_factors[0], passthru=True)
+    return match_factors(declared_envs, desired_factors)
+
+
 def match_envs(declared_envs, desired_envs, passthru):
     """Determine the envs that match the desired_envs.
 
     If ``passthru` is True, and none of the declared envs match the
     desired envs, then the desired envs will be used verbatim.
 
-    :param declared_envs: The envs that are declared in the tox config.
-    :param desired_envs: The envs desired from the tox-travis config.
+    :param declared_envs: The :class:`Env` list declared in the tox config.
+    :param desired_envs: The :class:`Env` iterable desired from the
+                         tox-travis config, which is gone through again
+                         for the fallback, unless it's an iterator.
     :param bool passthru: Whether to used the ``desired_envs`` as a
                           fallback if no declared envs match.
     """
-    matched = [
-        declared for declared in declared_envs
-        if any(env_matches(declared, desired) for desired in desired_envs)
-    ]
-    return desired_envs if not matched and passthru else matched
+    if passthru and iter(desired_envs) is desired_envs:
+        desired_envs = list(desired_envs)  # Can only be gone through once
+    matched = match_factors(declared_envs, [desired_envs])
+    if not matched and passthru:
+        # Patterns can't be used as env names
+        return [desired for desired in unique_envs(desired_envs)
+                if not any(map(is_pattern, desired.factors))]
+    return matched
+
+
+def match_factors(declared_envs, desired_factors):
+    """Determine the envs that match the combination of desired factors.
+
+    A declared env matches when it matches any of the envs that are
+    the product of the desired envs of each factor. That's the same as
+    matching at least one of the desired envs of every factor, so the
+    product is never built.
+
+    :param declared_envs: The :class:`Env` list declared in the tox config.
+    :param desired_factors: An iterable of desired :class:`Env` per factor,
+                            as given by :func:`get_desired_factors`.
+    """
+    # Only the distinct sets of factors of each desired env matter.
+    # Desired envs of a single factor, the most common, are checked
+    # all at once, and the others one by one.
+    groups = []
+    for desired_envs in desired_factors:
+        single, multiple = set(), set()
+        for desired in desired_envs:
+            if len(desired.factor_set) == 1:
+                single |= desired.factor_set
+            else:
+                multiple.add(desired.factor_set)
+        groups.append((frozenset(single), list(multiple)))
+    if not groups:
+        return []
+
+    def matches(factor_set):
+        for single, multiple in groups:
+            if single.isdisjoint(factor_set) and not any(
+                    desired <= factor_set for desired in multiple):
+                return False
+        return True
+
+    factors = set()
+    for single, multiple in groups:
+        factors.update(single, *multiple)
+    if any(map(is_pattern, factors)):
+        patterns = FactorPatterns([factors])
+        return [declared for declared in declared_envs
+                if matches(patterns.extend(declared.factor_set))]
+
+    if len(groups) == 1 and not groups[0][1]:
+        single = groups[0][0]  # Like any of py36, py37 or docs
+        return [declared for declared in declared_envs
+                if not single.isdisjoint(declared.factor_set)]
+    return [declared for declared in declared_envs
+            if matches(declared.factor_set)]
+
+
+def is_pattern(factor):
+    """Determine if a desired factor is a pattern.
+
+    Factors with ``*`` or ``?`` wildcards are glob patterns,
+    and factors between slashes, like ``/django\\d+/``,
+    are regular expressions.
+    """
+    if len(factor) > 1 and factor[0] == factor[-1] == '/':
+        return True
+    return '*' in factor or '?' in factor
+
+
+def compile_pattern(pattern):
+    """Translate a factor pattern into a regular expression."""
+    if len(pattern) > 1 and pattern[0] == pattern[-1] == '/':
+        return pattern[1:-1]
+    return translate_glob(pattern)
+
+
+def translate_glob(glob):
+    """Translate a glob with ``*`` and ``?`` wildcards to a regex."""
+    return ''.join(
+        '.*' if char == '*' else '.' if char == '?' else re.escape(char)
+        for char in glob)
+
+
+class FactorPatterns(object):
+    """Match factors against all the factor patterns at once.
+
+    All the patterns are compiled once into a single regular expression,
+    so that each factor only needs to be checked once to know if any
+    pattern matches it, and the patterns matching each declared factor
+    are remembered, since factors are shared by many declared envs.
+    """
+
+    def __init__(self, factor_sets):
+        self.patterns = sorted(set(
+            factor for factor_set in factor_sets for factor in factor_set
+            if is_pattern(factor)))
+        self.regexes = [
+            re.compile(r'(?:{0})\Z'.format(compile_pattern(pattern)))
+            for pattern in self.patterns
+        ]
+        self.combined = re.compile('|'.join(
+            regex.pattern for regex in self.regexes))
+        self.matching = {}
+
+    def extend(self, factor_set):
+        """Add the patterns that any of the factors match to the factors.
+
+        A declared env with the extended factors will then match
+        desired envs with patterns in the same way as plain factors.
+        """
+        if not self.patterns:
+            return factor_set
+
+        extended = factor_set
+        for factor in factor_set:
+            try:
+                patterns = self.matching[factor]
+            except KeyError:
+                patterns = self.matching[factor] = frozenset(
+                    pattern for pattern, regex
+                    in zip(self.patterns, self.regexes)
+                    if regex.match(factor)
+                ) if self.combined.match(factor) else frozenset()
+            if patterns:
+                extended = extended | patterns
+        return extended
 
 
 def env_matches(declared, desired):
@@ -223,12 +567,15 @@ def env_matches(declared, desired):
     the desired factors are fulfilled, but there are other factors,
     it should still match the env.
     """
-    desired_factors = desired.split('-')
-    declared_factors = declared.split('-')
-    return all(factor in declared_factors for factor in desired_factors)
+    if not isinstance(declared, Env):
+        declared = Env(declared)
+    if not isinstance(desired, Env):
+        desired = Env(desired)
+    return declared.matches(desired)
 
 
 def override_ignore_outcome(ini):
     """Decide whether to override ignore_outcomes."""
+    import tox.config
     travis_reader = tox.config.SectionReader("travis", ini)
     return travis_reader.getbool('unignore_outcomes', False)
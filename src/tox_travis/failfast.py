@@ -0,0 +1,170 @@
+"""Run the envs most likely to fail quickly first, and stop at a failure."""
+from __future__ import division, print_function
+import json
+import os
+import sys
+import time
+
+import tox.config
+import tox.exception
+
+from .retry import get_retries, retry_env
+
+try:
+    from filelock import FileLock
+except ImportError:
+    FileLock = None  # Tox before 3.0, which can't fail fast anyway
+
+STATS_NAME = '.tox-travis-envstats.json'
+
+# The status of the envs left out once a required env failed
+STOPPED = 'not run after a failure'
+
+# How much the latest run of an env counts in its recorded history
+WEIGHT = 0.3
+
+# The statuses of envs that didn't run, and say nothing about them
+NOT_RUN_STATUSES = ('skipped tests', 'platform mismatch', 'keyboardinterrupt')
+
+
+def get_fail_fast(config):
+    """Decide whether to stop at the first failed env of the job.
+
+    Enabled by setting ``fail_fast`` in the ``[travis]`` section.
+    """
+    reader = tox.config.SectionReader('travis', config._cfg)
+    return reader.getbool('fail_fast', False)
+
+
+def get_stats_path(config):
+    """Get where the history of the envs is kept, in the work dir."""
+    return os.path.join(str(config.toxworkdir), STATS_NAME)
+
+
+def load_stats(path):
+    """Load the recorded history of the envs."""
+    try:
+        with open(path) as f:
+            stats = json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}  # Missing or corrupt, start over
+    return stats if isinstance(stats, dict) else {}
+
+
+def save_stats(path, stats, envnames):
+    """Save the history of the given envs, keeping that of the others.
+
+    With ``tox --parallel``, each env runs in its own process, which
+    records it, so the history saved meanwhile is read again and
+    merged under a lock. The file is replaced at once.
+    """
+    dirname = os.path.dirname(path)
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+
+    with FileLock(path + '.lock'):
+        saved = load_stats(path)
+        saved.update((envname, stats[envname])
+                     for envname in envnames if envname in stats)
+        temp = '{0}.{1}.tmp'.format(path, os.getpid())
+        with open(temp, 'w') as f:
+            json.dump(saved, f, indent=2, sort_keys=True)
+        os.rename(temp, path)
+
+
+def record(stats, envname, duration, failed):
+    """Add a run of an env to its history.
+
+    The runs and the failures decay with each run, so that an env
+    that was fixed stops being run first after a few builds.
+    """
+    entry = stats.setdefault(envname, {})
+    entry['runs'] = entry.get('runs', 0) * (1 - WEIGHT) + 1
+    entry['failures'] = entry.get('failures', 0) * (1 - WEIGHT) + failed
+    previous = entry.get('duration')
+    entry['duration'] = duration if previous is None else (
+        previous * (1 - WEIGHT) + duration * WEIGHT)
+
+
+def order_envs(config, envlist, stats):
+    """Order the envs to find a failure as early as possible.
+
+    The envs that fail the most for the time they take run first.
+    Envs without history are assumed to fail half the time, and to
+    take as long as the others on average. The envs whose outcome
+    is ignored can't stop the job, so they run last. Envs that
+    compare the same keep their order.
+    """
+    durations = [entry['duration'] for entry in stats.values()
+                 if entry.get('duration')]
+    default_duration = sum(durations) / len(durations) if durations else 1
+
+    def failures_per_second(envname):
+        entry = stats.get(envname, {})
+        failure_rate = (entry.get('failures', 0) + 1) / (
+            entry.get('runs', 0) + 2)
+        duration = entry.get('duration') or default_duration
+        return failure_rate / max(duration, 0.1)
+
+    def ignored(envname):
+        envconfig = config.envconfigs.get(envname)
+        return bool(envconfig and envconfig.ignore_outcome)
+
+    return sorted(envlist, key=lambda envname: (
+        ignored(envname), -failures_per_second(envname)))
+
+
+def is_failure(config, venv):
+    """Determine if an env failed in a way that fails the job."""
+    status = getattr(venv, 'status', 0)
+    if not status or str(status) in NOT_RUN_STATUSES:
+        return False
+    if isinstance(status, tox.exception.InterpreterNotFound):
+        return config.option.skip_missing_interpreters != 'true'
+    return True
+
+
+def run_envs(config, venv_dict, run_sequential):
+    """Run the envs one by one, until a required env fails.
+
+    A failed env is retried first, if configured, so that a flaky env
+    that passes again doesn't stop the job. The envs after a failure
+    are marked as not run. The duration and the outcome of each env
+    that ran are recorded for ordering the envs of the next builds.
+    """
+    if not get_fail_fast(config):
+        return run_sequential(config, venv_dict)
+
+    def run_env(config, venv):
+        run_sequential(config, {venv.name: venv})
+
+    retries, patterns = get_retries(config)
+    path = get_stats_path(config)
+    stats = load_stats(path)
+    failed = None
+    stopped = []
+    for venv in venv_dict.values():
+        if failed:
+            venv.status = STOPPED
+            stopped.append(venv.name)
+            continue
+
+        start = time.time()
+        run_env(config, venv)
+        if retries:
+            retry_env(config, venv, run_env, retries, patterns)
+        status = getattr(venv, 'status', 0)
+        if not isinstance(status, tox.exception.InterpreterNotFound) and \
+                str(status) not in NOT_RUN_STATUSES:
+            record(stats, venv.name, time.time() - start, bool(status))
+        if is_failure(config, venv) and not venv.envconfig.ignore_outcome:
+            failed = venv.name
+
+    try:
+        save_stats(path, stats, [venv.name for venv in venv_dict.values()])
+    except (IOError, OSError):
+        pass  # The history only helps to order the envs
+
+    if stopped:
+        print('Not running {0} after {1} failed.'.format(
+            ', '.join(stopped), failed), file=sys.stderr)
@@ -1,3 +1,4 @@
+import argparse
 import os
 
 try:
@@ -5,6 +6,32 @@ try:
 except ImportError:
     default_factors = None
 
+try:
+    from tox.interpreters.via_path import _python_info_cache
+except ImportError:
+    _python_info_cache = None
+
+try:
+    from tox.interpreters import InterpreterInfo
+except ImportError:
+    InterpreterInfo = None
+
+try:
+    from tox.session.commands.run.sequential import (
+        run_sequential as tox_run_sequential)
+except ImportError:
+    tox_run_sequential = None  # Tox before 3.7 runs the envs in the session
+
+try:
+    from tox.config.parallel import auto_detect_cpus
+except ImportError:
+    auto_detect_cpus = None
+
+try:
+    from tox.config.parallel import ENV_VAR_KEY_PRIVATE as PARALLEL_ENV
+except ImportError:
+    PARALLEL_ENV = '_TOX_PARALLEL_ENV'
+
 
 def pypy_version_monkeypatch():
     """Patch Tox to work with non-default PyPy 3 versions."""
@@ -22,10 +49,109 @@ def subcommand_test_monkeypatch(post):
     """Monkeypatch Tox session to call a hook when commands finish."""
     import tox.session
     real_subcommand_test = tox.session.Session.subcommand_test
+    if getattr(real_subcommand_test, 'tox_travis_hook', None) is post:
+        return  # Already patched when configuring again in the same process
 
     def subcommand_test(self):
         retcode = real_subcommand_test(self)
         post(self.config)
         return retcode
 
+    subcommand_test.tox_travis_hook = post
     tox.session.Session.subcommand_test = subcommand_test
+
+
+def interpreters_monkeypatch(config, interpreters):
+    """Patch Tox to use the interpreters found instead of probing again."""
+    for envname, info in interpreters.items():
+        if info is None:
+            continue
+        executable = config.interpreters.name2executable.setdefault(
+            envname, info['executable'])
+        # Older Tox versions look the executables up by basepython
+        config.interpreters.name2executable.setdefault(
+            config.envconfigs[envname].basepython, executable)
+        if _python_info_cache is not None:
+            _python_info_cache.setdefault(executable, dict(info))
+        # Tox 3 asks the executable for its info unless it knows it
+        interpreter_info = make_interpreter_info(info)
+        if interpreter_info is not None:
+            config.interpreters.executable2info.setdefault(
+                executable, interpreter_info)
+
+
+def make_interpreter_info(info):
+    """Make the info of an interpreter like Tox makes it, if possible."""
+    if InterpreterInfo is None:
+        return None
+    fields = dict(info)
+    fields.pop('version', None)
+    # Like Tox, undo the lists of the JSON
+    fields['version_info'] = tuple(fields['version_info'])
+    if fields.get('extra_version_info') is not None:
+        fields['extra_version_info'] = tuple(fields['extra_version_info'])
+    try:
+        return InterpreterInfo(**fields)
+    except TypeError:
+        return None  # A Tox version with other fields
+
+
+def parallel_monkeypatch(config):
+    """Patch Tox to run the envs in parallel, unless told otherwise."""
+    # Tox versions without parallel mode run the envs one by one.
+    if auto_detect_cpus and not parallel_given(getattr(config, 'args', [])):
+        config.option.parallel = auto_detect_cpus()
+
+
+def parallel_given(args):
+    """Check whether ``--parallel`` was given to tox, even to turn it off.
+
+    Tox defaults to 0 when it isn't given, the same as ``-p 0``,
+    so the arguments are parsed again to tell them apart.
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('-p', '--parallel', nargs='?', const='auto')
+    options, _ = parser.parse_known_args(list(args))
+    return options.parallel is not None
+
+
+def summary_monkeypatch(pre):
+    """Monkeypatch Tox session to call a hook before the summary."""
+    import tox.session
+    real_summary = tox.session.Session._summary
+    if getattr(real_summary, 'tox_travis_hook', None) is pre:
+        return  # Already patched when configuring again in the same process
+
+    def _summary(self):
+        pre(self)
+        return real_summary(self)
+
+    _summary.tox_travis_hook = pre
+    tox.session.Session._summary = _summary
+
+
+def sequential_monkeypatch(run_envs):
+    """Monkeypatch Tox session to run the envs one by one with a hook.
+
+    The hook is given the config, the envs, and the real function
+    that runs them. Return whether Tox could be patched, which needs
+    Tox 3.7 or later.
+    """
+    import tox.session
+    real_run_sequential = getattr(tox.session, 'run_sequential', None)
+    if real_run_sequential is None:
+        return False  # Tox before 3.7 runs the envs in the session
+    if getattr(real_run_sequential, 'tox_travis_hook', None) is run_envs:
+        return True  # Already patched when configuring again in the process
+
+    def run_sequential(config, venv_dict):
+        return run_envs(config, venv_dict, real_run_sequential)
+
+    run_sequential.tox_travis_hook = run_envs
+    tox.session.run_sequential = run_sequential
+    return True
+
+
+def rerun_env(config, venv):
+    """Run an env again, reusing its virtualenv if it's complete."""
+    tox_run_sequential(config, {venv.name: venv})
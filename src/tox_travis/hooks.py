@@ -1,5 +1,6 @@
 """Tox hook implementations."""
 from __future__ import print_function
+import json
 import os
 import sys
 import tox
@@ -7,12 +8,51 @@ from .envlist import (
     detect_envlist,
     autogen_envconfigs,
     override_ignore_outcome,
+    use_all_interpreters,
 )
+from .providers import load_env_providers
 from .hacks import (
     pypy_version_monkeypatch,
     subcommand_test_monkeypatch,
+    interpreters_monkeypatch,
+    parallel_monkeypatch,
+    summary_monkeypatch,
+    sequential_monkeypatch,
+    rerun_env,
+    tox_run_sequential,
+    PARALLEL_ENV,
+)
+from .retry import retry_envs
+from .failfast import (
+    get_fail_fast,
+    get_stats_path,
+    load_stats,
+    order_envs,
+    run_envs,
+)
+from .dedupe import (
+    get_dedupe_store,
+    dedupe_envs,
+)
+from .janitor import (
+    get_clean_cache,
+    clean_workdir,
+    update_manifest,
+)
+from .interpreters import (
+    find_interpreters,
+    report_missing_interpreters,
 )
 from .after import travis_after
+from .memory import profile
+from .wheelhouse import (
+    get_wheelhouse,
+    configure_wheelhouse,
+    build_wheels,
+)
+
+# Where the parent tox passes the envs it resolved to its parallel children
+RESOLVED_ENVLIST = 'TOX_TRAVIS_RESOLVED_ENVLIST'
 
 
 @tox.hookimpl
@@ -25,6 +65,7 @@ def tox_addoption(parser):
     if 'TRAVIS' in os.environ:
         pypy_version_monkeypatch()
         subcommand_test_monkeypatch(tox_subcommand_test_post)
+        summary_monkeypatch(tox_summary_pre)
 
 
 @tox.hookimpl
@@ -36,23 +77,67 @@ def tox_configure(config):
     ini = config._cfg
 
     # envlist
-    if 'TOXENV' not in os.environ and not config.option.env:
-        envlist = detect_envlist(ini)
+    detected = False
+    if PARALLEL_ENV in os.environ:
+        # Tox already gives a parallel child its env, which only needs
+        # the config that the parent generated for it, if any.
+        envname = os.environ[PARALLEL_ENV]
+        resolved = json.loads(os.environ.get(RESOLVED_ENVLIST) or '{}')
+        if envname in resolved.get('autogen', []):
+            with profile('autogen_envconfigs'):
+                autogen_envconfigs(config, [envname])
+    elif 'TOXENV' not in os.environ and not config.option.env:
+        providers = load_env_providers(ini)
+        with profile('detect_envlist'):
+            envlist = detect_envlist(ini, providers=providers)
         undeclared = set(envlist) - set(config.envconfigs)
         if undeclared:
-            print('Matching undeclared envs is deprecated. Be sure all the '
-                  'envs that Tox should run are declared in the tox config.',
-                  file=sys.stderr)
-            autogen_envconfigs(config, undeclared)
+            # The envs of providers are only declared as they are needed
+            if not providers:
+                print('Matching undeclared envs is deprecated. Be sure all '
+                      'the envs that Tox should run are declared in the tox '
+                      'config.', file=sys.stderr)
+            with profile('autogen_envconfigs'):
+                autogen_envconfigs(config, undeclared)
         # Also set envlist_default to allow us to inspect outcomes
         # via tox -l in the tests, until a better solution arrives.
         config.envlist_default = config.envlist = envlist
+        detected = True
+        os.environ[RESOLVED_ENVLIST] = json.dumps({
+            'envlist': envlist,
+            'autogen': sorted(undeclared),
+        })
+
+        # Run the envs of all the interpreters side by side
+        if use_all_interpreters(ini):
+            parallel_monkeypatch(config)
+
+    # Find the interpreters of all the envs at once, unless just listing
+    if not any(getattr(config.option, option, False)
+               for option in ('listenvs', 'listenvs_all', 'showconfig')):
+        with profile('find_interpreters'):
+            interpreters = find_interpreters(config, config.envlist)
+        report_missing_interpreters(config, interpreters)
+        interpreters_monkeypatch(config, interpreters)
+
+    # Share built wheels between the envs
+    wheelhouse = get_wheelhouse(config)
+    if wheelhouse:
+        configure_wheelhouse(config, wheelhouse)
 
     # Override ignore_outcomes
     if override_ignore_outcome(ini):
         for envconfig in config.envconfigs.values():
             envconfig.ignore_outcome = False
 
+    # Run the envs most likely to fail quickly first, and stop at a failure
+    if get_fail_fast(config):
+        if not sequential_monkeypatch(run_envs):
+            print('Failing fast needs tox 3.7 or later.', file=sys.stderr)
+        elif detected:
+            config.envlist_default = config.envlist = order_envs(
+                config, config.envlist, load_stats(get_stats_path(config)))
+
     # after
     if config.option.travis_after:
         print('The after all feature has been deprecated. Check out Travis\' '
@@ -61,7 +146,47 @@ def tox_configure(config):
               'for more details.', file=sys.stderr)
 
 
+@tox.hookimpl(tryfirst=True)
+def tox_testenv_install_deps(venv, action):
+    """Build the deps into the wheelhouse before they are installed."""
+    if 'TRAVIS' not in os.environ:
+        return
+
+    wheelhouse = get_wheelhouse(venv.envconfig.config)
+    if wheelhouse:
+        build_wheels(venv, action, wheelhouse)
+
+
+def tox_summary_pre(session):
+    """Retry the failed envs before reporting them."""
+    # The children of a parallel run retry their own env,
+    # and the envs that run until a failure are retried as they run
+    parallel = getattr(session.config.option, 'parallel', 0)
+    fail_fast = get_fail_fast(session.config) and tox_run_sequential
+    if (not parallel or PARALLEL_ENV in os.environ) and not fail_fast:
+        retry_envs(session, rerun_env if tox_run_sequential else None)
+
+
 def tox_subcommand_test_post(config):
-    """Wait for this job if the configuration matches."""
+    """Tidy up the envs for the cache, and wait for this job if configured."""
+    # Only the parent of parallel children runs this, once they are done
+    if PARALLEL_ENV in os.environ:
+        return
+
+    # Drop what the cache doesn't need
+    clean_cache = get_clean_cache(config)
+    if clean_cache:
+        clean_workdir(config, config.envlist)
+
+    # Share the identical files of the envs
+    store = get_dedupe_store(config)
+    if store:
+        dedupe_envs(config, config.envlist, str(store))
+
+    # Keep what didn't change the same for the cache
+    if clean_cache:
+        update_manifest(str(config.toxworkdir))
+
     if config.option.travis_after:
-        travis_after(config._cfg, config.envlist)
+        with profile('travis_after'):
+            travis_after(config._cfg, config.envlist)
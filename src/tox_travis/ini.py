@@ -0,0 +1,65 @@
+"""Read tox configs without importing tox."""
+
+COMMENT_CHARS = '#;'
+
+
+class IniFile(object):
+    """A minimal reader of the ini files that tox reads.
+
+    It parses the same syntax as ``py.iniconfig``, which tox uses,
+    and provides the parts of its interface needed to detect envlists:
+    the ``path``, the ``sections`` as dicts of their values,
+    and the line of each section with ``lineof``.
+    """
+
+    def __init__(self, path, data=None):
+        self.path = str(path)
+        if data is None:
+            with open(self.path) as ini_file:
+                data = ini_file.read()
+
+        self.sections = {}
+        self.lines = {}
+        section = key = None
+        for lineno, line in enumerate(data.splitlines(), 1):
+            if line.lstrip()[:1] in COMMENT_CHARS:
+                continue  # Also skips blank lines
+            line = line.rstrip()
+
+            if line[0] == '[':
+                name = line
+                for char in COMMENT_CHARS:
+                    name = name.split(char)[0].rstrip()
+                if name[-1:] == ']':
+                    section, key = name[1:-1], None
+                    if not section or section in self.sections:
+                        self.error(lineno, 'Empty or duplicate section')
+                    self.sections[section] = {}
+                    self.lines[section] = lineno
+                    continue
+            elif not line[0].isspace():
+                name, sep, value = line.partition('=')
+                if not sep or ':' in name:
+                    name, sep, value = line.partition(':')
+                if not sep or section is None:
+                    self.error(lineno, 'Unexpected line')
+                key = name.strip()
+                if key in self.sections[section]:
+                    self.error(lineno, 'Duplicate key')
+                self.sections[section][key] = value.strip()
+                continue
+
+            # Continuation of the last value
+            if key is None:
+                self.error(lineno, 'Unexpected value continuation')
+            value = self.sections[section][key]
+            self.sections[section][key] = '\n'.join(
+                part for part in [value, line.strip()] if part)
+
+    def error(self, lineno, message):
+        """Fail to parse the given line."""
+        raise ValueError('{0}:{1}: {2}'.format(self.path, lineno, message))
+
+    def lineof(self, section):
+        """Get the line number of a section, starting from 1."""
+        return self.lines.get(section)
@@ -0,0 +1,236 @@
+"""Discover the interpreters needed by the envs of a Travis job."""
+from __future__ import print_function
+import glob
+import json
+import os
+import re
+import subprocess
+import sys
+from multiprocessing.pool import ThreadPool
+
+from .utils import get_cache_dir
+
+MAX_CONCURRENT_PROBES = 8
+
+# Prints the same info as the version query of Tox, so it can be reused
+PROBE_SCRIPT = '''
+import json, os, platform, sys
+print(json.dumps({
+    "executable": sys.executable,
+    "implementation": platform.python_implementation(),
+    "version_info": list(sys.version_info),
+    "version": sys.version,
+    "is_64": sys.maxsize > 2**32,
+    "sysplatform": sys.platform,
+    "os_sep": os.sep,
+    "extra_version_info": getattr(sys, "pypy_version_info", None),
+}))
+'''
+
+BASEPYTHON_PATTERN = re.compile(
+    r'(python|pypy|jython)(\d)?(?:\.(\d+))?(?:-(32|64))?$')
+
+# The names of the interpreters installed side by side on a Travis VM
+INSTALLED_PATTERN = re.compile(r'(python\d\.\d+|pypy3?)\Z')
+
+# Where Travis installs the interpreters of the other Python versions
+TRAVIS_PYTHON_DIRS = '/opt/python/*/bin'
+
+
+def find_interpreters(config, envnames):
+    """Find the interpreters of the given envs, probing them all at once.
+
+    Each env tries its ``basepython``, then the unversioned name of
+    its implementation, then the ``python`` of the Travis virtualenv,
+    and uses the first one whose version satisfies the ``basepython``.
+    That covers interpreters like PyPy on Travis, where the virtualenv
+    only provides ``python``.
+
+    Returns a dict of env names to the info of their interpreter,
+    in the format of the Tox version query, or None if it's missing.
+    """
+    candidates = dict(
+        (envname, get_candidates(config.envconfigs[envname].basepython))
+        for envname in envnames if envname in config.envconfigs
+    )
+    paths = dict(
+        (name, find_executable(name))
+        for names in candidates.values() for name in names
+    )
+    infos = probe_interpreters(set(filter(None, paths.values())))
+
+    interpreters = {}
+    for envname, names in candidates.items():
+        basepython = config.envconfigs[envname].basepython
+        interpreters[envname] = next((
+            infos[paths[name]] for name in names
+            if infos.get(paths[name]) is not None and
+            satisfies(infos[paths[name]], basepython)
+        ), None)
+    return interpreters
+
+
+def report_missing_interpreters(config, interpreters):
+    """Tell which envs won't find their interpreter, before running any."""
+    missing = [
+        '{0} ({1})'.format(envname, config.envconfigs[envname].basepython)
+        for envname, info in sorted(interpreters.items()) if info is None
+    ]
+    if missing:
+        print('No interpreter found for the envs: {0}'.format(
+            ', '.join(missing)), file=sys.stderr)
+
+
+def get_candidates(basepython):
+    """Get the names of the interpreters that may provide a basepython."""
+    if os.path.isabs(basepython):
+        return [basepython]
+
+    candidates = [basepython]
+    match = BASEPYTHON_PATTERN.match(basepython)
+    if match:
+        candidates.extend([match.group(1), 'python'])
+    return sorted(set(candidates), key=candidates.index)
+
+
+def find_python_versions(environ=None):
+    """Find the Python versions of all the interpreters installed.
+
+    Look for versioned interpreters like ``python3.7`` and ``pypy3``
+    in the ``PATH``, and in the directories where Travis installs the
+    other versions. Returns them sorted, named like Travis names them
+    in ``TRAVIS_PYTHON_VERSION``, like ``3.7`` or ``pypy3``.
+    """
+    paths = set()
+    for directory in filter(os.path.isdir, get_search_dirs(environ)):
+        paths.update(
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if INSTALLED_PATTERN.match(name) and
+            is_executable(os.path.join(directory, name)))
+
+    versions = set()
+    for info in probe_interpreters(paths).values():
+        if info is None:
+            continue
+        major, minor = info['version_info'][:2]
+        if info['implementation'] == 'PyPy':
+            versions.add('pypy3' if major == 3 else 'pypy')
+        else:
+            versions.add('{0}.{1}'.format(major, minor))
+    return sorted(versions)
+
+
+def get_search_dirs(environ=None):
+    """Get the directories of the interpreters, in the order to search them.
+
+    The ``PATH`` comes first, then the directories where Travis installs
+    the other Python versions, which Tox doesn't search by itself.
+    """
+    environ = os.environ if environ is None else environ
+    directories = environ.get('PATH', os.defpath).split(os.pathsep)
+    return directories + sorted(glob.glob(TRAVIS_PYTHON_DIRS))
+
+
+def find_executable(name, environ=None):
+    """Get the path of an interpreter, or None if it can't be found.
+
+    The interpreters found outside the ``PATH`` are given to Tox
+    by :func:`tox_travis.hacks.interpreters_monkeypatch`.
+    """
+    if os.path.isabs(name):
+        return name if is_executable(name) else None
+    for directory in get_search_dirs(environ):
+        path = os.path.join(directory, name)
+        if is_executable(path):
+            return path
+    return None
+
+
+def is_executable(path):
+    """Check that a path is a file that can be executed."""
+    return os.path.isfile(path) and os.access(path, os.X_OK)
+
+
+def satisfies(info, basepython):
+    """Check that an interpreter provides what a basepython requires."""
+    match = BASEPYTHON_PATTERN.match(basepython)
+    if not match:
+        return True  # A path, or a name we don't know how to check
+
+    name, major, minor, bits = match.groups()
+    implementation = info['implementation'].lower()
+    if name == 'python':
+        name = 'cpython'
+    return (
+        implementation == name and
+        (major is None or int(major) == info['version_info'][0]) and
+        (minor is None or int(minor) == info['version_info'][1]) and
+        (bits is None or (bits == '64') == info['is_64'])
+    )
+
+
+def probe_interpreters(paths):
+    """Get the info of several interpreters at the same time.
+
+    The info of each interpreter is cached between runs, keyed on its
+    path and the modification time of its binary, which changes when
+    it's upgraded. Returns a dict of paths to their info, which is
+    None for interpreters that fail to run.
+    """
+    cache_path = os.path.join(get_cache_dir(), 'interpreters.json')
+    try:
+        with open(cache_path) as cache_file:
+            cache = json.load(cache_file)
+    except (IOError, OSError, ValueError):
+        cache = {}
+
+    mtimes = dict((path, os.stat(path).st_mtime) for path in paths)
+    infos = dict(
+        (path, cache[path]['info']) for path in paths
+        if path in cache and cache[path]['mtime'] == mtimes[path]
+    )
+
+    needed = sorted(set(paths) - set(infos))
+    if needed:
+        pool = ThreadPool(min(len(needed), MAX_CONCURRENT_PROBES))
+        try:
+            probed = pool.map(probe_interpreter, needed)
+        finally:
+            pool.close()
+            pool.join()
+
+        for path, info in zip(needed, probed):
+            infos[path] = info
+            if info is not None:
+                cache[path] = {'mtime': mtimes[path], 'info': info}
+
+        try:
+            write_cache(cache_path, cache)
+        except (IOError, OSError):
+            pass  # Caching is only an optimization
+
+    return infos
+
+
+def write_cache(cache_path, cache):
+    """Write the cached info of the interpreters."""
+    if not os.path.isdir(os.path.dirname(cache_path)):
+        os.makedirs(os.path.dirname(cache_path))
+    # Replace the whole file, so concurrent jobs never read half of it
+    temp_path = '{0}.{1}'.format(cache_path, os.getpid())
+    with open(temp_path, 'w') as cache_file:
+        json.dump(cache, cache_file, indent=2, sort_keys=True)
+    os.rename(temp_path, cache_path)
+
+
+def probe_interpreter(path):
+    """Get the info of an interpreter, or None if it fails to run."""
+    try:
+        proc = subprocess.Popen([path, '-c', PROBE_SCRIPT],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, _ = proc.communicate()
+        if proc.returncode:
+            return None
+        return json.loads(out.decode('utf-8'))
+    except (OSError, ValueError):
+        return None
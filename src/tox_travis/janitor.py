@@ -0,0 +1,149 @@
+"""Clean the tox work dir before Travis caches it."""
+from __future__ import print_function
+import json
+import os
+import shutil
+import stat
+import sys
+
+import tox.config
+
+from .utils import format_size, hash_file
+
+MANIFEST_NAME = '.tox-travis-manifest.json'
+
+# Written by tox in each env once it's set up
+ENV_MARKER = '.tox-config1'
+
+# Reproducible or transient parts of the work dir and of each env
+WORKDIR_ARTIFACTS = ('.tmp', 'log', 'dist')
+ENV_ARTIFACTS = ('log', 'tmp')
+BYTECODE_DIR = '__pycache__'
+BYTECODE_SUFFIXES = ('.pyc', '.pyo')
+
+
+def get_clean_cache(config):
+    """Decide whether to clean the work dir at the end of the job.
+
+    Enabled by setting ``clean_cache`` in the ``[travis]`` section.
+    """
+    reader = tox.config.SectionReader('travis', config._cfg)
+    return reader.getbool('clean_cache', False)
+
+
+def clean_workdir(config, envnames):
+    """Make the tox work dir smaller and more stable for the Travis cache.
+
+    The envs that this job didn't use are removed, along with the logs,
+    temporary files, built packages and bytecode, which tox and Python
+    make again as needed.
+    """
+    workdir = str(config.toxworkdir)
+    if not os.path.isdir(workdir):
+        return
+
+    used = set(str(config.envconfigs[envname].envdir)
+               for envname in envnames if envname in config.envconfigs)
+    removed = []
+    for name in sorted(os.listdir(workdir)):
+        path = os.path.join(workdir, name)
+        if name in WORKDIR_ARTIFACTS:
+            removed.append(path)
+        elif os.path.isfile(os.path.join(path, ENV_MARKER)):
+            if path not in used:
+                removed.append(path)
+            else:
+                removed.extend(os.path.join(path, artifact)
+                               for artifact in ENV_ARTIFACTS)
+                removed.extend(find_bytecode(path))
+
+    freed = sum(remove(path) for path in removed)
+    print('Cleaned {0} from {1} for the cache.'.format(
+        format_size(freed), workdir), file=sys.stderr)
+
+
+def find_bytecode(envdir):
+    """Find the compiled Python files of an env."""
+    for root, dirs, files in os.walk(envdir):
+        if BYTECODE_DIR in dirs:
+            dirs.remove(BYTECODE_DIR)
+            yield os.path.join(root, BYTECODE_DIR)
+        for name in files:
+            if name.endswith(BYTECODE_SUFFIXES):
+                yield os.path.join(root, name)
+
+
+def remove(path):
+    """Remove a file or a directory, and give the size freed."""
+    if os.path.islink(path) or os.path.isfile(path):
+        size = os.lstat(path).st_size
+        os.remove(path)
+        return size
+    elif not os.path.isdir(path):
+        return 0
+
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            info = os.lstat(os.path.join(root, name))
+            # Hardlinks to other files don't free anything
+            if info.st_nlink == 1:
+                size += info.st_size
+    shutil.rmtree(path, ignore_errors=True)
+    return size
+
+
+def update_manifest(workdir):
+    """Record the content of the work dir, to keep it stable between builds.
+
+    The manifest has the size, modification time and hash of each file.
+    A file whose content didn't change since the last build gets its
+    previous modification time back, so the archive of the cache stays
+    the same, and Travis doesn't need to upload it again. Only files
+    whose size or modification time changed are hashed.
+
+    Prints and returns the number of files that were added or changed.
+    """
+    manifest_path = os.path.join(workdir, MANIFEST_NAME)
+    try:
+        with open(manifest_path) as manifest_file:
+            previous = json.load(manifest_file)
+    except (IOError, ValueError):
+        previous = {}
+
+    manifest = {}
+    changed = 0
+    for root, _, files in os.walk(workdir):
+        for name in files:
+            path = os.path.join(root, name)
+            info = os.lstat(path)
+            relpath = os.path.relpath(path, workdir)
+            if relpath == MANIFEST_NAME or not stat.S_ISREG(info.st_mode):
+                continue
+
+            entry = previous.get(relpath)
+            if entry and [entry['size'], entry['mtime']] == [
+                    info.st_size, info.st_mtime]:
+                manifest[relpath] = entry
+                continue
+
+            digest = hash_file(path)
+            if entry and [entry['size'], entry['sha256']] == [
+                    info.st_size, digest] and info.st_nlink == 1:
+                # Same content, rewritten: keep it as it was
+                os.utime(path, (info.st_atime, entry['mtime']))
+                manifest[relpath] = entry
+                continue
+
+            changed += 1
+            manifest[relpath] = {
+                'size': info.st_size,
+                'mtime': info.st_mtime,
+                'sha256': digest,
+            }
+
+    with open(manifest_path, 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=0, sort_keys=True)
+    print('{0} files changed in {1} since the last build.'.format(
+        changed, workdir), file=sys.stderr)
+    return changed
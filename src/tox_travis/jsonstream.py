@@ -0,0 +1,233 @@
+"""Parse only the needed parts of large JSON documents.
+
+Rather than decoding a whole document into nested dicts and lists,
+read it from a stream a chunk at a time, and only build the values
+selected by a spec. Everything else is skipped over as it is read,
+so memory use is bounded by the chunk size and the selected values.
+
+A spec describes the parts of a document to keep:
+
+* ``True`` keeps the whole value.
+* A dict keeps only the given keys of an object,
+  each selected by the spec they map to.
+* A list of a single spec selects each item of an array with it.
+
+A value that doesn't have the shape the spec expects is kept
+if it's a scalar, like a ``null`` where an object was expected,
+and otherwise is skipped and given as ``None``.
+"""
+import codecs
+import json
+import re
+from json.decoder import scanstring
+
+CHUNK_SIZE = 64 * 1024
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+TOKEN = re.compile(r'[\w.+-]+')
+STRUCTURE = re.compile(r'["\[\]{}]')
+STRING_END = re.compile(r'["\\]')
+
+
+def load(stream, spec, chunk_size=CHUNK_SIZE):
+    """Parse the parts of the JSON document in the stream given by spec."""
+    return Reader(stream, chunk_size).select(spec)
+
+
+class Reader(object):
+    """Read JSON values incrementally from a stream of UTF-8 bytes."""
+
+    def __init__(self, stream, chunk_size=CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.mark = None  # Keep the buffer from here when filling
+        self.eof = False
+
+    def fill(self):
+        """Read more of the stream into the buffer.
+
+        The part of the buffer that has been consumed is dropped,
+        which moves the position. Return False at the end of the stream.
+        """
+        if self.eof:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        if chunk:
+            text = self.decoder.decode(chunk)
+        else:
+            self.eof = True
+            text = self.decoder.decode(b'', True)
+        if text:
+            keep = self.pos if self.mark is None else self.mark
+            self.buffer = self.buffer[keep:] + text
+            self.pos -= keep
+            if self.mark is not None:
+                self.mark -= keep
+        return bool(text) or not self.eof
+
+    def peek(self):
+        """Get the next significant character without consuming it."""
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                raise ValueError('Unexpected end of JSON document')
+
+    def next(self):
+        """Consume the next significant character."""
+        char = self.peek()
+        self.pos += 1
+        return char
+
+    def expect(self, expected):
+        """Consume the next significant character, which must be given."""
+        char = self.next()
+        if char != expected:
+            raise ValueError('Expected {0!r} but found {1!r}'.format(
+                expected, char))
+
+    def select(self, spec):
+        """Parse the next value, keeping only the parts given by spec."""
+        char = self.peek()
+        if spec is True:
+            return self.value()
+        elif char == '{' and isinstance(spec, dict):
+            return self.object(spec)
+        elif char == '[' and isinstance(spec, list):
+            return self.array(spec[0])
+        elif char in '[{':
+            self.skip()
+            return None
+        return self.value()
+
+    def value(self):
+        """Parse the whole next value."""
+        char = self.peek()
+        if char == '{':
+            return self.object(None)
+        elif char == '[':
+            return self.array(True)
+        elif char == '"':
+            return self.string()
+        return self.scalar()
+
+    def object(self, spec):
+        """Parse an object, keeping the keys in spec, or all if None."""
+        self.expect('{')
+        result = {}
+        if self.peek() == '}':
+            self.pos += 1
+            return result
+
+        while True:
+            key = self.string()
+            self.expect(':')
+            if spec is None:
+                result[key] = self.value()
+            elif key in spec:
+                result[key] = self.select(spec[key])
+            else:
+                self.skip()
+
+            char = self.next()
+            if char == '}':
+                return result
+            elif char != ',':
+                raise ValueError('Expected "," or "}}" but found {0!r}'.format(
+                    char))
+
+    def array(self, spec):
+        """Parse an array, selecting each item with spec."""
+        self.expect('[')
+        result = []
+        if self.peek() == ']':
+            self.pos += 1
+            return result
+
+        while True:
+            result.append(self.select(spec))
+
+            char = self.next()
+            if char == ']':
+                return result
+            elif char != ',':
+                raise ValueError('Expected "," or "]" but found {0!r}'.format(
+                    char))
+
+    def string(self):
+        """Parse a string."""
+        self.expect('"')
+        self.mark = self.pos
+        try:
+            self.skip_string()
+            start = self.mark
+        finally:
+            self.mark = None
+        value, _ = scanstring(self.buffer, start)
+        return value
+
+    def scalar(self):
+        """Parse a number, or true, false, or null."""
+        self.peek()
+        while True:
+            match = TOKEN.match(self.buffer, self.pos)
+            if match is None or match.end() < len(self.buffer):
+                break
+            elif not self.fill():
+                break
+
+        if not match:
+            raise ValueError('Unexpected {0!r}'.format(
+                self.buffer[self.pos:self.pos + 1]))
+        self.pos = match.end()
+        return json.loads(match.group())
+
+    def skip(self):
+        """Skip over the next value without parsing it."""
+        char = self.next()
+        if char == '"':
+            self.skip_string()
+        elif char in '[{':
+            depth = 1
+            while depth:
+                match = STRUCTURE.search(self.buffer, self.pos)
+                if match is None:
+                    self.pos = len(self.buffer)
+                    if not self.fill():
+                        raise ValueError('Unexpected end of JSON document')
+                    continue
+
+                self.pos = match.end()
+                if match.group() == '"':
+                    self.skip_string()
+                elif match.group() in '[{':
+                    depth += 1
+                else:
+                    depth -= 1
+        else:
+            self.pos -= 1
+            self.scalar()
+
+    def skip_string(self):
+        """Skip to the end of a string whose opening quote was consumed."""
+        offset = 0
+        while True:
+            match = STRING_END.search(self.buffer, self.pos + offset)
+            if match is None or match.end() == len(self.buffer) and (
+                    match.group() == '\\'):
+                # Look for the end again, after reading more
+                if match is None:
+                    offset = len(self.buffer) - self.pos
+                else:
+                    offset = match.start() - self.pos
+                if not self.fill():
+                    raise ValueError('Unterminated string in JSON document')
+            elif match.group() == '"':
+                self.pos = match.end()
+                return
+            else:
+                offset = match.end() + 1 - self.pos  # Skip escaped char
@@ -0,0 +1,99 @@
+"""Report the memory used by the stages of Tox-Travis.
+
+Set the ``TOX_TRAVIS_PROFILE_MEMORY`` environment variable to trace
+the memory allocated by each stage, like detecting the envlist or
+waiting for the other jobs, and report it to stderr with the sites
+that allocated the most. The value is how many sites to report,
+or any other value to report the default number of them.
+
+Tracing uses :mod:`tracemalloc`, so this does nothing on Python 2.
+"""
+from __future__ import print_function
+import os
+import sys
+from contextlib import contextmanager
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None  # Python 2
+
+from .utils import format_size
+
+PROFILE_MEMORY = 'TOX_TRAVIS_PROFILE_MEMORY'
+DEFAULT_TOP_SITES = 10
+
+
+def get_top_sites(environ=None):
+    """Get how many allocation sites to report, or 0 to not profile."""
+    environ = os.environ if environ is None else environ
+    value = environ.get(PROFILE_MEMORY, '').strip()
+    if value.isdigit():
+        return int(value)
+    return DEFAULT_TOP_SITES if value else 0
+
+
+@contextmanager
+def profile(stage, environ=None):
+    """Trace the memory allocated in a block, and report it.
+
+    Yield a dict, which is given the size of the memory still
+    allocated at the end of the block as ``allocated``, the most that
+    was allocated at once during the block as ``peak``, and the sites
+    that allocated the most as ``sites``, once the block is done.
+    It stays empty when not profiling.
+    """
+    usage = {}
+    top_sites = get_top_sites(environ)
+    if not top_sites or tracemalloc is None:
+        yield usage
+        return
+
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    before = take_snapshot()
+    # Without reset_peak, before Python 3.9, the peak may be earlier
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    start, _ = tracemalloc.get_traced_memory()
+
+    try:
+        yield usage
+    finally:
+        current, peak = tracemalloc.get_traced_memory()
+        stats = take_snapshot().compare_to(before, 'lineno')
+        if started:
+            tracemalloc.stop()
+
+        usage.update(
+            allocated=current - start,
+            peak=max(peak - start, 0),
+            sites=[stat for stat in stats if stat.size_diff > 0][:top_sites],
+        )
+        report(stage, usage)
+
+
+def take_snapshot():
+    """Take a snapshot of the traced memory, without that of tracing."""
+    return tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+    ])
+
+
+def report(stage, usage):
+    """Print the memory used by a stage, and where it was allocated."""
+    print('Memory of {0}: {1} allocated, {2} at peak'.format(
+        stage, format_signed_size(usage['allocated']),
+        format_size(usage['peak'])), file=sys.stderr)
+    for stat in usage['sites']:
+        frame = stat.traceback[0]
+        print('  {0:>12} in {1:>6} blocks  {2}:{3}'.format(
+            format_signed_size(stat.size_diff), stat.count_diff,
+            frame.filename, frame.lineno), file=sys.stderr)
+
+
+def format_signed_size(size):
+    """Format a change in a number of bytes for people."""
+    return ('-' if size < 0 else '+') + format_size(abs(size))
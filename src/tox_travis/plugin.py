@@ -0,0 +1,19 @@
+"""The hooks of Tox-Travis, for the version of tox that loads them."""
+import tox
+
+TOX_MAJOR = int(tox.__version__.split('.')[0])
+
+if TOX_MAJOR >= 4:
+    from .tox4 import (  # noqa: F401
+        tox_add_option,
+        tox_add_core_config,
+        tox_add_env_config,
+        tox_after_run_commands,
+        tox_env_teardown,
+    )
+else:
+    from .hooks import (  # noqa: F401
+        tox_addoption,
+        tox_configure,
+        tox_testenv_install_deps,
+    )
@@ -0,0 +1,91 @@
+"""Declare envs from Python, rather than with sections of the tox config.
+
+A project with a large matrix of envs would otherwise generate
+a ``[testenv:...]`` section for each of them, only so that they are
+declared, and every run of tox would parse them all. Instead,
+a provider is registered as an entry point of the
+``tox_travis.env_providers`` group:
+
+.. code-block:: python
+
+    setup(
+        ...
+        entry_points={
+            'tox_travis.env_providers': [
+                'matrix = myproject.matrix:provide_envs',
+            ],
+        },
+    )
+
+and enabled by name in the ``[travis]`` section of the tox config:
+
+.. code-block:: ini
+
+    [travis]
+    env_providers = matrix
+
+A provider is called with the names of the desired envs of each
+factor of the job, which may be patterns, as given by
+:func:`tox_travis.envlist.get_desired_factors`. It returns the names
+of the envs it declares, and only needs to return those that could
+match, so a provider can generate them from the desired factors
+rather than listing them all. Returning more envs is harmless, since
+they are matched like the declared ones.
+"""
+ENTRY_POINT_GROUP = 'tox_travis.env_providers'
+
+
+def get_provider_names(ini):
+    """Get the names of the env providers enabled in the tox config."""
+    travis_section = ini.sections.get('travis', {})
+    value = travis_section.get('env_providers', '')
+    return [name for name in value.replace(',', ' ').split() if name]
+
+
+def load_env_providers(ini):
+    """Load the env providers enabled in the tox config.
+
+    Raise a ValueError if a provider isn't installed.
+    """
+    providers = []
+    for name in get_provider_names(ini):
+        entry_points = find_entry_points(name)
+        if not entry_points:
+            raise ValueError('No env provider named {0!r} is installed in '
+                             'the {1} entry point group.'.format(
+                                 name, ENTRY_POINT_GROUP))
+        providers.append(entry_points[0].load())
+    return providers
+
+
+def find_entry_points(name):
+    """Find the entry points of a provider by name."""
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        # Python before 3.8
+        import pkg_resources
+        return list(pkg_resources.iter_entry_points(ENTRY_POINT_GROUP, name))
+
+    found = entry_points()
+    if hasattr(found, 'select'):
+        # Python 3.10+
+        return list(found.select(group=ENTRY_POINT_GROUP, name=name))
+    return [entry_point for entry_point in found.get(ENTRY_POINT_GROUP, [])
+            if entry_point.name == name]
+
+
+def get_provided_envs(providers, desired_factors):
+    """Get the names of the envs that the providers declare.
+
+    The desired factors are given to each provider as lists of names.
+    Each env is only given once, in the order they are provided.
+    """
+    desired_names = [[str(env) for env in desired_envs]
+                     for desired_envs in desired_factors]
+    seen = set()
+    for provider in providers:
+        for name in provider(desired_names):
+            if name not in seen:
+                seen.add(name)
+                yield name
@@ -0,0 +1,68 @@
+"""Resolve the envlist of a Travis job without importing tox."""
+from __future__ import print_function
+import argparse
+import os
+import sys
+
+from .envlist import detect_envlist
+from .ini import IniFile
+
+CONFIG_CANDIDATES = ('tox.ini', 'setup.cfg')
+
+
+def resolve(ini_path=None, environ=None):
+    """Get the envs that Tox-Travis detects for a Travis job.
+
+    This reads the tox config at ``ini_path``, or found from the
+    directory at ``ini_path`` the way tox finds it, which defaults
+    to the current directory. The Travis environment is read from
+    ``environ``, which defaults to ``os.environ``.
+
+    The result is the same as the envlist detected from within tox,
+    but tox is never imported, so this is much faster to call from
+    scripts that need to know which envs a job would run.
+    """
+    return detect_envlist(find_config(ini_path), environ)
+
+
+def find_config(ini_path=None):
+    """Find and read the tox config, like tox does."""
+    if ini_path is not None and os.path.isfile(ini_path):
+        return IniFile(ini_path)
+
+    folder = os.path.abspath(ini_path or os.curdir)
+    for basename in CONFIG_CANDIDATES:
+        path = folder
+        while True:
+            candidate = os.path.join(path, basename)
+            if os.path.isfile(candidate):
+                ini = IniFile(candidate)
+                if basename != 'setup.cfg' or 'tox:tox' in ini.sections:
+                    return ini
+            parent = os.path.dirname(path)
+            if parent == path:
+                break
+            path = parent
+
+    raise ValueError('No tox config found in {0}'.format(folder))
+
+
+def main(args=None):
+    """Print the envs that Tox-Travis detects, one per line."""
+    parser = argparse.ArgumentParser(
+        prog='python -m tox_travis',
+        description='List the envs that tox would run in this Travis job.')
+    parser.add_argument(
+        '-c', dest='ini_path', metavar='CONFIGFILE',
+        help="config file name or directory with 'tox.ini' file.")
+    options = parser.parse_args(args)
+
+    try:
+        envlist = resolve(options.ini_path)
+    except (IOError, ValueError) as error:
+        print('ERROR: {0}'.format(error), file=sys.stderr)
+        return 1
+
+    for env in envlist:
+        print(env)
+    return 0
@@ -0,0 +1,118 @@
+"""Retry the envs of a Travis job that fail for passing reasons."""
+from __future__ import print_function
+import glob
+import io
+import os
+import re
+import sys
+
+import tox.config
+import tox.exception
+
+# The statuses of envs that can't do any better by running again
+FINAL_STATUSES = (
+    'skipped tests',
+    'ignored failed command',
+    'platform mismatch',
+    'keyboardinterrupt',
+)
+
+
+def get_retries(config):
+    """Get how many times to retry the failed envs, and for which failures.
+
+    The ``retries`` key of the ``[travis]`` section gives the number of
+    retries of each env. The ``retry_patterns`` key gives regular
+    expressions, one per line, for the failures to retry. Without any,
+    every failure is retried.
+    """
+    reader = tox.config.SectionReader('travis', config._cfg)
+    retries = int(reader.getstring('retries', '0'))
+    patterns = [re.compile(pattern)
+                for pattern in reader.getlist('retry_patterns')]
+    return retries, patterns
+
+
+# The status of envs whose commands failed, after they were set up
+COMMANDS_FAILED = 'commands failed'
+
+
+def is_retryable(venv, patterns):
+    """Determine if an env failed in a way that a retry may fix.
+
+    The patterns are searched in the failure, and the output
+    of the command that failed while setting up the env, if any.
+    """
+    status = getattr(venv, 'status', 0)
+    if not status or str(status) in FINAL_STATUSES or isinstance(
+            status, tox.exception.InterpreterNotFound):
+        return False
+    if not patterns:
+        return True
+
+    failure = '{0}\n{1}'.format(status, getattr(status, 'out', None) or '')
+    if str(status) != COMMANDS_FAILED:
+        failure += get_setup_output(venv)
+    return any(pattern.search(failure) for pattern in patterns)
+
+
+def get_setup_output(venv):
+    """Get the output of the last command that set up an env.
+
+    Tox only reports how a setup command failed, like
+    ``could not install deps``, and logs its output in the log dir
+    of the env, like ``.tox/py37/log/py37-1.log``. Setting up stops
+    at the failed command, so its log is the latest one.
+    """
+    logdir = str(venv.envconfig.envlogdir)
+    logs = glob.glob(os.path.join(logdir, '*.log'))
+
+    def log_order(path):
+        number = re.search(r'(\d+)\.log$', path)
+        return os.path.getmtime(path), int(number.group(1)) if number else 0
+
+    try:
+        with io.open(max(logs, key=log_order), encoding='utf-8',
+                     errors='replace') as log:
+            return log.read()
+    except (IOError, OSError, ValueError):
+        return ''  # No log, like when the virtualenv couldn't be created
+
+
+def retry_envs(session, run_env):
+    """Run the envs that failed again, up to the number of retries.
+
+    Each env is retried by itself with ``run_env``,
+    which reuses its virtualenv if it was fully created.
+    Without ``run_env``, the envs can't be run again with this tox.
+    """
+    retries, patterns = get_retries(session.config)
+    if not retries:
+        return
+    if run_env is None:
+        print('Retrying the envs needs tox 3.7 or later.', file=sys.stderr)
+        return
+
+    for venv in session.venv_dict.values():
+        retry_env(session.config, venv, run_env, retries, patterns)
+
+
+def retry_env(config, venv, run_env, retries, patterns):
+    """Run an env again while it fails in a way that a retry may fix.
+
+    Return how many times it ran again.
+    """
+    attempts = 0
+    while attempts < retries and is_retryable(venv, patterns):
+        attempts += 1
+        print('Retrying {0} ({1} of {2}) after: {3}'.format(
+            venv.name, attempts, retries, venv.status), file=sys.stderr)
+        venv.status = 0
+        run_env(config, venv)
+
+    if attempts:
+        print('{0} {1} after {2} {3}.'.format(
+            venv.name, 'failed' if venv.status else 'succeeded',
+            attempts, 'retry' if attempts == 1 else 'retries'),
+            file=sys.stderr)
+    return attempts
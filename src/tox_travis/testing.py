@@ -0,0 +1,90 @@
+"""Configure tox with Tox-Travis in process, for quick tests.
+
+Running ``tox -l`` in a subprocess to check what a config does is slow,
+since each run starts an interpreter and imports tox. Instead,
+:func:`make_config` builds the tox config of a Travis job in process,
+with the hooks of Tox-Travis applied, so that tests can check it:
+
+.. code-block:: python
+
+    from tox_travis.testing import make_config
+
+    def test_py37():
+        config = make_config('''
+            [tox]
+            envlist = py{36,37}, docs
+
+            [travis]
+            python =
+              3.7: py37, docs
+        ''', environ={'TRAVIS_PYTHON_VERSION': '3.7'})
+        assert config.envlist == ['py37', 'docs']
+"""
+import os
+import shutil
+import tempfile
+import textwrap
+from contextlib import contextmanager
+
+import tox.config
+
+# Variables of the environment that change how a job is configured,
+# besides the ones of Travis
+JOB_VARIABLES = (
+    'TOXENV',
+    'TOX_SKIP_ENV',
+    'TOX_PARALLEL_ENV',
+    '_TOX_PARALLEL_ENV',
+    'TOX_TRAVIS_RESOLVED_ENVLIST',
+    '__TOX_TRAVIS_SYS_VERSION',
+)
+
+
+def make_config(ini, environ=None, args=(), toxinidir=None,
+                ini_filename='tox.ini'):
+    """Make the tox config of a Travis job from the text of an ini.
+
+    The ini is written to ``ini_filename`` in ``toxinidir``, which is
+    a new temporary directory by default, removed once the config is
+    made, so nothing should be read from it. Then tox reads it like it
+    would with the given command line ``args``, with the environment
+    variables in ``environ`` set, and ``TRAVIS`` set to ``true``.
+    The variables of Travis and tox in the current environment are
+    left out, unless ``environ`` is None, to use it unchanged.
+
+    The environment is restored once the config is made.
+    """
+    if toxinidir is None:
+        toxinidir = tempfile.mkdtemp(prefix='tox-travis-')
+        try:
+            return make_config(ini, environ, args, toxinidir, ini_filename)
+        finally:
+            shutil.rmtree(toxinidir, ignore_errors=True)
+
+    path = os.path.join(str(toxinidir), ini_filename)
+    with open(path, 'w') as ini_file:
+        ini_file.write(textwrap.dedent(ini).lstrip())
+
+    if environ is not None:
+        environ = dict(
+            [(name, value) for name, value in os.environ.items()
+             if not name.startswith('TRAVIS') and
+             name not in JOB_VARIABLES] +
+            [('TRAVIS', 'true')] + list(environ.items()))
+
+    with patch_environ(environ):
+        return tox.config.parseconfig(['-c', path] + list(args))
+
+
+@contextmanager
+def patch_environ(environ=None):
+    """Replace the environment while configuring, and restore it after."""
+    original = os.environ.copy()
+    if environ is not None:
+        os.environ.clear()
+        os.environ.update(environ)
+    try:
+        yield
+    finally:
+        os.environ.clear()
+        os.environ.update(original)
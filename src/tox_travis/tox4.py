@@ -0,0 +1,123 @@
+"""Tox hook implementations for tox 4.
+
+Tox 4 only loads the config of an env when it's needed, so rather
+than making the configs of the envs to run, the envs are given to tox
+as if they were selected with ``-e``, and tox makes the config of each
+as it runs it. The envlist is detected from the tox config file,
+without loading the config of any env.
+
+When no env of the job is detected, no env runs, like with tox 3,
+but tox 4 reports a run without any env as failed.
+
+Only detecting the envlist, ``unignore_outcomes`` and ``--travis-after``
+are supported with tox 4. The other features rely on tox 3 internals.
+"""
+from __future__ import print_function
+import os
+import sys
+
+import pluggy
+
+from .after import travis_after
+from .envlist import detect_envlist
+from .ini import IniFile
+from .memory import profile
+from .resolver import CONFIG_CANDIDATES
+
+try:
+    from tox.config.loader.memory import MemoryLoader
+    from tox.session.env_select import CliEnv
+except ImportError:
+    MemoryLoader = CliEnv = None  # tox 3, which uses .hooks instead
+
+hookimpl = pluggy.HookimplMarker('tox')
+
+# What the hooks of the current run share, reset with the core config
+run = {
+    'ini': None,
+    'envlist': [],
+    'passed': set(),
+    'done': set(),
+}
+
+
+@hookimpl
+def tox_add_option(parser):
+    """Add arguments."""
+    parser.add_argument(
+        '--travis-after', dest='travis_after', action='store_true',
+        help='Exit successfully after all Travis jobs complete successfully.')
+
+
+@hookimpl
+def tox_add_core_config(core_conf, state):
+    """Select the envs of the Travis job, unless some were selected."""
+    run.update(ini=None, envlist=[], passed=set(), done=set())
+    if 'TRAVIS' not in os.environ:
+        return
+
+    src_path = str(state.conf.src_path)
+    if os.path.basename(src_path) not in CONFIG_CANDIDATES:
+        print('Tox-Travis only reads tox.ini and setup.cfg, not {0}.'.format(
+            src_path), file=sys.stderr)
+        return
+    ini = run['ini'] = IniFile(src_path)
+
+    options = state.conf.options
+    env = getattr(options, 'env', None)  # Not all commands take -e
+    if env is None or env.is_default_list:
+        with profile('detect_envlist'):
+            envlist = detect_envlist(ini)
+        if envlist:
+            options.env = CliEnv(envlist)
+        else:
+            # An empty selection is the default envlist, so skip them all
+            print('No envs to run in this Travis job.', file=sys.stderr)
+            options.skip_env = '.*'
+    run['envlist'] = list(options.env or [])
+
+    if getattr(options, 'travis_after', False):
+        print('The after all feature has been deprecated. Check out Travis\' '
+              'build stages, which are a better solution. '
+              'See https://tox-travis.readthedocs.io/en/stable/after.html '
+              'for more details.', file=sys.stderr)
+
+
+@hookimpl
+def tox_add_env_config(env_conf, state):
+    """Override ignore_outcome, when the config of an env is loaded."""
+    if run['ini'] is None:
+        return
+
+    travis_section = run['ini'].sections.get('travis', {})
+    if travis_section.get('unignore_outcomes', '').strip().lower() == 'true':
+        # The first loader with a value wins
+        env_conf.loaders.insert(0, MemoryLoader(ignore_outcome=False))
+
+
+@hookimpl
+def tox_after_run_commands(tox_env, exit_code, outcomes):
+    """Remember which envs passed."""
+    if exit_code == 0 or tox_env.conf['ignore_outcome']:
+        run['passed'].add(tox_env.name)
+
+
+@hookimpl
+def tox_env_teardown(tox_env):
+    """Wait for the other jobs once the last env of the job is done.
+
+    Tox 4 has no hook for the end of a run, so the envs are counted as
+    they are torn down. An env that didn't run its commands, because it
+    was skipped or failed to set up, counts as failed.
+    """
+    if run['ini'] is None or tox_env.name not in run['envlist']:
+        return  # Not an env of the job, like the env building the package
+
+    run['done'].add(tox_env.name)
+    if run['done'] != set(run['envlist']):
+        return
+
+    if getattr(tox_env.options, 'travis_after', False) and \
+            run['done'] <= run['passed']:
+        with profile('travis_after'):
+            travis_after(run['ini'], run['envlist'])
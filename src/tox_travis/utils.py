@@ -1,4 +1,9 @@
 """Shared constants and utility functions."""
+from __future__ import division
+import hashlib
+import os
+
+CHUNK_SIZE = 64 * 1024
 
 # Mapping Travis factors to the associated env variables
 TRAVIS_FACTORS = {
@@ -30,3 +35,31 @@ def parse_dict(value):
     lines = [line.strip() for line in value.strip().splitlines()]
     pairs = [line.split(':', 1) for line in lines if line]
     return dict((k.strip(), v.strip()) for k, v in pairs)
+
+
+def get_cache_dir():
+    """Get the directory where Tox-Travis keeps data between runs.
+
+    Override with the ``TOX_TRAVIS_CACHE_DIR`` environment variable.
+    """
+    return os.environ.get('TOX_TRAVIS_CACHE_DIR') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'tox-travis')
+
+
+def format_size(size):
+    """Format a number of bytes for people."""
+    if size < 1024:
+        return '{0} bytes'.format(size)
+    for unit in ('KB', 'MB', 'GB'):
+        size /= 1024
+        if size < 1024 or unit == 'GB':
+            return '{0:.1f} {1}'.format(size, unit)
+
+
+def hash_file(path):
+    """Get the SHA-256 hex digest of the content of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as content:
+        for chunk in iter(lambda: content.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
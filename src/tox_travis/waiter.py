@@ -0,0 +1,207 @@
+"""Wait for several Travis builds at once, with asyncio.
+
+Where ``--travis-after`` waits for the other jobs of the current build,
+this waits for the required jobs of several builds, which may be of
+other repositories, or on other Travis APIs::
+
+    python -m tox_travis.waiter 123456 https://api.travis-ci.com/builds/789
+
+A build is given by its ID, on the API in ``TRAVIS_API_URL``,
+or by its URL on the API. The GitHub token in ``GITHUB_TOKEN``
+is used for all of them. The builds are polled concurrently,
+with the requests of all of them sharing one pool of connections,
+and the wait ends as soon as all the builds are finished,
+or a required job of any of them failed.
+The rate limit of each API is kept separately.
+
+This needs Python 3.5 or later.
+"""
+from __future__ import print_function
+import argparse
+import asyncio
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from . import after
+
+DEFAULT_API_URL = 'https://api.travis-ci.org'
+
+
+async def wait_for_builds(builds, github_token, polling_interval=5,
+                          executor=None):
+    """Wait for the required jobs of several builds.
+
+    Each build is a dict with its ``api_url`` and ``build_id``,
+    and optionally the ``job_number`` of the job that waits,
+    and a ``selector`` of the jobs to wait for, like in
+    :func:`tox_travis.after.get_job_statuses`.
+
+    Return as soon as the outcome of all the builds is known,
+    or some required job failed, a dict with whether all of them
+    ``passed``, and the ``statuses`` of the jobs of each build,
+    in the same order. The statuses are None for the builds
+    that were still running when another one failed.
+    """
+    loop = asyncio.get_event_loop()
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(after.MAX_CONCURRENT_REQUESTS)
+    tokens = {}
+    rate_limits = {}
+
+    tasks = [
+        asyncio.ensure_future(wait_for_build(
+            loop, executor, build, github_token, polling_interval, tokens,
+            rate_limits))
+        for build in builds
+    ]
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED)
+            if not all(all(task.result()) for task in done):
+                break  # No need to wait for the others
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+        if own_executor:
+            executor.shutdown(wait=False)
+
+    statuses = [
+        None if task.cancelled() else task.result() for task in tasks
+    ]
+    return {
+        'passed': all(status is not None and all(status)
+                      for status in statuses),
+        'statuses': statuses,
+    }
+
+
+async def wait_for_build(loop, executor, build, github_token,
+                         polling_interval, tokens, rate_limits):
+    """Wait for the required jobs of a build, like ``get_job_statuses``.
+
+    The access tokens, and the rate limits, are shared by the builds
+    on the same API.
+    """
+    api_url = build['api_url']
+    if api_url not in rate_limits:
+        rate_limits[api_url] = after.RateLimit()
+    limit = rate_limits[api_url]
+
+    def get_access_token(refresh=False):
+        if refresh or api_url not in tokens:
+            tokens[api_url] = loop.run_in_executor(
+                executor, after.get_access_token,
+                github_token, api_url, refresh, limit)
+        return tokens[api_url]
+
+    auth = await get_access_token()
+    refreshed = False
+
+    while True:
+        try:
+            build_jobs = await loop.run_in_executor(
+                executor, after.get_jobs, api_url, build['build_id'], auth,
+                limit)
+        except after.urllib2.HTTPError as error:
+            if error.code != 401 or refreshed:
+                raise
+            # The cached access token is no longer accepted
+            auth = await get_access_token(refresh=True)
+            refreshed = True
+            continue
+
+        jobs = after.get_required_jobs(
+            build_jobs, build.get('job_number'), build.get('selector'))
+        if after.outcome_known(jobs):
+            return [job['state'] == 'passed' for job in jobs]
+
+        print('Waiting for jobs of build {build_id} to complete: '
+              '{job_numbers}'.format(
+                  build_id=build['build_id'],
+                  job_numbers=[job['number'] for job in jobs
+                               if not job['finished_at']]))
+        await asyncio.sleep(limit.delay(polling_interval))
+
+
+def parse_build(value, environ=None):
+    """Parse a build given by its ID, or its URL on the API.
+
+    The job running this is not waited for, if it's in the build.
+    """
+    environ = os.environ if environ is None else environ
+    if '/builds/' in value:
+        api_url, build_id = value.rsplit('/builds/', 1)
+    else:
+        api_url = environ.get('TRAVIS_API_URL', DEFAULT_API_URL)
+        build_id = value
+
+    build = {'api_url': api_url.rstrip('/'), 'build_id': build_id}
+    if build_id == environ.get('TRAVIS_BUILD_ID') and \
+            api_url == environ.get('TRAVIS_API_URL', DEFAULT_API_URL):
+        build['job_number'] = environ.get('TRAVIS_JOB_NUMBER')
+    return build
+
+
+def main(args=None):
+    """Wait for the builds given on the command line."""
+    parser = argparse.ArgumentParser(
+        prog='python -m tox_travis.waiter',
+        description=__doc__.splitlines()[0])
+    parser.add_argument('builds', nargs='+', type=parse_build,
+                        help='The ID, or the API URL, of each build.')
+    parser.add_argument('-i', '--polling-interval', type=int,
+                        default=None,
+                        help='Seconds between the checks of each build.')
+    options = parser.parse_args(args)
+
+    github_token = os.environ.get('GITHUB_TOKEN')
+    if not github_token:
+        print('No GitHub token given.', file=sys.stderr)
+        return after.NO_GITHUB_TOKEN
+
+    polling_interval = options.polling_interval
+    if polling_interval is None:
+        try:
+            polling_interval = int(
+                os.environ.get('TRAVIS_POLLING_INTERVAL', 5))
+        except ValueError:
+            print('Invalid polling interval given: {0}'.format(
+                repr(os.environ.get('TRAVIS_POLLING_INTERVAL'))),
+                file=sys.stderr)
+            return after.INVALID_POLLING_INTERVAL
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        result = loop.run_until_complete(wait_for_builds(
+            options.builds, github_token, polling_interval))
+    finally:
+        loop.close()
+        asyncio.set_event_loop(None)
+
+    for build, statuses in zip(options.builds, result['statuses']):
+        if statuses is None:
+            outcome = 'not finished'
+        elif all(statuses):
+            outcome = 'passed'
+        else:
+            outcome = 'failed'
+        print('Build {build_id} on {api_url}: {outcome}'.format(
+            outcome=outcome, **build))
+
+    if not result['passed']:
+        print('Some jobs were not successful.')
+        return after.JOBS_FAILED
+
+    print('All required jobs were successful.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
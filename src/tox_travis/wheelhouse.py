@@ -0,0 +1,74 @@
+"""Share built wheels between the envs of a Travis job."""
+from __future__ import print_function
+import json
+import sys
+
+import tox.config
+import tox.exception
+
+
+def get_wheelhouse(config):
+    """Get the wheelhouse directory configured for this job.
+
+    The ``wheelhouse`` key of the ``[travis]`` section names a
+    directory where the wheels for the dependencies of all the envs
+    are built. Returns None if the wheelhouse is not configured.
+    """
+    reader = tox.config.SectionReader('travis', config._cfg)
+    reader.addsubstitutions(toxinidir=config.toxinidir,
+                            toxworkdir=config.toxworkdir,
+                            homedir=config.homedir)
+    return reader.getpath('wheelhouse', None)
+
+
+def configure_wheelhouse(config, wheelhouse):
+    """Point the installer of every env at the wheelhouse."""
+    for envconfig in config.envconfigs.values():
+        find_links = envconfig.setenv.get('PIP_FIND_LINKS')
+        envconfig.setenv['PIP_FIND_LINKS'] = ' '.join(
+            link for link in [str(wheelhouse), find_links] if link)
+
+
+def build_wheels(venv, action, wheelhouse):
+    """Build wheels for the deps of this venv that haven't been built yet.
+
+    The requirements that have been built are recorded in the wheelhouse,
+    keyed by the interpreter that built them, so that each distinct
+    requirement is only built once, even across cached builds.
+    The wheelhouse is only a cache, so when the wheels can't be built,
+    the deps are installed as usual.
+    """
+    deps = [
+        dep.name for dep in venv.get_resolved_dependencies()
+        if dep.indexserver is None and not dep.name.startswith('-e')
+    ]
+    if not deps:
+        return
+
+    info = venv.envconfig.python_info
+    tag = '{implementation}{major}{minor}'.format(
+        implementation=info.implementation,
+        major=info.version_info[0], minor=info.version_info[1])
+
+    record = wheelhouse.join('.tox-travis-built.json')
+    built = json.loads(record.read()) if record.check(file=True) else {}
+    needed = [dep for dep in deps if dep not in built.get(tag, [])]
+    if not needed:
+        return
+
+    wheelhouse.ensure(dir=True)
+    action.setactivity('wheelhouse', ', '.join(needed))
+    try:
+        venv._pcall(
+            [str(venv.envconfig.envpython), '-m', 'pip', 'wheel',
+             '--wheel-dir', str(wheelhouse),
+             '--find-links', str(wheelhouse)] + needed,
+            cwd=venv.envconfig.config.toxinidir, action=action)
+    except tox.exception.InvocationError as error:
+        # Like deps that are only constraints, or sdists without wheels
+        print('Could not build the wheels of {0}, installing them as '
+              'usual: {1}'.format(venv.name, error), file=sys.stderr)
+        return
+
+    built[tag] = sorted(set(built.get(tag, [])) | set(needed))
+    record.write(json.dumps(built, indent=2, sort_keys=True))
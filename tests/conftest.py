@@ -0,0 +1,15 @@
+"""Shared fixtures for the Tox-Travis tests."""
+import sys
+
+import pytest
+
+# asyncio, with async and await, needs Python 3.5
+collect_ignore = ['test_waiter.py'] if sys.version_info < (3, 5) else []
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmpdir_factory, monkeypatch):
+    """Keep the data cached between runs out of the user's home."""
+    path = tmpdir_factory.mktemp('cache')
+    monkeypatch.setenv('TOX_TRAVIS_CACHE_DIR', str(path))
+    return path
@@ -1,4 +1,10 @@
 """Tests of the --travis-after flag."""
+import io
+import os
+import json
+import stat
+import time
+import threading
 import pytest
 import py
 import subprocess
@@ -6,7 +12,22 @@ from contextlib import contextmanager
 from tox_travis.after import (
     travis_after,
     after_config_matches,
+    get_access_token,
+    get_job_statuses,
+    get_job_selector,
+    job_selected,
+    parse_job_env,
+    get_jobs,
+    get_build,
+    urllib2,
+    Clock,
+    Transport,
+    RateLimit,
 )
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer  # Python 2
 
 
 ini = b"""
@@ -27,6 +48,15 @@ source =
 """
 
 
+def fake_open_url(responses):
+    """Make a replacement for open_url giving the responses in order."""
+    responses = iter(responses)
+
+    def open_url(url, auth=None, data=None, limit=None):
+        return io.BytesIO(json.dumps(next(responses)).encode('utf-8'))
+    return open_url
+
+
 class TestAfter:
     """Test the logic of waiting for other jobs to finish."""
 
@@ -157,6 +187,7 @@ class TestAfter:
         """Bahave when required environment is present and jobs pass."""
         mocker.patch('tox_travis.after.after_config_matches',
                      return_value=True)
+        mocker.patch('tox_travis.after.get_job_selector', return_value=None)
         monkeypatch.setenv('TRAVIS', 'true')
         monkeypatch.setenv('GITHUB_TOKEN', 'spamandeggs')
         monkeypatch.setenv('TRAVIS_BUILD_ID', '141739801')
@@ -242,11 +273,8 @@ class TestAfter:
                        'tags': None}]},
         ]
 
-        def get_json(url, auth=None, data=None):
-            return next(get_json.responses)
-        get_json.responses = iter(responses)
-
-        mocker.patch('tox_travis.after.get_json', side_effect=get_json)
+        mocker.patch('tox_travis.after.open_url',
+                     side_effect=fake_open_url(responses))
         travis_after(mocker.Mock(), mocker.Mock())
         out, err = capsys.readouterr()
         assert 'All required jobs were successful.' in out
@@ -255,6 +283,7 @@ class TestAfter:
         """Bahave when required environment is present and a job failed."""
         mocker.patch('tox_travis.after.after_config_matches',
                      return_value=True)
+        mocker.patch('tox_travis.after.get_job_selector', return_value=None)
         monkeypatch.setenv('TRAVIS', 'true')
         monkeypatch.setenv('GITHUB_TOKEN', 'spamandeggs')
         monkeypatch.setenv('TRAVIS_BUILD_ID', '141739330')
@@ -343,11 +372,8 @@ class TestAfter:
                        'tags': None}]},
         ]
 
-        def get_json(url, auth=None, data=None):
-            return next(get_json.responses)
-        get_json.responses = iter(responses)
-
-        mocker.patch('tox_travis.after.get_json', side_effect=get_json)
+        mocker.patch('tox_travis.after.open_url',
+                     side_effect=fake_open_url(responses))
 
         with pytest.raises(SystemExit) as excinfo:
             travis_after(mocker.Mock(), mocker.Mock())
@@ -458,3 +484,473 @@ class TestAfter:
         )
         ini = py.iniconfig.IniConfig('', data=inistr)
         assert not after_config_matches(ini, ['py35'])
+
+
+class TestJobSelector:
+    """Test waiting for only the jobs selected in [travis:after]."""
+
+    def job(self, number, **config):
+        """Make a job with the given config."""
+        return {'number': number, 'allow_failure': False,
+                'finished_at': None, 'state': 'started', 'config': config}
+
+    def test_unconfigured(self):
+        """Without a selector, wait for all the jobs."""
+        ini = py.iniconfig.IniConfig(
+            '', data='[travis:after]\nenvlist = py36\n')
+        assert get_job_selector(ini) is None
+        assert job_selected(self.job('7.1', os='osx'), None)
+
+    def test_get_job_selector(self):
+        """Read all the keys of the selector."""
+        inistr = (
+            '[travis:after]\n'
+            'jobs = 7.1, *.2\n'
+            'os = linux\n'
+            'stage = test\n'
+            'job_env =\n'
+            '    DJANGO: 1.8\n'
+        )
+        ini = py.iniconfig.IniConfig('', data=inistr)
+        assert get_job_selector(ini) == {
+            'jobs': ['7.1', '*.2'],
+            'os': ['linux'],
+            'stage': ['test'],
+            'job_env': {'DJANGO': '1.8'},
+        }
+
+    def test_jobs(self):
+        """Match the job numbers with patterns."""
+        selector = {'jobs': ['*.1', '7.3']}
+        assert job_selected(self.job('7.1'), selector)
+        assert not job_selected(self.job('7.2'), selector)
+        assert job_selected(self.job('7.3'), selector)
+        assert not job_selected(self.job('7.11'), selector)
+
+    def test_os(self):
+        """Jobs without an os run on Linux."""
+        selector = {'os': ['linux']}
+        assert job_selected(self.job('7.1'), selector)
+        assert job_selected(self.job('7.2', os='linux'), selector)
+        assert not job_selected(self.job('7.3', os='osx'), selector)
+
+    def test_stage(self):
+        """Jobs without a stage are in the test stage."""
+        selector = {'stage': ['Test']}
+        assert job_selected(self.job('7.1'), selector)
+        assert not job_selected(self.job('7.2', stage='deploy'), selector)
+
+    def test_job_env(self):
+        """All the given variables must be set in the job config."""
+        selector = {'job_env': {'DJANGO': '1.8', 'DB': 'postgres'}}
+        assert job_selected(
+            self.job('7.1', env='DJANGO=1.8 DB=postgres'), selector)
+        assert not job_selected(
+            self.job('7.2', env='DJANGO=1.7 DB=postgres'), selector)
+        assert not job_selected(self.job('7.3', env='DJANGO=1.8'), selector)
+        assert not job_selected(self.job('7.4'), selector)
+
+    def test_parse_job_env(self):
+        """Parse quoted values and lists, and skip encrypted variables."""
+        assert parse_job_env('A=1 B="two words"') == {
+            'A': '1', 'B': 'two words'}
+        assert parse_job_env(['A=1', {'secure': 'xyz'}, 'C=3']) == {
+            'A': '1', 'C': '3'}
+        assert parse_job_env(None) == {}
+
+    def test_wait_for_selected(self, mocker):
+        """Stop waiting once the selected jobs are complete."""
+        mocker.patch('tox_travis.after.get_access_token', return_value='auth')
+        mocker.patch('tox_travis.after.get_jobs', return_value=[
+            self.job('7.1', os='linux'),
+            dict(self.job('7.2', os='linux'),
+                 finished_at='now', state='passed'),
+            self.job('7.3', os='osx'),
+        ])
+        sleep = mocker.patch('tox_travis.after.time.sleep')
+        statuses = get_job_statuses(
+            'token', 'https://api', 7, 5, '7.1', selector={'os': ['linux']})
+        assert statuses == [True]
+        assert not sleep.called
+
+
+class TestGetBuild:
+    """Test parsing the build documents."""
+
+    def test_only_needed_fields(self, mocker):
+        """Only the fields needed to follow the jobs are kept."""
+        build = {
+            'build': {'id': 7, 'job_ids': [1], 'config': {'os': 'linux'}},
+            'commit': {'message': 'Add languages to the mix'},
+            'jobs': [{'id': 1, 'number': '7.1', 'allow_failure': False,
+                      'finished_at': None, 'state': 'started',
+                      'config': {'os': 'linux', 'script': 'env'}}],
+        }
+        mocker.patch('tox_travis.after.open_url',
+                     side_effect=fake_open_url([build]))
+        assert get_build('https://api/builds/7') == {
+            'build': {'job_ids': [1]},
+            'jobs': [{'id': 1, 'number': '7.1', 'allow_failure': False,
+                      'finished_at': None, 'state': 'started',
+                      'config': {'os': 'linux'}}],
+        }
+
+
+class TestAccessToken:
+    """Test the cache of the Travis access token."""
+
+    def test_cached(self, mocker, cache_dir):
+        """Exchange the GitHub token only once."""
+        get_json = mocker.patch('tox_travis.after.get_json',
+                                return_value={'access_token': 'travis'})
+
+        assert get_access_token('spamandeggs', 'https://api') == 'travis'
+        assert get_access_token('spamandeggs', 'https://api') == 'travis'
+        assert get_json.call_count == 1
+
+        path, = cache_dir.join('tokens').listdir()
+        assert 'spamandeggs' not in path.basename
+        assert stat.S_IMODE(os.stat(str(path)).st_mode) == 0o600
+
+    def test_keyed(self, mocker):
+        """Don't share access tokens between API URLs and GitHub tokens."""
+        get_json = mocker.patch('tox_travis.after.get_json',
+                                return_value={'access_token': 'travis'})
+
+        get_access_token('spamandeggs', 'https://api')
+        get_access_token('spamandeggs', 'https://other')
+        get_access_token('eggsandspam', 'https://api')
+        assert get_json.call_count == 3
+
+    def test_expired(self, mocker):
+        """Get a new access token when the cached one expired."""
+        get_json = mocker.patch('tox_travis.after.get_json',
+                                return_value={'access_token': 'travis'})
+        mocker.patch('tox_travis.after.ACCESS_TOKEN_TTL', -1)
+
+        get_access_token('spamandeggs', 'https://api')
+        get_access_token('spamandeggs', 'https://api')
+        assert get_json.call_count == 2
+
+    def test_refresh(self, mocker):
+        """Replace the cached token when asked to refresh."""
+        mocker.patch('tox_travis.after.get_json',
+                     return_value={'access_token': 'old'})
+        get_access_token('spamandeggs', 'https://api')
+
+        mocker.patch('tox_travis.after.get_json',
+                     return_value={'access_token': 'new'})
+        assert get_access_token('spamandeggs', 'https://api') == 'old'
+        assert get_access_token(
+            'spamandeggs', 'https://api', refresh=True) == 'new'
+        assert get_access_token('spamandeggs', 'https://api') == 'new'
+
+    def test_corrupt(self, mocker, cache_dir):
+        """Ignore a cache that can't be read."""
+        mocker.patch('tox_travis.after.get_json',
+                     return_value={'access_token': 'travis'})
+        get_access_token('spamandeggs', 'https://api')
+        path, = cache_dir.join('tokens').listdir()
+        path.write('{"access')
+
+        assert get_access_token('spamandeggs', 'https://api') == 'travis'
+
+    def test_refresh_after_unauthorized(self, mocker):
+        """Refresh a cached access token that is no longer accepted."""
+        build = {'jobs': [{'number': '1.1', 'allow_failure': False,
+                           'finished_at': 'now', 'state': 'passed'}]}
+
+        def get_json(url, auth=None, data=None, limit=None):
+            if data:
+                return {'access_token': next(get_json.tokens)}
+            if auth == 'stale':
+                raise urllib2.HTTPError(url, 401, 'Unauthorized', {}, None)
+            return build
+        get_json.tokens = iter(['stale', 'fresh'])
+        mocker.patch('tox_travis.after.get_json', side_effect=get_json)
+        mocker.patch('tox_travis.after.get_build', side_effect=get_json)
+
+        get_access_token('spamandeggs', 'https://api')
+        assert get_job_statuses(
+            'spamandeggs', 'https://api', '1', 0, '1.2') == [True]
+        assert get_access_token('spamandeggs', 'https://api') == 'fresh'
+
+
+class TestGetJobs:
+    """Test fetching all the jobs of a build."""
+
+    def job(self, job_id, **kwargs):
+        """Make a job document."""
+        job = {'id': job_id, 'number': '1.{0}'.format(job_id),
+               'allow_failure': False, 'finished_at': None,
+               'state': 'started'}
+        job.update(kwargs)
+        return job
+
+    def test_single_document(self, mocker):
+        """Use the jobs in the build document as they are."""
+        get_build = mocker.patch('tox_travis.after.get_build', return_value={
+            'build': {'job_ids': [1, 2]},
+            'jobs': [self.job(1), self.job(2)],
+        })
+        assert get_jobs('https://api', 7, 'auth') == [
+            self.job(1), self.job(2)]
+        get_build.assert_called_once_with(
+            'https://api/builds/7', auth='auth', limit=None)
+
+    def test_pagination(self, mocker):
+        """Follow the pages of the build document."""
+        pages = {
+            'https://api/builds/7': {
+                'build': {'job_ids': [1, 2, 3]},
+                'jobs': [self.job(1)],
+                '@pagination': {'next': {'@href': '/builds/7?offset=1'}},
+            },
+            'https://api/builds/7?offset=1': {
+                'jobs': [self.job(2), self.job(3)],
+                '@pagination': {'next': None},
+            },
+        }
+        mocker.patch('tox_travis.after.get_build',
+                     side_effect=lambda url, auth, limit: pages[url])
+        assert get_jobs('https://api', 7, 'auth') == [
+            self.job(1), self.job(2), self.job(3)]
+
+    def test_missing_jobs(self, mocker):
+        """Fetch the jobs that are missing or incomplete."""
+        documents = {
+            'https://api/builds/7': {
+                'build': {'job_ids': [1, 2, 3, 4]},
+                'jobs': [self.job(2), {'id': 3, 'number': '1.3'}],
+            },
+            'https://api/jobs/1': {'job': self.job(1, state='passed')},
+            'https://api/jobs/3': {'job': self.job(3, state='failed')},
+            'https://api/jobs/4': {'job': self.job(4, config={})},
+        }
+
+        def get_document(url, auth, limit):
+            return documents[url]
+        get_build = mocker.patch('tox_travis.after.get_build',
+                                 side_effect=get_document)
+        get_json = mocker.patch('tox_travis.after.get_json',
+                                side_effect=get_document)
+
+        assert get_jobs('https://api', 7, 'auth') == [
+            self.job(1, state='passed'),
+            self.job(2),
+            self.job(3, state='failed'),
+            self.job(4, config={}),
+        ]
+        assert get_build.call_count == 1
+        assert get_json.call_count == 3
+
+
+class StubTravis(object):
+    """A local stand-in for the Travis API that enforces a rate limit."""
+
+    def __init__(self, limit, window, polls, refuse=0):
+        self.limit = limit
+        self.window = window
+        self.polls = polls  # Until the other job finishes
+        self.refuse = refuse  # Builds requests to refuse as unavailable
+        self.reset = None
+        self.count = 0
+        self.exceeded = 0
+        self.builds = 0
+
+    def respond(self, handler):
+        """Respond to a request, counting it against the limit."""
+        now = time.time()
+        if self.reset is None or now >= self.reset:
+            self.reset, self.count = now + self.window, 0
+        self.count += 1
+        headers = {
+            'X-RateLimit-Limit': str(self.limit),
+            'X-RateLimit-Remaining': str(max(self.limit - self.count, 0)),
+            'X-RateLimit-Reset': repr(self.reset),
+        }
+
+        if self.count > self.limit:
+            self.exceeded += 1
+            status, body = 429, {}
+            headers['Retry-After'] = '1'
+        elif handler.path == '/auth/github':
+            status, body = 200, {'access_token': 'travis'}
+        elif self.refuse:
+            self.refuse -= 1
+            status, body = 503, {}
+            headers['Retry-After'] = '0'
+        else:
+            self.builds += 1
+            finished = self.builds >= self.polls
+            status, body = 200, {'jobs': [
+                {'number': '1.1', 'allow_failure': False,
+                 'finished_at': None, 'state': 'started'},
+                {'number': '1.2', 'allow_failure': False,
+                 'finished_at': 'now' if finished else None,
+                 'state': 'passed' if finished else 'started'},
+            ]}
+
+        content = json.dumps(body).encode('utf-8')
+        handler.send_response(status)
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.send_header('Content-Length', str(len(content)))
+        handler.end_headers()
+        handler.wfile.write(content)
+
+
+@contextmanager
+def serve(stub):
+    """Serve the stub API on localhost, and yield its URL."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            stub.respond(self)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers['Content-Length']))
+            stub.respond(self)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        yield 'http://127.0.0.1:{0}'.format(server.server_address[1])
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class TestClockTransport:
+    """Test running the polling in simulated time against a stub."""
+
+    class FakeClock(Clock):
+        def __init__(self):
+            self.now = 1000.0
+
+        def time(self):
+            return self.now
+
+        def sleep(self, seconds):
+            self.now += seconds
+
+    class StubTransport(Transport):
+        """Finish the other job after a while, and record the requests."""
+
+        def __init__(self, clock, finished):
+            self.clock = clock
+            self.finished = finished
+            self.urls = []
+
+        def urlopen(self, request):
+            self.urls.append(request.get_full_url())
+            if request.get_full_url().endswith('/auth/github'):
+                body = {'access_token': 'travis'}
+            else:
+                done = self.clock.time() >= self.finished
+                body = {'jobs': [
+                    {'number': '1.1', 'allow_failure': False,
+                     'finished_at': None, 'state': 'started'},
+                    {'number': '1.2', 'allow_failure': False,
+                     'finished_at': 'now' if done else None,
+                     'state': 'passed' if done else 'started'},
+                ]}
+            response = io.BytesIO(json.dumps(body).encode('utf-8'))
+            response.info = lambda: {}
+            return response
+
+    def test_simulated(self, monkeypatch, mocker):
+        """The wait uses the clock and transport of the module."""
+        sleep = mocker.patch('time.sleep')
+        clock = self.FakeClock()
+        transport = self.StubTransport(clock, finished=1100)
+        monkeypatch.setattr('tox_travis.after.clock', clock)
+        monkeypatch.setattr('tox_travis.after.transport', transport)
+        monkeypatch.setattr('tox_travis.after.rate_limit', RateLimit())
+
+        statuses = get_job_statuses('github', 'https://api', '1', 30, '1.1')
+
+        assert statuses == [True]
+        assert clock.now == 1120
+        assert transport.urls == ['https://api/auth/github'] + [
+            'https://api/builds/1'] * 5
+        assert not sleep.called
+
+
+class TestRateLimit:
+    """Test keeping the polling within the rate limit of the API."""
+
+    @pytest.fixture(autouse=True)
+    def rate_limit(self, monkeypatch):
+        """Start every test without any known budget."""
+        rate_limit = RateLimit()
+        monkeypatch.setattr('tox_travis.after.rate_limit', rate_limit)
+        return rate_limit
+
+    def test_quota_never_exceeded(self):
+        """Spread the polling so that the quota is never exceeded."""
+        stub = StubTravis(limit=3, window=0.2, polls=6)
+        with serve(stub) as api_url:
+            statuses = get_job_statuses('github', api_url, '1', 0, '1.1')
+
+        assert statuses == [True]
+        assert stub.builds == 6
+        assert stub.exceeded == 0
+
+    def test_own_limit(self, rate_limit):
+        """Requests to another API are kept within its own limit."""
+        stub = StubTravis(limit=100, window=60, polls=1)
+        limit = RateLimit()
+        with serve(stub) as api_url:
+            get_jobs(api_url, '1', 'travis', limit=limit)
+
+        assert limit.remaining == 99
+        assert rate_limit.remaining is None
+        assert rate_limit.requests == 0
+
+    def test_retry_unavailable(self):
+        """Retry requests refused while the API is unavailable."""
+        stub = StubTravis(limit=100, window=60, polls=1, refuse=2)
+        with serve(stub) as api_url:
+            statuses = get_job_statuses('github', api_url, '1', 0, '1.1')
+
+        assert statuses == [True]
+        assert stub.refuse == 0
+
+    def test_delay_unknown_budget(self, rate_limit):
+        """Use the polling interval while the budget is unknown."""
+        assert rate_limit.delay(5) == 5
+
+    def test_delay_spread(self, rate_limit, mocker):
+        """Spread the remaining requests until the reset."""
+        mocker.patch('time.time', return_value=1000)
+        rate_limit.update({'X-RateLimit-Remaining': '20',
+                           'X-RateLimit-Reset': '1100'})
+        rate_limit.requests = 2
+        assert rate_limit.delay(5) == 10
+        rate_limit.requests = 2
+        assert rate_limit.delay(30) == 30
+
+    def test_delay_exhausted(self, rate_limit, mocker):
+        """Wait for the reset when the budget is spent."""
+        mocker.patch('time.time', return_value=1000)
+        rate_limit.update({'X-RateLimit-Remaining': '1',
+                           'X-RateLimit-Reset': '1100'})
+        rate_limit.requests = 3
+        assert rate_limit.delay(5) == 100
+
+    def test_backoff_retry_after(self, rate_limit, mocker):
+        """Respect the Retry-After header, in seconds or as a date."""
+        mocker.patch('time.time', return_value=784111787)
+        assert rate_limit.backoff({'Retry-After': '7'}, 0) == 7
+        assert rate_limit.backoff(
+            {'Retry-After': 'Sun, 06 Nov 1994 08:49:57 GMT'}, 0) == 10
+
+    def test_backoff_exponential(self, rate_limit):
+        """Back off exponentially without a Retry-After header."""
+        assert [rate_limit.backoff({}, attempt) for attempt in range(8)] == [
+            1, 2, 4, 8, 16, 32, 60, 60]
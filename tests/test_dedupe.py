@@ -0,0 +1,82 @@
+"""Test sharing the identical files of the envs."""
+import os
+
+import py
+
+from tox_travis.dedupe import get_dedupe_store, dedupe_envs
+
+
+class TestDedupe:
+    """Test replacing identical files with links to a store."""
+
+    def config(self, mocker, tmpdir, envs):
+        """Make a config with envs that have the given installed files."""
+        config = mocker.Mock()
+        config._cfg = py.iniconfig.IniConfig('', data=(
+            '[travis]\ndedupe_store = {toxworkdir}/store\n'))
+        config.toxinidir = tmpdir
+        config.toxworkdir = tmpdir.join('.tox')
+        config.homedir = tmpdir.join('home')
+        config.envconfigs = {}
+        for envname, files in envs.items():
+            envdir = config.toxworkdir.join(envname)
+            site_packages = envdir.join('lib', 'python3.7', 'site-packages')
+            for name, content in files.items():
+                site_packages.join(name).write(content, ensure=True)
+            envdir.join('bin', 'python').write('python', ensure=True)
+            config.envconfigs[envname] = mocker.Mock(envdir=envdir)
+        return config
+
+    def site_packages(self, config, envname, name):
+        """Get an installed file of an env."""
+        return config.toxworkdir.join(
+            envname, 'lib', 'python3.7', 'site-packages', name)
+
+    def test_store(self, mocker, tmpdir):
+        """The store is in the [travis] section."""
+        config = self.config(mocker, tmpdir, {})
+        assert get_dedupe_store(config) == tmpdir.join('.tox', 'store')
+
+    def test_dedupe(self, mocker, tmpdir, capsys):
+        """Identical files are linked, others are left alone."""
+        django = 'import django' * 100
+        config = self.config(mocker, tmpdir, {
+            'py37-django21': {'django/__init__.py': django, 'six.py': 'a'},
+            'py37-django22': {'django/__init__.py': django, 'six.py': 'bb'},
+            'py37-docs': {'django/__init__.py': django},
+        })
+        store = str(tmpdir.join('.tox', 'store'))
+        envnames = ['py37-django21', 'py37-django22', 'py37-docs']
+
+        assert dedupe_envs(config, envnames, store) == (2600, 2600)
+
+        inodes = set(
+            os.stat(str(self.site_packages(config, envname,
+                                           'django/__init__.py'))).st_ino
+            for envname in envnames)
+        assert len(inodes) == 1
+        assert self.site_packages(
+            config, 'py37-django21', 'six.py').read() == 'a'
+        assert self.site_packages(
+            config, 'py37-django22', 'six.py').read() == 'bb'
+        assert not config.toxworkdir.join(
+            'py37-docs', 'bin', 'python').stat().nlink > 1
+
+        out, err = capsys.readouterr()
+        assert 'Linked 2 identical files' in err
+        assert '2.5 KB of disk, and 2.5 KB of the cache upload' in err
+
+        # Already linked files stay the same
+        hash_file = mocker.patch('tox_travis.dedupe.hash_file')
+        assert dedupe_envs(config, envnames, store) == (0, 2600)
+        assert not hash_file.called
+
+    def test_modes(self, mocker, tmpdir):
+        """Files with different modes aren't linked."""
+        config = self.config(mocker, tmpdir, {
+            'py36': {'script.py': 'print(1)'},
+            'py37': {'script.py': 'print(1)'},
+        })
+        self.site_packages(config, 'py37', 'script.py').chmod(0o755)
+        store = str(tmpdir.join('.tox', 'store'))
+        assert dedupe_envs(config, ['py36', 'py37'], store) == (0, 0)
@@ -0,0 +1,62 @@
+"""Tests of the differential harness for matching envs."""
+from tox_travis.differential import (
+    compare,
+    current_match,
+    main,
+    random_cases,
+    reference_match,
+)
+
+
+def reversed_match(declared, desired_factors):
+    """A matcher that gets the envs right, but not their order."""
+    return current_match(declared, desired_factors)[::-1]
+
+
+class TestDifferential:
+    """Test comparing matchers with the reference on random cases."""
+
+    def test_current_agrees(self):
+        """The current matching gives the same envs as the reference."""
+        assert compare(random_cases(300, seed=0)) is None
+
+    def test_reproducible(self):
+        """The same seed gives the same cases."""
+        assert random_cases(20, seed=1) == random_cases(20, seed=1)
+        assert random_cases(20, seed=1) != random_cases(20, seed=2)
+
+    def test_divergence(self):
+        """The first case where a matcher differs is reported."""
+        cases = random_cases(300, seed=0)
+        divergence = compare(cases, matcher=reversed_match)
+        assert divergence['function'] == 'matcher'
+        assert divergence['case'] in cases
+        assert divergence['expected'] == reference_match(
+            divergence['case']['declared'],
+            divergence['case']['desired_factors'])
+        assert divergence['actual'] == divergence['expected'][::-1]
+        assert len(divergence['actual']) > 1
+
+    def test_passthru(self):
+        """Desired envs are used verbatim when nothing matches."""
+        assert reference_match(['py27'], [['py36', 'docs']]) == \
+            ['py36', 'docs']
+        assert current_match(['py27'], [['py36', 'docs']]) == \
+            ['py36', 'docs']
+        assert current_match(['py27'], [['py36'], ['docs']]) == []
+
+    def test_main(self, capsys, tmpdir, monkeypatch):
+        """Report the throughput, or the case that diverged."""
+        assert main(['--iterations', '50', '--seed', '3']) == 0
+        out, _ = capsys.readouterr()
+        assert '50 cases agree with seed 3.' in out
+        assert 'matcher reference' in out
+
+        tmpdir.join('docs_matcher.py').write(
+            'def match(declared, desired_factors):\n'
+            '    return ["docs"]\n')
+        monkeypatch.syspath_prepend(str(tmpdir))
+        assert main(['--iterations', '50', '--seed', '0', '--matcher',
+                     'docs_matcher:match']) == 1
+        _, err = capsys.readouterr()
+        assert 'The matcher diverged with seed 0 on:' in err
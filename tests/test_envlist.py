@@ -5,6 +5,22 @@ import subprocess
 import pytest
 from contextlib import contextmanager
 
+from tox.config import _split_env as split_env
+from tox_travis.envlist import (
+    Env,
+    Envlist,
+    expand_envlist,
+    unique_envs,
+    match_envs,
+    match_factors,
+    env_matches,
+    FactorPatterns,
+    get_affected_envs,
+    detect_envlist,
+)
+from tox_travis.ini import IniFile
+from tox_travis.testing import make_config
+
 
 coverage_config = b"""
 [run]
@@ -98,6 +114,16 @@ DJANGO =
     2.2: django22
 """
 
+tox_ini_patterns = b"""
+[tox]
+envlist = py{36,37}-django{21,22}, py37-docs, py37-docs-spelling, lint
+
+[travis]
+python =
+    3.6: py36-/django2\\d/
+    3.7: py37-django*, py?7-/lint|docs/
+"""
+
 tox_ini_ignore_outcome = b"""
 [tox]
 envlist = py{35,36,37}
@@ -120,11 +146,12 @@ unignore_outcomes = False
 class TestToxEnv:
     """Test the logic to automatically configure TOXENV with Travis."""
 
-    def tox_envs(self, **kwargs):
-        """Find the envs that tox sees."""
-        returncode, stdout, stderr = self.tox_envs_raw(**kwargs)
-        assert returncode == 0, stderr
-        return [env for env in stdout.strip().splitlines()]
+    def tox_envs(self, ini_filename='tox.ini'):
+        """Find the envs that tox sees, configuring it in process."""
+        config = make_config(
+            py.path.local(ini_filename).read(), args=['-l'],
+            toxinidir=py.path.local(), ini_filename=ini_filename)
+        return config.envlist_default
 
     def tox_envs_raw(self, ini_filename=None):
         """Return the raw output of finding what tox sees."""
@@ -404,6 +431,24 @@ class TestToxEnv:
         ):
             assert self.tox_envs() == ['py37-django22']
 
+    def test_travis_patterns_py36(self, tmpdir, monkeypatch):
+        """Match envs with regular expression factors."""
+        tox_ini = tox_ini_patterns
+        with self.configure(
+            tmpdir, monkeypatch, tox_ini, travis_version='3.6'
+        ):
+            assert self.tox_envs() == ['py36-django21', 'py36-django22']
+
+    def test_travis_patterns_py37(self, tmpdir, monkeypatch):
+        """Match envs with wildcard and regular expression factors."""
+        tox_ini = tox_ini_patterns
+        with self.configure(
+            tmpdir, monkeypatch, tox_ini, travis_version='3.7'
+        ):
+            assert self.tox_envs() == [
+                'py37-django21', 'py37-django22',
+                'py37-docs', 'py37-docs-spelling']
+
     def test_legacy_warning(self, tmpdir, monkeypatch):
         """Using the legacy tox:travis section prints a warning on stderr."""
         tox_ini = tox_ini_legacy_warning
@@ -450,3 +495,305 @@ class TestToxEnv:
         with self.configure(tmpdir, monkeypatch, tox_ini):
             config = self.tox_config()
             assert config["testenv:py37"]["ignore_outcome"] == "True"
+
+
+class TestEnv:
+    """Test the representation of envs."""
+
+    def test_factors(self):
+        """The name is split into factors."""
+        env = Env('py37-django22')
+        assert env.name == str(env) == 'py37-django22'
+        assert env.factors == ('py37', 'django22')
+        assert env.factor_set == frozenset(['py37', 'django22'])
+
+    def test_shared_factors(self):
+        """Envs share the factors they have in common."""
+        name = ''.join(['py', '37-docs'])  # Not a constant of the code
+        assert Env(name).factors[0] is Env('py37-django22').factors[0]
+        assert Env('docs-py37').factor_set == Env('py37-docs').factor_set
+
+    def test_matches(self):
+        """Envs match when they have all the desired factors."""
+        assert env_matches(Env('py37-django-db'), Env('django-py37'))
+        assert not env_matches(Env('py37-django'), Env('py37-docs'))
+
+    def test_matches_names(self):
+        """Env names can be matched without making envs."""
+        assert env_matches('py37-django-db', 'django-py37')
+        assert not env_matches(Env('py37-django'), 'py37-docs')
+
+
+class TestMatchEnvs:
+    """Test matching the declared envs with the desired envs."""
+
+    declared = [Env('py36'), Env('py37'), Env('py37-docs'), Env('docs')]
+
+    def test_match(self):
+        """Keep the declared envs that match, in order."""
+        desired = [Env('docs'), Env('py37')]
+        assert match_envs(self.declared, desired, passthru=True) == [
+            Env('py37'), Env('py37-docs'), Env('docs')]
+
+    def test_passthru(self):
+        """Use the desired envs when nothing matches and passthru is set."""
+        desired = [Env('py38')]
+        assert match_envs(self.declared, desired, passthru=True) == desired
+        assert match_envs(self.declared, desired, passthru=False) == []
+
+
+class TestExpandEnvlist:
+    """Test the lazy expansion of envlists."""
+
+    @pytest.mark.parametrize('value', [
+        '',
+        'py37',
+        'py36, py37,docs',
+        'py{27,36,37}-django{18, 111 ,22}, docs',
+        'py37-{a,b}{c,d}-e',
+        'py37 # comment\n  py38\n\n# docs\n  flake8',
+        'py37,,py38, ',
+    ])
+    def test_like_tox(self, value):
+        """Expand envlists the same way tox does."""
+        assert [env.name for env in expand_envlist(value)] == split_env(value)
+
+    def test_duplicates(self):
+        """Keep duplicates like tox, unless dropped with unique_envs."""
+        value = 'py{37,36,37}-{a,a}, py36-a, docs'
+        assert [env.name for env in expand_envlist(value)] == [
+            'py37-a', 'py37-a', 'py36-a', 'py36-a', 'py37-a', 'py37-a',
+            'py36-a', 'docs']
+        assert [env.name for env in unique_envs(expand_envlist(value))] == [
+            'py37-a', 'py36-a', 'docs']
+
+    def test_envlist(self):
+        """An envlist is expanded again each time it's gone through."""
+        envlist = Envlist('py{36,37}, docs')
+        assert [env.name for env in envlist] == ['py36', 'py37', 'docs']
+        assert [env.name for env in envlist] == ['py36', 'py37', 'docs']
+
+    def test_passthru_once(self):
+        """Desired envs used verbatim are only given once."""
+        desired = Envlist('py38, docs, py38')
+        assert match_envs([Env('py37')], desired, passthru=True) == [
+            Env('py38'), Env('docs')]
+        assert match_envs([Env('py37')], iter(desired), passthru=True) == [
+            Env('py38'), Env('docs')]
+
+    def test_lazy(self):
+        """Don't expand more than is asked for."""
+        envs = expand_envlist(',\n'.join(['x{0}-{{{1}}}'.format(
+            n, ','.join(map(str, range(1000)))) for n in range(1000)]))
+        assert next(envs).name == 'x0-0'
+        assert next(envs).name == 'x0-1'
+
+
+class TestMatchFactors:
+    """Test matching declared envs with the product of desired factors."""
+
+    declared = [Env(name) for name in [
+        'py36-django21', 'py36-django22', 'py37-django21', 'py37-django22',
+        'py37-docs', 'docs', 'lint-py37-django22',
+    ]]
+
+    def test_product(self):
+        """Match the declared envs that match the product of the factors."""
+        desired = [
+            expand_envlist('py37, docs'),
+            expand_envlist('django22, docs'),
+        ]
+        assert match_factors(self.declared, desired) == [
+            Env('py37-django22'), Env('py37-docs'), Env('docs'),
+            Env('lint-py37-django22')]
+
+    def test_unmatched_factor(self):
+        """All the factors must be matched."""
+        desired = [expand_envlist('py37'), expand_envlist('django30')]
+        assert match_factors(self.declared, desired) == []
+
+    def test_no_factors(self):
+        """Don't match anything without any desired factors."""
+        assert match_factors(self.declared, []) == []
+
+
+class TestFactorPatterns:
+    """Test matching factors with patterns."""
+
+    declared = [Env(name) for name in [
+        'py27', 'py36-django111', 'py37-django22', 'py37-djangomaster',
+        'docs', 'py37-lint',
+    ]]
+
+    def test_wildcards(self):
+        """Match factors with * and ? wildcards."""
+        desired = [Env('py3*-django??')]
+        assert match_envs(self.declared, desired, passthru=True) == [
+            Env('py37-django22')]
+
+    def test_regex(self):
+        """Match whole factors with regular expressions."""
+        desired = [Env(r'/django\d+/'), Env('/lint|docs/')]
+        assert match_envs(self.declared, desired, passthru=True) == [
+            Env('py36-django111'), Env('py37-django22'), Env('docs'),
+            Env('py37-lint')]
+
+    def test_plain_factors_exact(self):
+        """Plain factors still have to match exactly."""
+        desired = [Env('py3'), Env('django')]
+        assert match_envs(self.declared, desired, passthru=False) == []
+
+    def test_no_passthru(self):
+        """Patterns aren't passed through when nothing matches."""
+        desired = [Env('py38'), Env('py38-*')]
+        assert match_envs(self.declared, desired, passthru=True) == [
+            Env('py38')]
+
+    def test_factors(self):
+        """Patterns work with the product of factors."""
+        desired = [expand_envlist('py3?'), expand_envlist('/django\\d+/')]
+        assert match_factors(self.declared, desired) == [
+            Env('py36-django111'), Env('py37-django22')]
+
+    def test_extend(self):
+        """Extend factor sets with the patterns they match."""
+        patterns = FactorPatterns([frozenset(['py3*', '/py\\d+/', 'docs'])])
+        assert patterns.extend(frozenset(['py37', 'docs'])) == frozenset([
+            'py37', 'docs', 'py3*', '/py\\d+/'])
+        assert patterns.extend(frozenset(['docs'])) == frozenset(['docs'])
+
+
+class TestAffectedEnvs:
+    """Test selecting the envs affected by the changed files."""
+
+    paths_ini = (
+        '[tox]\n'
+        'envlist = py{36,37}-{core,web}, docs\n'
+        '\n'
+        '[travis:paths]\n'
+        'docs/* = docs\n'
+        'src/core/* = core\n'
+        'src/web/* = web\n'
+        '*.rst = docs\n'
+    )
+
+    @pytest.fixture
+    def repo(self, tmpdir, monkeypatch):
+        """Make a git repository with a commit range of changed files."""
+        def git(*args):
+            subprocess.check_call(('git',) + args, cwd=str(tmpdir),
+                                  stdout=subprocess.PIPE)
+
+        def commit(*paths):
+            for path in paths:
+                tmpdir.join(path).write(files.get(path, path), ensure=True)
+            git('add', '.')
+            git('-c', 'user.name=Tox', '-c', 'user.email=tox@example.com',
+                'commit', '-q', '--allow-empty', '-m', 'Change')
+            proc = subprocess.Popen(['git', 'rev-parse', 'HEAD'],
+                                    cwd=str(tmpdir), stdout=subprocess.PIPE)
+            return proc.communicate()[0].decode('ascii').strip()
+
+        def change(*paths):
+            start = commit('tox.ini')
+            end = commit(*paths)
+            monkeypatch.setenv('TRAVIS_COMMIT_RANGE',
+                               '{0}...{1}'.format(start, end))
+            return py.iniconfig.IniConfig(
+                str(tmpdir.join('tox.ini')), data=self.paths_ini)
+
+        files = {'tox.ini': self.paths_ini}
+        git('init', '-q')
+        return change
+
+    def affected(self, ini):
+        """Get the names of the affected envs, once each."""
+        envs = get_affected_envs(ini)
+        return envs if envs is None else [
+            env.name for env in unique_envs(envs)]
+
+    def test_unconfigured(self, repo):
+        """Everything is affected without configured paths."""
+        ini = py.iniconfig.IniConfig('', data='[tox]\nenvlist = py37\n')
+        assert get_affected_envs(ini) is None
+
+    def test_no_range(self, repo, monkeypatch):
+        """Everything is affected without a commit range."""
+        ini = repo('docs/index.rst')
+        monkeypatch.delenv('TRAVIS_COMMIT_RANGE')
+        assert self.affected(ini) is None
+
+    def test_docs(self, repo):
+        """Only select the envs of the globs that match."""
+        assert self.affected(repo('docs/index.rst', 'README.rst')) == [
+            'docs']
+
+    def test_several(self, repo):
+        """Select the envs of every glob that matches."""
+        assert self.affected(repo(
+            'docs/index.rst', 'src/web/views.py', 'src/web/urls.py',
+        )) == ['docs', 'web']
+
+    def test_unmatched(self, repo):
+        """Everything is affected if any file doesn't match."""
+        assert self.affected(repo('docs/index.rst', 'setup.py')) is None
+
+    def test_empty_commit(self, repo):
+        """Everything is affected if no file changed."""
+        assert self.affected(repo()) is None
+
+    def test_bad_range(self, repo, monkeypatch, capsys):
+        """Everything is affected if the changes can't be found."""
+        ini = repo('docs/index.rst')
+        monkeypatch.setenv('TRAVIS_COMMIT_RANGE', 'nope...nada')
+        assert self.affected(ini) is None
+        out, err = capsys.readouterr()
+        assert 'Unable to find the files changed in nope...nada' in err
+
+    def test_detect_envlist(self, repo, tmpdir, monkeypatch):
+        """Only run the affected envs that match."""
+        repo('src/core/models.py')
+        monkeypatch.setenv('TRAVIS', 'true')
+        monkeypatch.setenv('TRAVIS_PYTHON_VERSION', '3.7')
+        with tmpdir.as_cwd():
+            assert TestToxEnv().tox_envs() == ['py37-core']
+
+
+class TestAllInterpreters:
+    """Test selecting the envs of all the installed interpreters."""
+
+    ini = (
+        '[tox]\n'
+        'envlist = py{27,36,37,38}, pypy3, docs\n'
+        '\n'
+        '[travis]\n'
+        'interpreters = auto\n'
+        'python =\n'
+        '    3.7: py37, docs\n'
+    )
+
+    @pytest.fixture
+    def versions(self, mocker):
+        """Pretend some Python versions are installed."""
+        return mocker.patch('tox_travis.envlist.find_python_versions',
+                            return_value=['2.7', '3.7', 'pypy3'])
+
+    def test_all(self, versions):
+        """The envs of every installed interpreter are selected."""
+        ini = IniFile('tox.ini', self.ini)
+        environ = {'TRAVIS_PYTHON_VERSION': '3.7'}
+        assert detect_envlist(ini, environ) == [
+            'py27', 'py37', 'pypy3', 'docs']
+
+    def test_other_factors(self, versions):
+        """The other factors still apply to the envs of all interpreters."""
+        ini = IniFile('tox.ini', self.ini + 'os =\n    osx: py27, py38\n')
+        environ = {'TRAVIS_PYTHON_VERSION': '3.7', 'TRAVIS_OS_NAME': 'osx'}
+        assert detect_envlist(ini, environ) == ['py27']
+
+    def test_not_enabled(self, versions):
+        """Only the envs of the Travis Python version are selected."""
+        ini = IniFile('tox.ini', self.ini.replace('auto', 'travis'))
+        environ = {'TRAVIS_PYTHON_VERSION': '3.7'}
+        assert detect_envlist(ini, environ) == ['py37', 'docs']
+        assert not versions.called
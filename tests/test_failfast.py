@@ -0,0 +1,201 @@
+"""Test running the envs most likely to fail first, and stopping early."""
+import json
+
+import py
+import pytest
+
+from tox_travis.failfast import (
+    STOPPED,
+    STATS_NAME,
+    load_stats,
+    order_envs,
+    record,
+    run_envs,
+    save_stats,
+)
+from tox_travis.testing import make_config
+
+ini = """
+[tox]
+envlist = py37, lint, docs, slow
+
+[testenv:docs]
+ignore_outcome = True
+
+[travis]
+python = 3.7: py37, lint, docs, slow
+fail_fast = True
+"""
+
+
+def make_venvs(mocker, config, **statuses):
+    """Make the envs of a job, that end with the given statuses.
+
+    An env given a list of statuses ends with the next one at each run.
+    """
+    venv_dict = {}
+    for name in ('py37', 'lint', 'docs', 'slow'):
+        venv_dict[name] = mocker.Mock(status=0, envconfig=mocker.Mock(
+            ignore_outcome=name == 'docs'))
+        venv_dict[name].name = name
+
+    def run_sequential(config, venv_dict):
+        for venv in venv_dict.values():
+            status = statuses.get(venv.name, 0)
+            venv.status = status.pop(0) if isinstance(status, list) \
+                else status
+
+    run_sequential = mocker.Mock(side_effect=run_sequential)
+    return venv_dict, run_sequential
+
+
+@pytest.fixture
+def config(mocker, tmpdir):
+    """Make the config of a job with fail_fast."""
+    config = mocker.Mock()
+    config._cfg = py.iniconfig.IniConfig('', data=ini)
+    config.toxworkdir = tmpdir.join('.tox')
+    config.option.skip_missing_interpreters = 'false'
+    return config
+
+
+class TestOrderEnvs:
+    """Test ordering the envs from their history."""
+
+    def test_history(self, tmpdir):
+        """Envs that fail the most for their duration run first."""
+        tmpdir.join('.tox', STATS_NAME).write(json.dumps({
+            'py37': {'runs': 10, 'failures': 0, 'duration': 60},
+            'lint': {'runs': 10, 'failures': 1, 'duration': 5},
+            'docs': {'runs': 10, 'failures': 9, 'duration': 1},
+            'slow': {'runs': 10, 'failures': 2, 'duration': 600},
+        }), ensure=True)
+        config = make_config(ini, {'TRAVIS_PYTHON_VERSION': '3.7'},
+                             toxinidir=tmpdir)
+        assert config.envlist == ['lint', 'py37', 'slow', 'docs']
+
+    def test_no_history(self, tmpdir):
+        """Without history, the envs keep their order."""
+        config = make_config(ini, {'TRAVIS_PYTHON_VERSION': '3.7'},
+                             toxinidir=tmpdir)
+        assert config.envlist == ['py37', 'lint', 'slow', 'docs']
+
+    def test_unknown_env(self, mocker):
+        """Envs without history are assumed to often fail."""
+        config = mocker.Mock(envconfigs={})
+        stats = {'py37': {'runs': 5, 'failures': 0, 'duration': 10}}
+        assert order_envs(config, ['py37', 'new'], stats) == ['new', 'py37']
+
+    def test_disabled(self, tmpdir):
+        """The envs aren't reordered without fail_fast."""
+        tmpdir.join('.tox', STATS_NAME).write(json.dumps({
+            'slow': {'runs': 10, 'failures': 9, 'duration': 1},
+        }), ensure=True)
+        config = make_config(ini.replace('True\n', 'False\n'),
+                             {'TRAVIS_PYTHON_VERSION': '3.7'},
+                             toxinidir=tmpdir)
+        assert config.envlist == ['py37', 'lint', 'docs', 'slow']
+
+    def test_record(self):
+        """The history decays, so recent runs count the most."""
+        stats = {}
+        record(stats, 'py37', 10, True)
+        assert stats == {'py37': {'runs': 1, 'failures': 1, 'duration': 10}}
+        record(stats, 'py37', 20, False)
+        assert stats['py37']['runs'] == pytest.approx(1.7)
+        assert stats['py37']['failures'] == pytest.approx(0.7)
+        assert stats['py37']['duration'] == pytest.approx(13)
+
+    def test_save_parallel(self, tmpdir):
+        """Each process only saves the envs it ran, keeping the others."""
+        path = str(tmpdir.join(STATS_NAME))
+        save_stats(path, {'py37': {'runs': 1}, 'lint': {'runs': 1}},
+                   ['py37', 'lint'])
+        # Two parallel children, which both read the history first
+        first, second = load_stats(path), load_stats(path)
+        record(first, 'py37', 10, True)
+        record(second, 'lint', 5, False)
+        save_stats(path, first, ['py37'])
+        save_stats(path, second, ['lint'])
+
+        stats = load_stats(path)
+        assert stats['py37']['failures'] == 1
+        assert stats['lint']['runs'] == pytest.approx(1.7)
+
+
+class TestRunEnvs:
+    """Test stopping at the first required failure."""
+
+    def test_stop(self, mocker, config, capsys):
+        """The envs after a required failure don't run."""
+        venv_dict, run_sequential = make_venvs(
+            mocker, config, lint='commands failed')
+        run_envs(config, venv_dict, run_sequential)
+
+        assert run_sequential.call_count == 2
+        assert venv_dict['docs'].status == STOPPED
+        assert venv_dict['slow'].status == STOPPED
+        assert 'Not running docs, slow after lint failed.' in \
+            capsys.readouterr().err
+        stats = load_stats(str(config.toxworkdir.join(STATS_NAME)))
+        assert sorted(stats) == ['lint', 'py37']
+        assert stats['lint']['failures'] == 1
+
+    def test_ignored_outcome(self, mocker, config):
+        """Envs whose outcome is ignored don't stop the job."""
+        venv_dict, run_sequential = make_venvs(
+            mocker, config, docs='ignored failed command')
+        run_envs(config, venv_dict, run_sequential)
+        assert run_sequential.call_count == 4
+        assert venv_dict['slow'].status == 0
+
+    def test_skipped(self, mocker, config):
+        """Skipped envs neither stop the job, nor are recorded."""
+        venv_dict, run_sequential = make_venvs(
+            mocker, config, py37='platform mismatch')
+        run_envs(config, venv_dict, run_sequential)
+        assert run_sequential.call_count == 4
+        stats = load_stats(str(config.toxworkdir.join(STATS_NAME)))
+        assert 'py37' not in stats
+
+    def test_retried(self, mocker, config, capsys):
+        """A failed env that passes when retried doesn't stop the job."""
+        config._cfg = py.iniconfig.IniConfig(
+            '', data=ini + 'retries = 2\n')
+        venv_dict, run_sequential = make_venvs(
+            mocker, config, lint=['commands failed', 0],
+            slow='commands failed')
+        run_envs(config, venv_dict, run_sequential)
+
+        assert [list(call[0][1]) for call in run_sequential.call_args_list] \
+            == [['py37'], ['lint'], ['lint'], ['docs'],
+                ['slow'], ['slow'], ['slow']]
+        assert venv_dict['lint'].status == 0
+        assert venv_dict['docs'].status == 0
+        assert venv_dict['slow'].status == 'commands failed'
+        err = capsys.readouterr().err
+        assert 'lint succeeded after 1 retry.' in err
+        assert 'slow failed after 2 retries.' in err
+        stats = load_stats(str(config.toxworkdir.join(STATS_NAME)))
+        assert stats['lint']['failures'] == 0
+
+    def test_retries_used_up(self, mocker, config, capsys):
+        """The job stops once an env failed all its retries."""
+        config._cfg = py.iniconfig.IniConfig(
+            '', data=ini + 'retries = 1\n')
+        venv_dict, run_sequential = make_venvs(
+            mocker, config, lint='commands failed')
+        run_envs(config, venv_dict, run_sequential)
+        assert run_sequential.call_count == 3
+        assert venv_dict['docs'].status == STOPPED
+        assert 'Not running docs, slow after lint failed.' in \
+            capsys.readouterr().err
+
+    def test_disabled(self, mocker, config):
+        """Without fail_fast, the envs run as usual."""
+        config._cfg = py.iniconfig.IniConfig('', data='[tox]\n')
+        venv_dict, run_sequential = make_venvs(
+            mocker, config, py37='commands failed')
+        run_envs(config, venv_dict, run_sequential)
+        run_sequential.assert_called_once_with(config, venv_dict)
+        assert not config.toxworkdir.check()
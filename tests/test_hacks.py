@@ -1,4 +1,10 @@
+import sys
+
+import pytest
+import tox.interpreters
+
 from tox_travis.hacks import subcommand_test_monkeypatch
+from tox_travis.testing import make_config
 
 
 class TestSessionSubcommandTest:
@@ -22,3 +28,135 @@ class TestSessionSubcommandTest:
         assert real_subcommand_test(session) == 42
         subcommand_test.assert_called_once_with(session)
         tox_subcommand_test_post.assert_called_once_with(session.config)
+
+
+class TestInterpreters:
+    """Test reusing the interpreters found by Tox-Travis."""
+
+    def test_interpreters(self, mocker):
+        """Tox should get the executables and info without probing."""
+        from tox_travis.hacks import interpreters_monkeypatch
+        cache = mocker.patch('tox_travis.hacks._python_info_cache', {})
+        config = mocker.Mock()
+        config.interpreters.name2executable = {}
+        config.interpreters.executable2info = {}
+        config.envconfigs = {
+            'py37': mocker.Mock(basepython='python3.7'),
+            'py36': mocker.Mock(basepython='python3.6'),
+        }
+        info = {
+            'executable': '/usr/bin/python3.7',
+            'implementation': 'CPython',
+            'version_info': [3, 7, 4, 'final', 0],
+            'version': '3.7.4',
+            'is_64': True,
+            'sysplatform': 'linux',
+            'os_sep': '/',
+            'extra_version_info': None,
+        }
+
+        interpreters_monkeypatch(config, {'py37': info, 'py36': None})
+
+        assert config.interpreters.name2executable == {
+            'py37': '/usr/bin/python3.7',
+            'python3.7': '/usr/bin/python3.7',
+        }
+        assert cache == {'/usr/bin/python3.7': info}
+        interpreter_info = config.interpreters.executable2info[
+            '/usr/bin/python3.7']
+        assert interpreter_info.version_info == (3, 7, 4, 'final', 0)
+        assert interpreter_info.implementation == 'CPython'
+
+    def test_not_probed_by_tox(self, mocker):
+        """Tox gets the info of the interpreters without running them."""
+        config = make_config("""
+            [tox]
+            envlist = py
+            skipsdist = True
+
+            [testenv]
+            basepython = {0}
+
+            [travis]
+            python = 3.7: py
+        """.format(sys.executable), environ={'TRAVIS_PYTHON_VERSION': '3.7'})
+        probe = mocker.spy(tox.interpreters, 'run_and_get_interpreter_info')
+
+        info = config.interpreters.get_info(config.envconfigs['py'])
+
+        assert not probe.called
+        assert info.executable == sys.executable
+        assert info.version_info == tuple(sys.version_info)
+
+
+class TestParallel:
+    """Test running the envs in parallel."""
+
+    def test_parallel(self, mocker):
+        """The envs run in parallel by default."""
+        from tox_travis.hacks import parallel_monkeypatch
+        mocker.patch('tox_travis.hacks.auto_detect_cpus', return_value=4)
+        config = mocker.Mock(args=['-e', 'py37', '--', '-p', '0'])
+        config.option.parallel = 0
+        parallel_monkeypatch(config)
+        assert config.option.parallel == 4
+
+    @pytest.mark.parametrize('args,parallel', [
+        (['-p', '2'], 2),
+        (['--parallel=2'], 2),
+        (['-p', '0'], 0),
+        (['-p0'], 0),
+        (['--parallel', '0', '-e', 'py37'], 0),
+    ])
+    def test_parallel_given(self, mocker, args, parallel):
+        """The parallel option given to tox is kept, even when off."""
+        from tox_travis.hacks import parallel_monkeypatch
+        mocker.patch('tox_travis.hacks.auto_detect_cpus', return_value=4)
+        config = mocker.Mock(args=args)
+        config.option.parallel = parallel
+        parallel_monkeypatch(config)
+        assert config.option.parallel == parallel
+
+
+class TestSessionSummary:
+    """Test the hook called before the summary."""
+
+    def test_summary_pre_hook(self, mocker):
+        """The hook runs before the real summary, which gives the retcode."""
+        from tox_travis.hacks import summary_monkeypatch
+        calls = []
+        mocker.patch('tox.session.Session._summary',
+                     side_effect=lambda *args: calls.append('summary') or 1)
+        summary_monkeypatch(lambda session: calls.append('pre'))
+
+        import tox.session
+        session = mocker.Mock()
+        real_summary = tox.session.Session._summary
+        real_summary = getattr(real_summary, '__func__', real_summary)
+
+        assert real_summary(session) == 1
+        assert calls == ['pre', 'summary']
+
+
+class TestSequential:
+    """Test running the envs one by one through a hook."""
+
+    def test_sequential_hook(self, mocker):
+        """The hook is given the real function that runs the envs."""
+        from tox_travis.hacks import sequential_monkeypatch
+        real_run_sequential = mocker.patch('tox.session.run_sequential')
+        run_envs = mocker.Mock()
+        assert sequential_monkeypatch(run_envs)
+        assert sequential_monkeypatch(run_envs)  # Only patched once
+
+        import tox.session
+        tox.session.run_sequential('config', {})
+        run_envs.assert_called_once_with('config', {}, real_run_sequential)
+
+    def test_old_tox(self, mocker):
+        """Tox before 3.7 can't be patched."""
+        from tox_travis.hacks import sequential_monkeypatch
+        import tox.session
+        mocker.patch.object(tox.session, 'run_sequential', None)
+        assert not sequential_monkeypatch(mocker.Mock())
+        assert tox.session.run_sequential is None
@@ -1,7 +1,19 @@
-from tox_travis.hooks import tox_subcommand_test_post
+import json
+import os
+
+import pytest
+
+from tox_travis.hooks import tox_configure, tox_subcommand_test_post
 
 
 class TestToxSubcommandTestPost:
+    @pytest.fixture(autouse=True)
+    def dedupe_store(self, mocker):
+        """Keep out of the tox config, without deduplicating by default."""
+        mocker.patch('tox_travis.hooks.get_clean_cache', return_value=False)
+        return mocker.patch('tox_travis.hooks.get_dedupe_store',
+                            return_value=None)
+
     def test_tox_subcommand_test_post_enabled(self, mocker):
         travis_after = mocker.patch('tox_travis.hooks.travis_after')
         config = mocker.Mock()
@@ -15,3 +27,85 @@ class TestToxSubcommandTestPost:
         config.option.travis_after = False
         tox_subcommand_test_post(config)
         assert not travis_after.called
+
+    def test_tox_subcommand_test_post_parallel_child(self, mocker,
+                                                     monkeypatch):
+        """Parallel children don't wait, only their parent does."""
+        travis_after = mocker.patch('tox_travis.hooks.travis_after')
+        monkeypatch.setenv('_TOX_PARALLEL_ENV', 'py37')
+        config = mocker.Mock()
+        config.option.travis_after = True
+        tox_subcommand_test_post(config)
+        assert not travis_after.called
+
+    def test_tox_subcommand_test_post_dedupe(self, mocker, dedupe_store):
+        """The envs are deduplicated when a store is configured."""
+        dedupe_envs = mocker.patch('tox_travis.hooks.dedupe_envs')
+        dedupe_store.return_value = '/store'
+        config = mocker.Mock()
+        config.option.travis_after = False
+        tox_subcommand_test_post(config)
+        dedupe_envs.assert_called_once_with(config, config.envlist, '/store')
+
+
+class TestToxConfigureParallel:
+    """Test passing the resolved envlist to parallel children."""
+
+    @pytest.fixture
+    def config(self, mocker, monkeypatch):
+        """Make a config for a Travis job, and keep out of the tox config."""
+        monkeypatch.setenv('TRAVIS', 'true')
+        monkeypatch.delenv('TOXENV', raising=False)
+        monkeypatch.setenv('TOX_TRAVIS_RESOLVED_ENVLIST', '')
+        mocker.patch('tox_travis.hooks.get_wheelhouse', return_value=None)
+        mocker.patch('tox_travis.hooks.get_fail_fast', return_value=False)
+        mocker.patch('tox_travis.hooks.load_env_providers', return_value=[])
+        mocker.patch('tox_travis.hooks.override_ignore_outcome',
+                     return_value=False)
+        config = mocker.Mock()
+        config.envconfigs = {'py37': mocker.Mock()}
+        config.option.env = None
+        config.option.listenvs = True
+        config.option.travis_after = False
+        return config
+
+    def test_parent(self, mocker, config):
+        """The parent passes the envs it resolved to its children."""
+        mocker.patch('tox_travis.hooks.detect_envlist',
+                     return_value=['py37', 'py37-extra'])
+        autogen = mocker.patch('tox_travis.hooks.autogen_envconfigs')
+        tox_configure(config)
+
+        assert config.envlist == ['py37', 'py37-extra']
+        autogen.assert_called_once_with(config, {'py37-extra'})
+        assert json.loads(os.environ['TOX_TRAVIS_RESOLVED_ENVLIST']) == {
+            'envlist': ['py37', 'py37-extra'],
+            'autogen': ['py37-extra'],
+        }
+
+    def test_child(self, mocker, monkeypatch, config):
+        """A child doesn't detect the envlist again."""
+        detect_envlist = mocker.patch('tox_travis.hooks.detect_envlist')
+        autogen = mocker.patch('tox_travis.hooks.autogen_envconfigs')
+        monkeypatch.setenv('_TOX_PARALLEL_ENV', 'py37-extra')
+        monkeypatch.setenv('TOX_TRAVIS_RESOLVED_ENVLIST', json.dumps({
+            'envlist': ['py37', 'py37-extra'],
+            'autogen': ['py37-extra'],
+        }))
+        envlist = config.envlist
+        tox_configure(config)
+
+        assert not detect_envlist.called
+        assert config.envlist is envlist
+        autogen.assert_called_once_with(config, ['py37-extra'])
+
+    def test_child_declared(self, mocker, monkeypatch, config):
+        """A child of a declared env has nothing to generate."""
+        autogen = mocker.patch('tox_travis.hooks.autogen_envconfigs')
+        monkeypatch.setenv('_TOX_PARALLEL_ENV', 'py37')
+        monkeypatch.setenv('TOX_TRAVIS_RESOLVED_ENVLIST', json.dumps({
+            'envlist': ['py37', 'py37-extra'],
+            'autogen': ['py37-extra'],
+        }))
+        tox_configure(config)
+        assert not autogen.called
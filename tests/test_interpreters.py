@@ -0,0 +1,209 @@
+"""Test the interpreter discovery of Tox-Travis."""
+import sys
+
+import pytest
+
+from tox_travis.interpreters import (
+    find_interpreters,
+    report_missing_interpreters,
+    get_candidates,
+    satisfies,
+    probe_interpreters,
+    find_python_versions,
+    find_executable,
+)
+
+CURRENT = 'python{0}.{1}'.format(*sys.version_info[:2])
+
+
+@pytest.fixture
+def path(tmpdir, monkeypatch):
+    """Only provide the current interpreter as ``python`` in the PATH."""
+    bindir = tmpdir.ensure('bin', dir=True)
+    bindir.join('python').mksymlinkto(sys.executable)
+    monkeypatch.setenv('PATH', str(bindir))
+    return bindir
+
+
+def make_config(mocker, **basepythons):
+    """Make a config with envs using the given basepythons."""
+    config = mocker.Mock()
+    config.envconfigs = {}
+    for envname, basepython in basepythons.items():
+        config.envconfigs[envname] = mocker.Mock(basepython=basepython)
+    return config
+
+
+class TestFindInterpreters:
+    """Test finding the interpreters of the envs."""
+
+    def test_fallback_to_python(self, mocker, path):
+        """The python of the virtualenv is used when it satisfies."""
+        config = make_config(mocker, current=CURRENT, pypy3='pypy3')
+        interpreters = find_interpreters(config, ['current', 'pypy3'])
+        assert interpreters['current']['version_info'][:2] == list(
+            sys.version_info[:2])
+        assert interpreters['pypy3'] is None
+
+    def test_undeclared_envs(self, mocker, path):
+        """Envs that aren't configured are ignored."""
+        config = make_config(mocker, current=CURRENT)
+        assert list(find_interpreters(config, ['current', 'nope'])) == [
+            'current']
+
+    def test_report_missing(self, mocker, capsys):
+        """Envs without an interpreter are reported."""
+        config = make_config(mocker, py37='python3.7', py36='python3.6')
+        report_missing_interpreters(config, {'py37': {}, 'py36': None})
+        out, err = capsys.readouterr()
+        assert err == 'No interpreter found for the envs: py36 (python3.6)\n'
+
+
+class TestFindPythonVersions:
+    """Test finding all the installed Python versions."""
+
+    def test_versions(self, path, tmpdir):
+        """Only the versioned interpreters that run are found."""
+        path.join(CURRENT).mksymlinkto(sys.executable)
+        path.join('python3').mksymlinkto(sys.executable)
+        path.join('python3.0').write('#!/bin/sh\nexit 1\n')
+        path.join('python3.0').chmod(0o755)
+        path.join('python3.1').write('Not executable')
+        assert find_python_versions({'PATH': str(path)}) == [
+            '{0}.{1}'.format(*sys.version_info[:2])]
+
+    def test_travis_dirs(self, mocker, path, tmpdir):
+        """The interpreters installed by Travis are found."""
+        travis = tmpdir.ensure('opt', 'python', '3.7', 'bin', dir=True)
+        travis.join(CURRENT).mksymlinkto(sys.executable)
+        mocker.patch('tox_travis.interpreters.TRAVIS_PYTHON_DIRS',
+                     str(tmpdir.join('opt', 'python', '*', 'bin')))
+        assert find_python_versions({'PATH': ''}) == [
+            '{0}.{1}'.format(*sys.version_info[:2])]
+
+
+class TestFindExecutable:
+    """Test finding interpreters by name."""
+
+    def test_path_first(self, mocker, path, tmpdir):
+        """The interpreters in the PATH come first."""
+        travis = tmpdir.ensure('opt', 'python', '3.7', 'bin', dir=True)
+        travis.join('python').mksymlinkto(sys.executable)
+        mocker.patch('tox_travis.interpreters.TRAVIS_PYTHON_DIRS',
+                     str(tmpdir.join('opt', 'python', '*', 'bin')))
+        assert find_executable('python') == str(path.join('python'))
+
+    def test_travis_dirs(self, mocker, path, tmpdir):
+        """The interpreters installed by Travis are found outside the PATH."""
+        travis = tmpdir.ensure('opt', 'python', '3.7', 'bin', dir=True)
+        travis.join(CURRENT).mksymlinkto(sys.executable)
+        mocker.patch('tox_travis.interpreters.TRAVIS_PYTHON_DIRS',
+                     str(tmpdir.join('opt', 'python', '*', 'bin')))
+        assert find_executable(CURRENT) == str(travis.join(CURRENT))
+        assert find_executable('python3.0') is None
+
+    def test_found_versions(self, mocker, path, tmpdir):
+        """The envs of the versions found can use their interpreter."""
+        travis = tmpdir.ensure('opt', 'python', '3.7', 'bin', dir=True)
+        travis.join(CURRENT).mksymlinkto(sys.executable)
+        mocker.patch('tox_travis.interpreters.TRAVIS_PYTHON_DIRS',
+                     str(tmpdir.join('opt', 'python', '*', 'bin')))
+        path.remove()
+        assert find_python_versions() == [
+            '{0}.{1}'.format(*sys.version_info[:2])]
+
+        config = make_config(mocker, py=CURRENT)
+        info = find_interpreters(config, ['py'])['py']
+        assert info['executable'] == str(travis.join(CURRENT))
+
+
+class TestCandidates:
+    """Test the interpreters that may provide a basepython."""
+
+    @pytest.mark.parametrize('basepython,candidates', [
+        ('python3.7', ['python3.7', 'python']),
+        ('python', ['python']),
+        ('pypy3', ['pypy3', 'pypy', 'python']),
+        ('jython', ['jython', 'python']),
+        ('/usr/bin/python3', ['/usr/bin/python3']),
+        ('ipy', ['ipy']),
+    ])
+    def test_candidates(self, basepython, candidates):
+        """Generic names are tried after the basepython."""
+        assert get_candidates(basepython) == candidates
+
+    @pytest.mark.parametrize('basepython,expected', [
+        ('python', True),
+        ('python3', True),
+        ('python3.7', True),
+        ('python3.7-64', True),
+        ('python3.7-32', False),
+        ('python3.6', False),
+        ('python2', False),
+        ('pypy3', False),
+        ('/usr/bin/python3', True),
+    ])
+    def test_satisfies(self, basepython, expected):
+        """The implementation and version must be the required ones."""
+        info = {
+            'implementation': 'CPython',
+            'version_info': [3, 7, 4, 'final', 0],
+            'is_64': True,
+        }
+        assert satisfies(info, basepython) is expected
+
+    def test_satisfies_pypy(self):
+        """PyPy provides the pypy basepythons."""
+        info = {
+            'implementation': 'PyPy',
+            'version_info': [3, 6, 9, 'final', 0],
+            'is_64': True,
+        }
+        assert satisfies(info, 'pypy3')
+        assert not satisfies(info, 'python3.6')
+
+
+class TestProbeInterpreters:
+    """Test probing and caching the info of interpreters."""
+
+    def test_probe(self, path):
+        """The info of the interpreter is the same as Tox gets."""
+        python = str(path.join('python'))
+        info = probe_interpreters([python])[python]
+        assert info['executable'] == python
+        assert info['version_info'] == list(sys.version_info)
+        assert info['version'] == sys.version
+        assert set(info) == {
+            'executable', 'implementation', 'version_info', 'version',
+            'is_64', 'sysplatform', 'os_sep', 'extra_version_info'}
+
+    def test_cached(self, mocker, tmpdir):
+        """Interpreters are only probed again when they change."""
+        python = tmpdir.join('python')
+        python.write('#!/bin/sh\nexec {0} "$@"\n'.format(sys.executable))
+        python.chmod(0o755)
+        first = probe_interpreters([str(python)])
+
+        probe = mocker.patch('tox_travis.interpreters.probe_interpreter',
+                             return_value=first[str(python)])
+        assert probe_interpreters([str(python)]) == first
+        assert not probe.called
+
+        python.setmtime(python.mtime() + 1)
+        probe_interpreters([str(python)])
+        probe.assert_called_once_with(str(python))
+
+    def test_broken(self, tmpdir):
+        """Interpreters that fail to run have no info."""
+        broken = tmpdir.join('python')
+        broken.write('#!/bin/sh\nexit 1\n')
+        broken.chmod(0o755)
+        assert probe_interpreters([str(broken)]) == {str(broken): None}
+
+    def test_unwritable_cache(self, path, monkeypatch, tmpdir):
+        """Interpreters are still probed when the cache can't be written."""
+        tmpdir.join('file').write('')
+        monkeypatch.setenv('TOX_TRAVIS_CACHE_DIR', str(tmpdir.join('file')))
+        python = str(path.join('python'))
+        info = probe_interpreters([python])[python]
+        assert info['version_info'] == list(sys.version_info)
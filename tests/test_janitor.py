@@ -0,0 +1,90 @@
+"""Test cleaning the tox work dir for the Travis cache."""
+import json
+import os
+
+import py
+
+from tox_travis.janitor import get_clean_cache, clean_workdir, update_manifest
+
+
+class TestCleanWorkdir:
+    """Test removing what the cache doesn't need."""
+
+    def config(self, mocker, tmpdir, envnames):
+        """Make a config with a work dir holding the given envs."""
+        config = mocker.Mock()
+        config._cfg = py.iniconfig.IniConfig(
+            '', data='[travis]\nclean_cache = true\n')
+        config.toxworkdir = tmpdir.join('.tox')
+        config.envconfigs = {}
+        for envname in envnames:
+            envdir = config.toxworkdir.join(envname)
+            envdir.join('.tox-config1').write('config', ensure=True)
+            site_packages = envdir.join('lib', 'python3.7', 'site-packages')
+            site_packages.join('six.py').write('six' * 100, ensure=True)
+            site_packages.join('six.pyc').write('pyc', ensure=True)
+            site_packages.join('__pycache__', 'six.cpython-37.pyc').write(
+                'pyc', ensure=True)
+            envdir.join('log', 'py37-1.log').write('log', ensure=True)
+            envdir.join('tmp', 'file').write('tmp', ensure=True)
+            config.envconfigs[envname] = mocker.Mock(envdir=envdir)
+        config.toxworkdir.join('log', 'result.log').write('log', ensure=True)
+        config.toxworkdir.join('dist', 'pkg-1.0.zip').write('z', ensure=True)
+        config.toxworkdir.join('wheelhouse', 'six.whl').write(
+            'whl', ensure=True)
+        return config
+
+    def test_enabled(self, mocker, tmpdir):
+        """Cleaning is enabled in the [travis] section."""
+        config = self.config(mocker, tmpdir, [])
+        assert get_clean_cache(config)
+
+    def test_clean(self, mocker, tmpdir, capsys):
+        """Unused envs and reproducible files are removed."""
+        config = self.config(mocker, tmpdir, ['py37', 'py36', 'docs'])
+        clean_workdir(config, ['py37', 'docs'])
+
+        workdir = config.toxworkdir
+        assert sorted(path.basename for path in workdir.listdir()) == [
+            'docs', 'py37', 'wheelhouse']
+        files = sorted(
+            path.relto(workdir.join('py37'))
+            for path in workdir.join('py37').visit() if path.isfile())
+        assert files == [
+            '.tox-config1', os.path.join(
+                'lib', 'python3.7', 'site-packages', 'six.py')]
+
+        out, err = capsys.readouterr()
+        assert 'Cleaned 346 bytes from {0}'.format(workdir) in err
+
+
+class TestUpdateManifest:
+    """Test keeping the work dir stable between builds."""
+
+    def test_manifest(self, tmpdir, capsys):
+        """The files are recorded, and changes are counted."""
+        tmpdir.join('py37', 'six.py').write('six', ensure=True)
+        tmpdir.join('py37', 'attr.py').write('attr', ensure=True)
+        assert update_manifest(str(tmpdir)) == 2
+        manifest = json.loads(tmpdir.join('.tox-travis-manifest.json').read())
+        assert sorted(manifest) == [
+            os.path.join('py37', 'attr.py'), os.path.join('py37', 'six.py')]
+
+        assert update_manifest(str(tmpdir)) == 0
+        tmpdir.join('py37', 'six.py').write('six 2')
+        assert update_manifest(str(tmpdir)) == 1
+        out, err = capsys.readouterr()
+        assert '1 files changed in {0} since the last build.'.format(
+            tmpdir) in err
+
+    def test_rewritten(self, tmpdir):
+        """Files rewritten with the same content get their mtime back."""
+        six = tmpdir.join('py37', 'six.py')
+        six.write('six', ensure=True)
+        six.setmtime(1000000000)
+        update_manifest(str(tmpdir))
+
+        six.write('six')
+        assert six.mtime() != 1000000000
+        assert update_manifest(str(tmpdir)) == 0
+        assert six.mtime() == 1000000000
@@ -0,0 +1,74 @@
+"""Test parsing parts of JSON documents from a stream."""
+import io
+import json
+
+import pytest
+
+from tox_travis.jsonstream import load
+
+
+document = {
+    'build': {'id': 7, 'job_ids': [1, 2], 'config': {'os': ['linux']}},
+    'jobs': [
+        {'id': 1, 'number': '7.1', 'allow_failure': False,
+         'finished_at': None, 'state': 'started',
+         'config': {'script': 'echo "}]["', 'env': ['A=1', 'B=\\\\"2']}},
+        {'id': 2, 'number': '7.2', 'allow_failure': True,
+         'finished_at': '2019-07-01T21:18:27Z', 'state': 'failed',
+         'config': {'script': u'café ☃', 'sudo': None}},
+    ],
+    'numbers': [0, -1, 2.5, 1e10, -3.25E-2, True, False, None],
+    'empty': [{}, [], ''],
+}
+
+
+def stream(value, **kwargs):
+    """Make a stream of the JSON for the value."""
+    return io.BytesIO(json.dumps(value, **kwargs).encode('utf-8'))
+
+
+class TestLoad:
+    """Test the load function."""
+
+    @pytest.mark.parametrize('chunk_size', [1, 2, 3, 5, 64, 65536])
+    @pytest.mark.parametrize('kwargs', [{}, {'indent': 2}, {
+        'separators': (',', ':'), 'ensure_ascii': False}])
+    def test_whole(self, chunk_size, kwargs):
+        """Parse whole documents, however they are split into chunks."""
+        assert load(stream(document, **kwargs), True, chunk_size) == document
+
+    @pytest.mark.parametrize('chunk_size', [1, 2, 7, 65536])
+    def test_select(self, chunk_size):
+        """Only keep the selected parts of the document."""
+        spec = {
+            'build': {'job_ids': True},
+            'jobs': [{'number': True, 'state': True, 'missing': True}],
+            'empty': True,
+        }
+        assert load(stream(document), spec, chunk_size) == {
+            'build': {'job_ids': [1, 2]},
+            'jobs': [
+                {'number': '7.1', 'state': 'started'},
+                {'number': '7.2', 'state': 'failed'},
+            ],
+            'empty': [{}, [], ''],
+        }
+
+    def test_mismatched_shape(self):
+        """Keep scalars, and skip containers, that don't match the spec."""
+        value = {'a': None, 'b': [1, {'c': 2}], 'c': {'d': 1}}
+        spec = {'a': {'x': True}, 'b': {'x': True}, 'c': [True]}
+        assert load(stream(value), spec) == {'a': None, 'b': None, 'c': None}
+
+    def test_scalar(self):
+        """Parse a document that is only a scalar."""
+        assert load(io.BytesIO(b'42'), True, 1) == 42
+
+    @pytest.mark.parametrize('raw', [
+        b'{"a": 1', b'{"a" 1}', b'{"b": [1 2]}', b'{"a": "b',
+        b'{"a": [1, {"b"', b'{"a": nope}',
+    ])
+    def test_invalid(self, raw):
+        """Fail on documents that aren't valid JSON."""
+        with pytest.raises(ValueError):
+            load(io.BytesIO(raw), {'b': True}, 2)
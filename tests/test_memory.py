@@ -0,0 +1,57 @@
+"""Tests of the memory profiling."""
+import pytest
+
+from tox_travis.memory import (
+    get_top_sites,
+    profile,
+    tracemalloc,
+    DEFAULT_TOP_SITES,
+)
+
+needs_tracemalloc = pytest.mark.skipif(
+    tracemalloc is None, reason='tracemalloc is not available')
+
+
+class TestGetTopSites:
+    """Test reading the number of sites to report."""
+
+    def test_disabled(self):
+        assert get_top_sites({}) == 0
+        assert get_top_sites({'TOX_TRAVIS_PROFILE_MEMORY': ''}) == 0
+        assert get_top_sites({'TOX_TRAVIS_PROFILE_MEMORY': '0'}) == 0
+
+    def test_number(self):
+        assert get_top_sites({'TOX_TRAVIS_PROFILE_MEMORY': '3'}) == 3
+
+    def test_default(self):
+        assert get_top_sites({'TOX_TRAVIS_PROFILE_MEMORY': 'true'}) == \
+            DEFAULT_TOP_SITES
+
+
+class TestProfile:
+    """Test tracing the memory of a stage."""
+
+    def test_disabled(self, capsys):
+        """Nothing is traced or reported when not profiling."""
+        with profile('stage', environ={}) as usage:
+            pass
+        assert usage == {}
+        assert capsys.readouterr().err == ''
+
+    @needs_tracemalloc
+    def test_enabled(self, capsys):
+        """The memory of the stage and where it was allocated is reported."""
+        environ = {'TOX_TRAVIS_PROFILE_MEMORY': '2'}
+        with profile('stage', environ=environ) as usage:
+            kept = [bytearray(1024) for _ in range(100)]  # noqa
+            len(bytearray(1024 * 1024))  # Only at the peak
+
+        assert 100 * 1024 <= usage['allocated'] < 1024 * 1024
+        assert usage['peak'] >= 1024 * 1024
+        assert 1 <= len(usage['sites']) <= 2
+        assert usage['sites'][0].traceback[0].filename == __file__
+        assert not tracemalloc.is_tracing()
+
+        err = capsys.readouterr().err
+        assert err.startswith('Memory of stage: +')
+        assert __file__ in err
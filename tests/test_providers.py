@@ -0,0 +1,98 @@
+"""Test declaring envs from Python with env providers."""
+import pytest
+
+from tox_travis.envlist import detect_envlist
+from tox_travis.ini import IniFile
+from tox_travis.providers import (
+    get_provided_envs,
+    get_provider_names,
+    load_env_providers,
+)
+from tox_travis.testing import make_config
+
+ini = """
+[tox]
+envlist = docs
+
+[testenv]
+deps =
+    django111: Django>=1.11,<2.0
+    django22: Django>=2.2,<3.0
+
+[travis]
+python = 3.7: py37, docs
+env_providers = matrix
+
+[travis:env]
+DJANGO =
+    1.11: django111
+    2.2: django22
+"""
+
+provider = '''
+calls = []
+
+
+def provide_envs(desired_factors):
+    """Declare the envs of the desired Python versions only."""
+    calls.append(desired_factors)
+    pythons = [name for name in desired_factors[0] if name.startswith('py')]
+    for python in pythons:
+        for django in ('django111', 'django22', 'django30'):
+            yield '{0}-{1}'.format(python, django)
+'''
+
+
+@pytest.fixture
+def installed(tmpdir, monkeypatch):
+    """Install the provider as an entry point."""
+    tmpdir.join('matrix_provider.py').write(provider)
+    tmpdir.join('matrix_provider-1.0.dist-info', 'METADATA').write(
+        'Metadata-Version: 2.1\nName: matrix-provider\nVersion: 1.0\n',
+        ensure=True)
+    tmpdir.join('matrix_provider-1.0.dist-info', 'entry_points.txt').write(
+        '[tox_travis.env_providers]\n'
+        'matrix = matrix_provider:provide_envs\n')
+    monkeypatch.syspath_prepend(str(tmpdir))
+    import matrix_provider
+    del matrix_provider.calls[:]
+    return matrix_provider
+
+
+class TestProviders:
+    """Test loading the providers and asking them for envs."""
+
+    def test_names(self):
+        assert get_provider_names(IniFile('tox.ini', ini)) == ['matrix']
+        assert get_provider_names(IniFile('tox.ini', '[travis]\n')) == []
+
+    def test_not_installed(self):
+        with pytest.raises(ValueError) as error:
+            load_env_providers(IniFile('tox.ini', ini))
+        assert "No env provider named 'matrix'" in str(error.value)
+
+    def test_load(self, installed):
+        providers = load_env_providers(IniFile('tox.ini', ini))
+        assert providers == [installed.provide_envs]
+
+    def test_provided_once(self):
+        def provider(desired_factors):
+            return ['py37', 'docs', 'py37']
+        assert list(get_provided_envs([provider, provider], [])) == \
+            ['py37', 'docs']
+
+    def test_detect(self, installed):
+        """Only the desired factors are asked for, and then matched."""
+        envlist = detect_envlist(IniFile('tox.ini', ini), {
+            'TRAVIS_PYTHON_VERSION': '3.7', 'DJANGO': '2.2'})
+        assert envlist == ['py37-django22']
+        assert installed.calls == [[['py37', 'docs'], ['django22']]]
+
+    def test_configs(self, installed, tmpdir):
+        """The configs of the provided envs are made from [testenv]."""
+        config = make_config(ini, {
+            'TRAVIS_PYTHON_VERSION': '3.7', 'DJANGO': '1.11'},
+            args=['-l'], toxinidir=tmpdir.mkdir('project'))
+        assert config.envlist == ['py37-django111']
+        deps = config.envconfigs['py37-django111'].deps
+        assert [str(dep) for dep in deps] == ['Django>=1.11,<2.0']
@@ -0,0 +1,143 @@
+"""Test resolving the envlist without tox."""
+import subprocess
+import sys
+
+import py
+import pytest
+
+from tox_travis import resolve
+from tox_travis.envlist import detect_envlist
+from tox_travis.ini import IniFile
+from tox_travis.resolver import find_config, main
+
+from test_envlist import (
+    tox_ini,
+    tox_ini_override,
+    tox_ini_factors_override_nonenvlist,
+    tox_ini_travis_factors,
+    tox_ini_travis_env,
+    tox_ini_patterns,
+)
+
+environs = [
+    {},
+    {'TRAVIS_PYTHON_VERSION': '3.6'},
+    {'TRAVIS_PYTHON_VERSION': '3.7'},
+    {'TRAVIS_PYTHON_VERSION': 'pypy3'},
+    {'TRAVIS_PYTHON_VERSION': '3.6', 'TRAVIS_OS_NAME': 'osx'},
+    {'TRAVIS_PYTHON_VERSION': '3.7', 'DJANGO': '2.2'},
+]
+
+
+class TestResolve:
+    """Test resolving the same envlist as from within tox."""
+
+    @pytest.mark.parametrize('data', [
+        tox_ini,
+        tox_ini_override,
+        tox_ini_factors_override_nonenvlist,
+        tox_ini_travis_factors,
+        tox_ini_travis_env,
+        tox_ini_patterns,
+    ])
+    @pytest.mark.parametrize('environ', environs)
+    def test_like_tox(self, tmpdir, data, environ):
+        """The envlist should be the one detected from the tox config."""
+        environ = dict(environ, __TOX_TRAVIS_SYS_VERSION='CPython,3,7')
+        path = tmpdir.join('tox.ini')
+        path.write(data)
+        ini = py.iniconfig.IniConfig(str(path))
+        assert resolve(str(tmpdir), environ) == detect_envlist(ini, environ)
+
+    def test_without_tox(self, tmpdir):
+        """Tox should never be imported."""
+        tmpdir.join('tox.ini').write(tox_ini)
+        output = subprocess.check_output([
+            sys.executable, '-c',
+            'import sys, tox_travis; tox_travis.resolve(); '
+            'print(sorted(name for name in sys.modules '
+            'if name.split(".")[0] in ("tox", "py")))',
+        ], cwd=str(tmpdir))
+        assert output.strip() == b'[]'
+
+    def test_main(self, tmpdir, monkeypatch, capsys):
+        """The CLI prints the envs like tox -l."""
+        tmpdir.join('tox.ini').write(tox_ini)
+        monkeypatch.setenv('TRAVIS_PYTHON_VERSION', '3.6')
+        assert main(['-c', str(tmpdir.join('tox.ini'))]) == 0
+        out, err = capsys.readouterr()
+        assert out == 'py36\n'
+
+    def test_main_missing(self, tmpdir, capsys):
+        """The CLI fails when there is no tox config."""
+        assert main(['-c', str(tmpdir.join('nope'))]) == 1
+        out, err = capsys.readouterr()
+        assert err.startswith('ERROR: ')
+
+
+class TestFindConfig:
+    """Test finding the tox config like tox does."""
+
+    def test_parent(self, tmpdir):
+        """The config is found in the parent directories."""
+        tmpdir.join('tox.ini').write(tox_ini)
+        subdir = tmpdir.ensure('src', 'pkg', dir=True)
+        assert find_config(str(subdir)).path == str(tmpdir.join('tox.ini'))
+
+    def test_setup_cfg(self, tmpdir):
+        """A setup.cfg is only used with a tox:tox section."""
+        tmpdir.join('setup.cfg').write('[tox:tox]\nenvlist = py37\n')
+        tmpdir.ensure('src', 'setup.cfg').write('[metadata]\nname = a\n')
+        path = find_config(str(tmpdir.join('src'))).path
+        assert path == str(tmpdir.join('setup.cfg'))
+
+    def test_tox_ini_first(self, tmpdir):
+        """A tox.ini in a parent is used before setup.cfg."""
+        tmpdir.join('tox.ini').write(tox_ini)
+        tmpdir.ensure('src', 'setup.cfg').write('[tox:tox]\nenvlist = py\n')
+        path = find_config(str(tmpdir.join('src'))).path
+        assert path == str(tmpdir.join('tox.ini'))
+
+
+class TestIniFile:
+    """Test reading ini files like py.iniconfig."""
+
+    data = (
+        '# Comment\n'
+        '[tox]\n'
+        'envlist = py{36,37}, # Comment\n'
+        '  docs\n'
+        '; Comment\n'
+        '\n'
+        '    lint\n'
+        '[travis]  # Comment\n'
+        'python: 3.7: py37\n'
+        'os =\n'
+        '    linux: py36\n'
+        '    osx: py37\n'
+        '[testenv:docs]\n'
+        'commands = sphinx-build -W [docs] docs/_build\n'
+    )
+
+    def test_like_iniconfig(self):
+        """The sections and their lines are the same as iniconfig's."""
+        ini = IniFile('tox.ini', self.data)
+        expected = py.iniconfig.IniConfig('tox.ini', self.data)
+        assert ini.path == expected.path
+        assert ini.sections == expected.sections
+        for section in expected.sections:
+            assert ini.lineof(section) == expected.lineof(section)
+
+    @pytest.mark.parametrize('data', [
+        'envlist = py37\n',
+        '[tox]\n  py37\n',
+        '[tox]\nenvlist\n',
+        '[tox]\n[tox]\n',
+        '[tox]\na = 1\na = 2\n',
+    ])
+    def test_invalid(self, data):
+        """Invalid configs aren't read."""
+        with pytest.raises(ValueError):
+            IniFile('tox.ini', data)
+        with pytest.raises(py.iniconfig.ParseError):
+            py.iniconfig.IniConfig('tox.ini', data)
@@ -0,0 +1,157 @@
+"""Test retrying the failed envs of a Travis job."""
+import py
+import pytest
+from tox.exception import InterpreterNotFound, InvocationError
+
+from tox_travis.retry import get_retries, is_retryable, retry_envs
+
+
+def make_session(mocker, inistr, **statuses):
+    """Make a session with envs that ended with the given statuses."""
+    session = mocker.Mock()
+    session.config._cfg = py.iniconfig.IniConfig('', data=inistr)
+    session.venv_dict = {}
+    for name, status in sorted(statuses.items()):
+        session.venv_dict[name] = mocker.Mock(status=status)
+        session.venv_dict[name].name = name
+    return session
+
+
+class TestGetRetries:
+    """Test reading the retries from the config."""
+
+    def test_default(self, mocker):
+        """Envs aren't retried by default."""
+        session = make_session(mocker, '[tox]\nenvlist = py37\n')
+        assert get_retries(session.config) == (0, [])
+
+    def test_configured(self, mocker):
+        """The patterns are given one per line."""
+        session = make_session(mocker, (
+            '[travis]\n'
+            'retries = 2\n'
+            'retry_patterns =\n'
+            '    ConnectionError\n'
+            '    Read timed out\n'
+        ))
+        retries, patterns = get_retries(session.config)
+        assert retries == 2
+        assert [pattern.pattern for pattern in patterns] == [
+            'ConnectionError', 'Read timed out']
+
+
+class TestIsRetryable:
+    """Test deciding which failures to retry."""
+
+    @pytest.mark.parametrize('status', [
+        0,
+        'skipped tests',
+        'ignored failed command',
+        'platform mismatch',
+        InterpreterNotFound('python3.7'),
+    ])
+    def test_not_failed(self, mocker, status):
+        """Envs that didn't fail, or can't do better, aren't retried."""
+        assert not is_retryable(mocker.Mock(status=status), [])
+
+    def test_any_failure(self, mocker):
+        """Without patterns, every failure is retried."""
+        assert is_retryable(mocker.Mock(status='commands failed'), [])
+
+    @pytest.fixture
+    def patterns(self, mocker):
+        """Retry the failures of downloads that timed out."""
+        return get_retries(make_session(mocker, (
+            '[travis]\n'
+            'retry_patterns = Read timed out\n'
+        )).config)[1]
+
+    @pytest.fixture
+    def venv(self, mocker, tmpdir):
+        """An env that logs its setup like Tox."""
+        logdir = tmpdir.ensure('log', dir=True)
+        logdir.join('py37-0.log').write('created virtual environment\n')
+        logdir.join('py37-1.log').write(
+            'Collecting lxml\n'
+            'ReadTimeoutError: Read timed out.\n')
+        logdir.join('py37-1.log').setmtime(
+            logdir.join('py37-0.log').mtime())
+        return mocker.Mock(envconfig=mocker.Mock(envlogdir=logdir))
+
+    def test_patterns(self, venv, patterns):
+        """The patterns are searched in the log of the failed setup."""
+        venv.status = (
+            "could not install deps [lxml]; v = InvocationError("
+            "'.tox/py37/bin/python -m pip install lxml', 1)")
+        assert is_retryable(venv, patterns)
+
+    def test_other_failure(self, venv, patterns, tmpdir):
+        """Only the log of the last setup command is searched."""
+        tmpdir.join('log', 'py37-2.log').write('Successfully installed\n')
+        venv.status = 'could not install deps [lxml]'
+        assert not is_retryable(venv, patterns)
+
+    def test_commands_failed(self, venv, patterns):
+        """The setup logs are not searched when the commands failed."""
+        venv.status = 'commands failed'
+        assert not is_retryable(venv, patterns)
+
+    def test_no_log(self, mocker, tmpdir, patterns):
+        """The failure is still searched without any log."""
+        venv = mocker.Mock(envconfig=mocker.Mock(envlogdir=tmpdir))
+        venv.status = InvocationError('pip install lxml', 1, 'Read timed out')
+        assert is_retryable(venv, patterns)
+        venv.status = 'could not install deps [lxml]'
+        assert not is_retryable(venv, patterns)
+
+
+class TestRetryEnvs:
+    """Test running the failed envs again."""
+
+    def test_retry_until_success(self, mocker, capsys):
+        """Only the failed envs run again, until they succeed."""
+        session = make_session(
+            mocker, '[travis]\nretries = 3\n', py37='commands failed', docs=0)
+        outcomes = ['commands failed', 0]
+
+        def run_env(config, venv):
+            venv.status = outcomes.pop(0)
+        run_env = mocker.Mock(side_effect=run_env)
+
+        retry_envs(session, run_env)
+
+        py37 = session.venv_dict['py37']
+        assert run_env.call_args_list == [
+            mocker.call(session.config, py37)] * 2
+        assert py37.status == 0
+        out, err = capsys.readouterr()
+        assert 'Retrying py37 (1 of 3) after: commands failed' in err
+        assert 'py37 succeeded after 2 retries.' in err
+
+    def test_retries_used_up(self, mocker, capsys):
+        """The env still fails after all the retries."""
+        session = make_session(
+            mocker, '[travis]\nretries = 1\n', py37='commands failed')
+
+        def run_env(config, venv):
+            venv.status = 'commands failed'
+        retry_envs(session, run_env)
+
+        assert session.venv_dict['py37'].status == 'commands failed'
+        out, err = capsys.readouterr()
+        assert 'py37 failed after 1 retry.' in err
+
+    def test_unsupported(self, mocker, capsys):
+        """Nothing runs again with a tox that can't rerun an env."""
+        session = make_session(
+            mocker, '[travis]\nretries = 1\n', py37='commands failed')
+        retry_envs(session, None)
+        assert session.venv_dict['py37'].status == 'commands failed'
+        assert 'needs tox 3.7 or later' in capsys.readouterr().err
+
+    def test_not_configured(self, mocker):
+        """Nothing runs again without retries."""
+        session = make_session(mocker, '', py37='commands failed')
+        run_env = mocker.Mock()
+        retry_envs(session, run_env)
+        assert not run_env.called
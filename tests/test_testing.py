@@ -0,0 +1,63 @@
+"""Test configuring tox with Tox-Travis in process."""
+import os
+
+from tox_travis.testing import make_config
+
+tox_ini = """
+    [tox]
+    envlist = py{36,37}, docs
+
+    [travis]
+    python =
+      3.7: py37, docs
+"""
+
+
+class TestMakeConfig:
+    """Test making the tox config of a Travis job."""
+
+    def test_environ(self, tmpdir):
+        """The envs are detected from the given environment."""
+        config = make_config(tox_ini, {'TRAVIS_PYTHON_VERSION': '3.7'},
+                             args=['-l'], toxinidir=tmpdir)
+        assert config.envlist == ['py37', 'docs']
+        assert config.toxinidir == tmpdir
+
+    def test_temporary_dir_removed(self):
+        """The temporary dir of the ini is removed once it's read."""
+        config = make_config(tox_ini, {'TRAVIS_PYTHON_VERSION': '3.7'},
+                             args=['-l'])
+        assert config.envlist == ['py37', 'docs']
+        assert not config.toxinidir.check()
+
+    def test_job_variables_left_out(self, monkeypatch):
+        """The variables of the current job don't leak into the config."""
+        monkeypatch.setenv('TRAVIS_OS_NAME', 'osx')
+        monkeypatch.setenv('TOXENV', 'docs')
+        config = make_config(
+            tox_ini + '    os =\n      osx: py36\n',
+            {'TRAVIS_PYTHON_VERSION': '3.6'}, args=['-l'])
+        assert config.envlist == ['py36']
+
+    def test_environ_restored(self, monkeypatch):
+        """The environment is the same after making the config."""
+        monkeypatch.delenv('TRAVIS', raising=False)
+        environ = os.environ.copy()
+        make_config(tox_ini, {'TRAVIS_PYTHON_VERSION': '3.7'}, args=['-l'])
+        assert os.environ == environ
+
+    def test_current_environ(self, monkeypatch):
+        """Without an environment, the current one is used unchanged."""
+        monkeypatch.delenv('TRAVIS', raising=False)
+        config = make_config(tox_ini, args=['-l'])
+        assert config.envlist == ['py36', 'py37', 'docs']
+
+    def test_configure_again(self):
+        """Tox can be configured many times in the same process."""
+        import tox.session
+        make_config(tox_ini, {'TRAVIS_PYTHON_VERSION': '3.7'}, args=['-l'])
+        subcommand_test = tox.session.Session.subcommand_test
+        summary = tox.session.Session._summary
+        make_config(tox_ini, {'TRAVIS_PYTHON_VERSION': '3.7'}, args=['-l'])
+        assert tox.session.Session.subcommand_test is subcommand_test
+        assert tox.session.Session._summary is summary
@@ -0,0 +1,172 @@
+"""Tests of the hooks for tox 4, with stand-ins for its objects."""
+import pytest
+
+from tox_travis import hooks, plugin, tox4
+
+ini = """
+[tox]
+env_list = py36, py37, docs
+
+[travis]
+python =
+    3.7: py37, docs
+unignore_outcomes = True
+"""
+
+
+class CliEnv(list):
+    """Stand in for the envs selected with ``-e`` in tox 4."""
+
+    @property
+    def is_default_list(self):
+        return not self
+
+
+@pytest.fixture
+def state(mocker, monkeypatch, tmpdir):
+    """Make the state of a tox 4 run in a Travis job."""
+    monkeypatch.setenv('TRAVIS', 'true')
+    monkeypatch.setenv('TRAVIS_PYTHON_VERSION', '3.7')
+    monkeypatch.setattr('tox_travis.tox4.CliEnv', CliEnv)
+    monkeypatch.setattr('tox_travis.tox4.MemoryLoader', dict)
+    tmpdir.join('tox.ini').write(ini)
+    state = mocker.Mock()
+    state.conf.src_path = tmpdir.join('tox.ini')
+    state.conf.options.env = CliEnv()
+    state.conf.options.travis_after = False
+    return state
+
+
+def make_env(mocker, state, name, ignore_outcome=False):
+    """Make a tox env of the run."""
+    tox_env = mocker.Mock()
+    tox_env.name = name
+    tox_env.conf = {'ignore_outcome': ignore_outcome}
+    tox_env.options = state.conf.options
+    return tox_env
+
+
+class TestEnvlist:
+    """Test selecting the envs of the job."""
+
+    def test_detect(self, state):
+        """The envs of the job are selected like with -e."""
+        tox4.tox_add_core_config(state.conf.core, state)
+        assert state.conf.options.env == ['py37', 'docs']
+
+    def test_selected(self, state):
+        """Envs selected with -e or TOXENV are kept."""
+        state.conf.options.env = CliEnv(['py36'])
+        tox4.tox_add_core_config(state.conf.core, state)
+        assert state.conf.options.env == ['py36']
+        assert tox4.run['envlist'] == ['py36']
+
+    def test_none_detected(self, state, tmpdir, capsys):
+        """No env runs when none is detected, rather than all of them."""
+        tmpdir.join('tox.ini').write(ini.replace('py37, docs', ''))
+        tox4.tox_add_core_config(state.conf.core, state)
+        assert state.conf.options.env == []
+        assert state.conf.options.skip_env == '.*'
+        assert tox4.run['envlist'] == []
+        assert 'No envs to run' in capsys.readouterr().err
+
+    def test_not_travis(self, state, monkeypatch):
+        """Nothing changes outside of Travis."""
+        monkeypatch.delenv('TRAVIS')
+        tox4.tox_add_core_config(state.conf.core, state)
+        assert state.conf.options.env == []
+        assert tox4.run['ini'] is None
+
+    def test_unsupported_config(self, state, tmpdir, capsys):
+        """Only ini configs are read."""
+        tmpdir.join('pyproject.toml').write('[tool.tox]\n')
+        state.conf.src_path = tmpdir.join('pyproject.toml')
+        tox4.tox_add_core_config(state.conf.core, state)
+        assert state.conf.options.env == []
+        assert 'only reads tox.ini and setup.cfg' in capsys.readouterr().err
+
+
+class TestUnignoreOutcomes:
+    """Test overriding ignore_outcome as the configs of the envs load."""
+
+    def test_unignore(self, state, mocker):
+        tox4.tox_add_core_config(state.conf.core, state)
+        env_conf = mocker.Mock(loaders=['ini'])
+        tox4.tox_add_env_config(env_conf, state)
+        assert env_conf.loaders == [{'ignore_outcome': False}, 'ini']
+
+    def test_configured(self, state, mocker, tmpdir):
+        tmpdir.join('tox.ini').write(ini.replace('True', 'False'))
+        tox4.tox_add_core_config(state.conf.core, state)
+        env_conf = mocker.Mock(loaders=['ini'])
+        tox4.tox_add_env_config(env_conf, state)
+        assert env_conf.loaders == ['ini']
+
+
+class TestAfter:
+    """Test waiting for the other jobs once the envs are done."""
+
+    @pytest.fixture
+    def travis_after(self, mocker, state):
+        state.conf.options.travis_after = True
+        tox4.tox_add_core_config(state.conf.core, state)
+        return mocker.patch('tox_travis.tox4.travis_after')
+
+    def finish(self, mocker, state, name, exit_code, ignore_outcome=False):
+        """Run the commands of an env, and tear it down."""
+        tox_env = make_env(mocker, state, name, ignore_outcome)
+        tox4.tox_after_run_commands(tox_env, exit_code, [])
+        tox4.tox_env_teardown(tox_env)
+
+    def test_passed(self, mocker, state, travis_after):
+        """Wait once the last env of the job is done."""
+        self.finish(mocker, state, 'py37', 0)
+        self.finish(mocker, state, '.pkg', 0)
+        assert not travis_after.called
+        self.finish(mocker, state, 'docs', 1, ignore_outcome=True)
+        travis_after.assert_called_once_with(
+            tox4.run['ini'], ['py37', 'docs'])
+
+    def test_failed(self, mocker, state, travis_after):
+        """Don't wait when an env failed."""
+        self.finish(mocker, state, 'py37', 1)
+        self.finish(mocker, state, 'docs', 0)
+        assert not travis_after.called
+
+    def test_not_run(self, mocker, state, travis_after):
+        """An env that didn't run its commands counts as failed."""
+        self.finish(mocker, state, 'py37', 0)
+        tox4.tox_env_teardown(make_env(mocker, state, 'docs'))
+        assert not travis_after.called
+
+
+@pytest.mark.skipif(plugin.TOX_MAJOR >= 4, reason='tox 3 only')
+def test_plugin_tox3():
+    """Tox 3 gets the hooks that rely on its internals."""
+    assert plugin.tox_configure is hooks.tox_configure
+    assert not hasattr(plugin, 'tox_add_core_config')
+
+
+class TestRealCliEnv:
+    """Test the selection with the objects of tox 4 itself."""
+
+    @pytest.fixture
+    def state(self, state, monkeypatch):
+        env_select = pytest.importorskip('tox.session.env_select')
+        monkeypatch.setattr('tox_travis.tox4.CliEnv', env_select.CliEnv)
+        state.conf.options.env = env_select.CliEnv()
+        return state
+
+    def test_detect(self, state):
+        """The envs of the job replace the default envlist."""
+        tox4.tox_add_core_config(state.conf.core, state)
+        assert not state.conf.options.env.is_default_list
+        assert list(state.conf.options.env) == ['py37', 'docs']
+
+    def test_none_detected(self, state, tmpdir):
+        """The default envlist isn't selected when no env is detected."""
+        tmpdir.join('tox.ini').write(ini.replace('py37, docs', ''))
+        tox4.tox_add_core_config(state.conf.core, state)
+        assert state.conf.options.env.is_default_list
+        assert state.conf.options.skip_env == '.*'
+        assert tox4.run['envlist'] == []
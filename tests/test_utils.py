@@ -1,5 +1,5 @@
 """Test utility functions and configuration for Tox-Travis."""
-from tox_travis.utils import parse_dict
+from tox_travis.utils import parse_dict, format_size
 
 
 class TestParseDict:
@@ -43,3 +43,14 @@ class TestParseDict:
         }
 
         assert parse_dict(value) == expected
+
+
+class TestFormatSize:
+    """Test the format_size function."""
+
+    def test_format_size(self):
+        """Sizes are given in the largest unit that fits."""
+        assert format_size(12) == '12 bytes'
+        assert format_size(1536) == '1.5 KB'
+        assert format_size(3 * 1024 ** 2) == '3.0 MB'
+        assert format_size(5 * 1024 ** 4) == '5120.0 GB'
@@ -0,0 +1,140 @@
+"""Tests of waiting for several builds at once."""
+import asyncio
+
+import pytest
+
+from tox_travis import after
+from tox_travis.waiter import main, parse_build, wait_for_builds
+
+
+def job(number, state=None, allow_failure=False):
+    """Make a job, that is finished if it has a state."""
+    return {
+        'number': number,
+        'allow_failure': allow_failure,
+        'finished_at': state and '2019-01-01T00:00:00Z',
+        'state': state or 'started',
+        'config': {},
+    }
+
+
+@pytest.fixture
+def limits():
+    """The rate limits that the requests to each API were kept within."""
+    return {}
+
+
+@pytest.fixture
+def timelines(mocker, monkeypatch, limits):
+    """Answer with the next jobs of each build, as they are polled."""
+    monkeypatch.setattr('tox_travis.after.rate_limit', after.RateLimit())
+    timelines = {}
+
+    def get_access_token(token, api_url, refresh=False, limit=None):
+        limits.setdefault(api_url, set()).add(limit)
+        return 'auth ' + api_url
+
+    def get_jobs(api_url, build_id, auth, limit=None):
+        assert auth == 'auth ' + api_url
+        limits.setdefault(api_url, set()).add(limit)
+        timeline = timelines[api_url, build_id]
+        return timeline.pop(0) if len(timeline) > 1 else timeline[0]
+
+    mocker.patch('tox_travis.after.get_access_token',
+                 side_effect=get_access_token)
+    mocker.patch('tox_travis.after.get_jobs', side_effect=get_jobs)
+    return timelines
+
+
+def wait(builds):
+    """Wait for the builds, without waiting between polls."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(wait_for_builds(
+            builds, 'token', polling_interval=0))
+    finally:
+        loop.close()
+
+
+class TestWaitForBuilds:
+    """Test waiting for several builds."""
+
+    def test_passed(self, timelines):
+        """Wait until all the builds are finished."""
+        timelines['https://a', '1'] = [
+            [job('1.1'), job('1.2')],
+            [job('1.1', 'passed'), job('1.2', 'failed', allow_failure=True)],
+        ]
+        timelines['https://b', '2'] = [
+            [job('2.1')], [job('2.1')], [job('2.1', 'passed')],
+        ]
+        result = wait([
+            {'api_url': 'https://a', 'build_id': '1'},
+            {'api_url': 'https://b', 'build_id': '2'},
+        ])
+        assert result == {'passed': True, 'statuses': [[True], [True]]}
+        assert timelines['https://b', '2'] == [[job('2.1', 'passed')]]
+
+    def test_failed(self, timelines):
+        """Stop as soon as a required job of any build failed."""
+        timelines['https://a', '1'] = [[job('1.1')]]
+        timelines['https://a', '2'] = [
+            [job('2.1'), job('2.2')],
+            [job('2.1', 'failed'), job('2.2')],
+        ]
+        result = wait([
+            {'api_url': 'https://a', 'build_id': '1'},
+            {'api_url': 'https://a', 'build_id': '2'},
+        ])
+        assert result == {'passed': False, 'statuses': [None, [False, False]]}
+
+    def test_rate_limits(self, timelines, limits):
+        """Each API has its own rate limit, shared by its builds."""
+        timelines['https://a', '1'] = [[job('1.1')], [job('1.1', 'passed')]]
+        timelines['https://a', '2'] = [[job('2.1', 'passed')]]
+        timelines['https://b', '3'] = [[job('3.1')], [job('3.1', 'passed')]]
+        wait([
+            {'api_url': 'https://a', 'build_id': '1'},
+            {'api_url': 'https://a', 'build_id': '2'},
+            {'api_url': 'https://b', 'build_id': '3'},
+        ])
+        (limit_a,), (limit_b,) = limits['https://a'], limits['https://b']
+        assert isinstance(limit_a, after.RateLimit)
+        assert isinstance(limit_b, after.RateLimit)
+        assert limit_a is not limit_b
+        assert after.rate_limit not in (limit_a, limit_b)
+
+    def test_own_job(self, timelines):
+        """The job that waits, and the unselected jobs, are ignored."""
+        timelines['https://a', '1'] = [[job('1.1'), job('1.2', 'passed')]]
+        result = wait([{'api_url': 'https://a', 'build_id': '1',
+                        'job_number': '1.1'}])
+        assert result == {'passed': True, 'statuses': [[True]]}
+
+
+class TestMain:
+    """Test waiting from the command line."""
+
+    def test_parse_build(self):
+        environ = {'TRAVIS_API_URL': 'https://a', 'TRAVIS_BUILD_ID': '1',
+                   'TRAVIS_JOB_NUMBER': '1.3'}
+        assert parse_build('1', environ) == {
+            'api_url': 'https://a', 'build_id': '1', 'job_number': '1.3'}
+        assert parse_build('https://b/builds/1', environ) == {
+            'api_url': 'https://b', 'build_id': '1'}
+        assert parse_build('2', {}) == {
+            'api_url': 'https://api.travis-ci.org', 'build_id': '2'}
+
+    def test_main(self, timelines, monkeypatch, capsys):
+        monkeypatch.setenv('GITHUB_TOKEN', 'token')
+        timelines['https://a', '1'] = [[job('1.1', 'passed')]]
+        timelines['https://b', '2'] = [[job('2.1', 'failed')]]
+        assert main(['https://a/builds/1', '-i', '0']) == 0
+        assert 'Build 1 on https://a: passed' in capsys.readouterr().out
+        assert main(['https://a/builds/1', 'https://b/builds/2',
+                     '-i', '0']) == after.JOBS_FAILED
+
+    def test_no_github_token(self, monkeypatch, capsys):
+        monkeypatch.delenv('GITHUB_TOKEN', raising=False)
+        assert main(['1']) == after.NO_GITHUB_TOKEN
+        assert 'No GitHub token given.' in capsys.readouterr().err
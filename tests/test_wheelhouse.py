@@ -0,0 +1,115 @@
+"""Test the shared wheelhouse of Tox-Travis."""
+import json
+
+import py
+from tox.config import DepConfig
+from tox.exception import InvocationError
+
+from tox_travis.wheelhouse import (
+    get_wheelhouse,
+    configure_wheelhouse,
+    build_wheels,
+)
+
+
+class TestWheelhouse:
+    """Test building and sharing wheels between envs."""
+
+    def config(self, mocker, tmpdir, inistr):
+        """Make a config with the given ini."""
+        config = mocker.Mock()
+        config._cfg = py.iniconfig.IniConfig('', data=inistr)
+        config.toxinidir = tmpdir
+        config.toxworkdir = tmpdir.join('.tox')
+        config.homedir = tmpdir.join('home')
+        return config
+
+    def venv(self, mocker, tmpdir, deps):
+        """Make a venv with the given deps."""
+        venv = mocker.Mock()
+        venv.get_resolved_dependencies.return_value = [
+            DepConfig(dep) for dep in deps]
+        venv.envconfig.python_info.implementation = 'CPython'
+        venv.envconfig.python_info.version_info = (3, 7, 4, 'final', 0)
+        venv.envconfig.envpython = tmpdir.join('bin', 'python')
+        venv.envconfig.config.toxinidir = tmpdir
+        return venv
+
+    def test_not_configured(self, mocker, tmpdir):
+        """There is no wheelhouse by default."""
+        config = self.config(mocker, tmpdir, '[tox]\nenvlist = py37\n')
+        assert get_wheelhouse(config) is None
+
+    def test_configured(self, mocker, tmpdir):
+        """Substitutions are available in the wheelhouse path."""
+        config = self.config(mocker, tmpdir, (
+            '[travis]\n'
+            'wheelhouse = {toxworkdir}/wheelhouse\n'
+        ))
+        assert get_wheelhouse(config) == tmpdir.join('.tox', 'wheelhouse')
+
+    def test_configure_find_links(self, mocker, tmpdir):
+        """Every env should find links in the wheelhouse."""
+        config = mocker.Mock()
+        config.envconfigs = {'py37': mocker.Mock(), 'docs': mocker.Mock()}
+        config.envconfigs['py37'].setenv = {}
+        config.envconfigs['docs'].setenv = {'PIP_FIND_LINKS': '/wheels'}
+
+        configure_wheelhouse(config, tmpdir)
+
+        assert config.envconfigs['py37'].setenv == {
+            'PIP_FIND_LINKS': str(tmpdir)}
+        assert config.envconfigs['docs'].setenv == {
+            'PIP_FIND_LINKS': '{0} /wheels'.format(tmpdir)}
+
+    def test_build_once(self, mocker, tmpdir):
+        """Each requirement should only be built once per interpreter."""
+        wheelhouse = tmpdir.join('wheelhouse')
+        action = mocker.Mock()
+
+        venv = self.venv(mocker, tmpdir, ['lxml', 'psycopg2'])
+        build_wheels(venv, action, wheelhouse)
+        args = venv._pcall.call_args[0][0]
+        assert args[-2:] == ['lxml', 'psycopg2']
+
+        venv = self.venv(mocker, tmpdir, ['psycopg2', 'Django'])
+        build_wheels(venv, action, wheelhouse)
+        args = venv._pcall.call_args[0][0]
+        assert args[-1:] == ['Django']
+
+        venv = self.venv(mocker, tmpdir, ['lxml', 'Django'])
+        build_wheels(venv, action, wheelhouse)
+        assert not venv._pcall.called
+
+        built = json.loads(wheelhouse.join('.tox-travis-built.json').read())
+        assert built == {'CPython37': ['Django', 'lxml', 'psycopg2']}
+
+    def test_build_per_interpreter(self, mocker, tmpdir):
+        """Wheels need to be built again for other interpreters."""
+        wheelhouse = tmpdir.join('wheelhouse')
+        action = mocker.Mock()
+
+        venv = self.venv(mocker, tmpdir, ['lxml'])
+        build_wheels(venv, action, wheelhouse)
+
+        venv = self.venv(mocker, tmpdir, ['lxml'])
+        venv.envconfig.python_info.version_info = (3, 6, 9, 'final', 0)
+        build_wheels(venv, action, wheelhouse)
+        assert venv._pcall.called
+
+    def test_skip_editable(self, mocker, tmpdir):
+        """Editable requirements shouldn't be built."""
+        venv = self.venv(mocker, tmpdir, ['-e.'])
+        build_wheels(venv, mocker.Mock(), tmpdir.join('wheelhouse'))
+        assert not venv._pcall.called
+        assert not tmpdir.join('wheelhouse').check()
+
+    def test_build_failed(self, mocker, tmpdir, capsys):
+        """The deps are installed as usual when they can't be built."""
+        venv = self.venv(mocker, tmpdir, ['-cconstraints.txt'])
+        venv.name = 'py36'
+        venv._pcall.side_effect = InvocationError('pip wheel', 1)
+        wheelhouse = tmpdir.join('wheelhouse')
+        build_wheels(venv, mocker.Mock(), wheelhouse)
+        assert not wheelhouse.join('.tox-travis-built.json').check()
+        assert 'Could not build the wheels of py36' in capsys.readouterr().err